@@ -0,0 +1 @@
+"""Benchmarks of the simulator's hot paths, run with ``python -m benchmarks.run``."""
@@ -0,0 +1,81 @@
+"""Benchmarks of loading sweep results.
+
+Sweeps of made up results are written to temporary folders, in the
+CSV format of older sweeps, with a file per network.
+"""
+
+import atexit
+import csv
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+from qmulticast.results import STATISTIC_FIELDS, load_folder, read_csv_results
+
+from .harness import benchmark
+
+CONSTANT_FIELDS = ("edge length", "p_loss_length", "p_loss_init", "noise rate")
+
+# Files in a folder, as a sweep over 1 to 5 nodes of both types writes.
+FILES = 10
+
+POINTS = (100, 1000, 10000)
+
+
+@lru_cache(maxsize=None)
+def csv_folder(points: int) -> str:
+    """Write a folder of CSV files with ``points`` rows each."""
+    folder = tempfile.mkdtemp(prefix="qmulticast-bench-")
+    atexit.register(shutil.rmtree, folder, ignore_errors=True)
+
+    rng = np.random.default_rng(points)
+    for index in range(FILES):
+        type = "bipartite" if index % 2 else "multipartite"
+        name = f"type:{type}-nodes:{index // 2 + 1}-noise:1e6.csv"
+        with open(os.path.join(folder, name), mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(CONSTANT_FIELDS)
+            writer.writerow(STATISTIC_FIELDS)
+            for length in np.linspace(0, 0.25, points):
+                writer.writerow([length, 0.2, 0.2, 1e6])
+                writer.writerow(
+                    "max_runs" if field == "stop reason" else rng.random()
+                    for field in STATISTIC_FIELDS
+                )
+    return folder
+
+
+def csv_file(points: int) -> str:
+    """Return one CSV file with ``points`` rows."""
+    folder = csv_folder(points)
+    return os.path.join(folder, sorted(os.listdir(folder))[0])
+
+
+def cached_folder(points: int) -> str:
+    """Return a folder whose cache has been built."""
+    folder = csv_folder(points)
+    load_folder(folder)
+    return folder
+
+
+@benchmark(params=POINTS, setup=csv_file)
+def read_csv(path: str) -> None:
+    """Parse a CSV file."""
+    read_csv_results(path)
+
+
+@benchmark(params=POINTS, setup=csv_folder)
+def load_folder_cold(folder: str) -> None:
+    """Load a folder without the cache, as on first plotting it."""
+    load_folder(folder, use_cache=False)
+
+
+@benchmark(params=POINTS, setup=cached_folder)
+def load_folder_cached(folder: str) -> None:
+    """Load a folder from its cache and read every numeric column."""
+    for column in load_folder(folder).values():
+        if column.dtype.kind == "f":
+            np.sum(column)
@@ -0,0 +1,107 @@
+"""Benchmarks of building and simulating networks."""
+
+from functools import partial
+
+import netsquid as ns
+import netsquid.qubits.qubitapi as qapi
+import networkx as nx
+from netsquid.components import QuantumProcessor
+
+from qmulticast.programs import CreateGHZ, CreateGHZTree
+from qmulticast.utils import (
+    StoppingRule,
+    cached_network,
+    create_network,
+    gen_GHZ_ket,
+)
+from simulate import simulate_network, star_graph
+
+from .harness import benchmark
+
+RECEIVERS = (1, 2, 4, 8, 16, 32)
+
+# Rounds each protocol benchmark simulates.
+ROUNDS = 200
+
+
+def complete_graph(num_nodes: int) -> nx.DiGraph:
+    """Connect every pair of nodes both ways."""
+    graph = nx.complete_graph(
+        [str(node) for node in range(num_nodes)], create_using=nx.DiGraph
+    )
+    nx.set_edge_attributes(graph, 0.1, "weight")
+    graph.length = 0.1
+    return graph
+
+
+@benchmark(params=RECEIVERS, repeat=3)
+def create_star_network(num_nodes: int) -> None:
+    """Build a star, the number of edges grows with the number of nodes."""
+    create_network("bench", star_graph(num_nodes, 0.1), bipartite=True, noise_rate=1e6)
+
+
+@benchmark(params=(3, 4, 6, 8), repeat=3)
+def create_complete_network(num_nodes: int) -> None:
+    """Build a complete graph, the number of edges grows as its square."""
+    create_network("bench", complete_graph(num_nodes), bipartite=True, noise_rate=1e6)
+
+
+@benchmark(params=RECEIVERS, repeat=3)
+def cached_star_network(num_nodes: int) -> None:
+    """Reuse a star, only built on the first repeat."""
+    cached_network("bench", star_graph(num_nodes, 0.1), bipartite=True, noise_rate=1e6)
+
+
+def star_network(bipartite: bool, num_nodes: int):
+    """Make a star network which stops after `ROUNDS` rounds."""
+    ns.sim_reset()
+    ns.set_random_state(seed=1)
+    return create_network(
+        "bench",
+        star_graph(num_nodes, 0.01),
+        bipartite=bipartite,
+        noise_rate=1e6,
+        stopping_rule=StoppingRule(max_hits=None, max_runs=ROUNDS),
+    )
+
+
+@benchmark(params=RECEIVERS, setup=partial(star_network, True), repeat=3)
+def bipartite_rounds(network) -> int:
+    """Simulate rounds of `BipartiteProtocol`."""
+    simulate_network(network, bipartite=True)
+    return network.results["runs"]
+
+
+@benchmark(params=RECEIVERS, setup=partial(star_network, False), repeat=3)
+def multipartite_rounds(network) -> int:
+    """Simulate rounds of `MultipartiteProtocol`."""
+    simulate_network(network, bipartite=False)
+    return network.results["runs"]
+
+
+def bell_pairs(num_links: int):
+    """Make a processor holding the source half of a Bell pair per link."""
+    ns.sim_reset()
+    processor = QuantumProcessor("bench", num_positions=2 * num_links)
+    positions = [2 * link for link in range(num_links)]
+    for position in positions:
+        qubits = qapi.create_qubits(2)
+        qapi.assign_qstate(qubits, gen_GHZ_ket(2))
+        processor.put(qubits[0], positions=[position])
+    return processor, positions
+
+
+@benchmark(params=RECEIVERS, setup=bell_pairs, repeat=20)
+def create_ghz(state) -> None:
+    """Execute `CreateGHZ` on a processor."""
+    processor, positions = state
+    processor.execute_program(CreateGHZ(positions))
+    ns.sim_run()
+
+
+@benchmark(params=RECEIVERS, setup=bell_pairs, repeat=20)
+def create_ghz_tree(state) -> None:
+    """Execute `CreateGHZTree` on a processor."""
+    processor, positions = state
+    processor.execute_program(CreateGHZTree(positions))
+    ns.sim_run()
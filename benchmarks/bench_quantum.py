@@ -0,0 +1,64 @@
+"""Benchmarks of GHZ states, fidelities and the loss model."""
+
+import netsquid as ns
+import netsquid.qubits.qubitapi as qapi
+
+from qmulticast.models.ceryslossmodel import CerysLossModel
+from qmulticast.utils import (
+    gen_GHZ_ket,
+    gen_GHZ_stabilizer,
+    ghz_fidelity,
+    stabilizer_ghz_fidelity,
+)
+
+from .harness import benchmark
+
+GHZ_SIZES = (2, 4, 6, 8, 10)
+
+# Qubits passed through the loss model per call.
+LOSS_QUBITS = 1000
+
+
+def ghz_qubits(num_qubits: int):
+    """Make qubits sharing a GHZ state."""
+    qubits = qapi.create_qubits(num_qubits)
+    qapi.assign_qstate(qubits, gen_GHZ_ket(num_qubits))
+    return qubits
+
+
+@benchmark(params=GHZ_SIZES, number=100)
+def make_ghz_ket(num_qubits: int) -> None:
+    """Build a GHZ ket, skipping the cache."""
+    gen_GHZ_ket.__wrapped__(num_qubits)
+
+
+@benchmark(params=GHZ_SIZES, setup=ghz_qubits, number=100)
+def ghz_fidelity_shared(qubits) -> None:
+    """Find the fidelity of qubits with the GHZ state, as protocols do."""
+    ghz_fidelity(qubits)
+
+
+@benchmark(params=GHZ_SIZES, setup=ghz_qubits, number=100)
+def qubitapi_fidelity(qubits) -> None:
+    """Find the fidelity with the general NetSquid function, for comparison."""
+    qapi.fidelity(qubits, gen_GHZ_ket(len(qubits)), squared=True)
+
+
+@benchmark(params=(10, 100, 300), setup=gen_GHZ_stabilizer, number=10)
+def stabilizer_fidelity(state) -> None:
+    """Find the fidelity of a stabilizer state with the GHZ state."""
+    stabilizer_ghz_fidelity(state.check_matrix, state.phases)
+
+
+def loss_qubits(length: float):
+    """Make a loss model and the qubits to pass through it."""
+    ns.set_random_state(seed=1)
+    return CerysLossModel(0.2, 0.2), qapi.create_qubits(LOSS_QUBITS), length
+
+
+@benchmark(params=(0.0, 0.1, 1.0), setup=loss_qubits)
+def loss_model(state) -> int:
+    """Pass qubits through `CerysLossModel`, the rate is of qubits."""
+    model, qubits, length = state
+    model.error_operation(qubits, length=length)
+    return LOSS_QUBITS
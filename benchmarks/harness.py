@@ -0,0 +1,221 @@
+"""Register, time and compare benchmarks.
+
+Benchmarks are functions registered with `benchmark`. Each is timed
+for every one of its parameters and the timings of a run are saved as
+JSON named after the commit they were run on, so runs on different
+commits can be compared with `compare`.
+"""
+
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class Benchmark(NamedTuple):
+    """A registered benchmark.
+
+    The function is called with whatever ``setup`` returns for the
+    parameter, or with the parameter itself if there is no setup. It
+    may return the number of operations it did, e.g. rounds simulated,
+    to have a throughput reported as well as a time.
+    """
+
+    name: str
+    func: Callable
+    params: Sequence[Any]
+    setup: Optional[Callable]
+    number: int
+    repeat: int
+
+
+REGISTRY: List[Benchmark] = []
+
+
+def benchmark(
+    params: Sequence[Any] = (None,),
+    setup: Optional[Callable] = None,
+    number: int = 1,
+    repeat: int = 5,
+) -> Callable:
+    """Register a function as a benchmark.
+
+    Parameters
+    ----------
+    params : Sequence[Any], default (None,)
+        The parameters to time the function for.
+    setup : Callable, optional
+        Called with the parameter before each repeat, outside of the
+        timing, to make the argument of the function.
+    number : int, default 1
+        Calls per repeat, the time of a call is their mean.
+    repeat : int, default 5
+        Repeats per parameter.
+    """
+
+    def register(func: Callable) -> Callable:
+        name = f"{func.__module__.split('.')[-1]}.{func.__name__}"
+        REGISTRY.append(Benchmark(name, func, tuple(params), setup, number, repeat))
+        return func
+
+    return register
+
+
+def time_benchmark(bench: Benchmark, param: Any) -> Dict[str, Any]:
+    """Time a benchmark for one parameter.
+
+    Parameters
+    ----------
+    bench : Benchmark
+        The benchmark.
+    param : Any
+        The parameter to time it for.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Statistics of the time per call [s], and of the operations per
+        second if the function counts them.
+    """
+    times = []
+    rates = []
+    for _ in range(bench.repeat):
+        argument = bench.setup(param) if bench.setup is not None else param
+        operations = 0
+        start = perf_counter()
+        for _ in range(bench.number):
+            operations += bench.func(argument) or 0
+        elapsed = perf_counter() - start
+        times.append(elapsed / bench.number)
+        if operations:
+            rates.append(operations / elapsed)
+
+    result = {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "repeat": bench.repeat,
+        "number": bench.number,
+    }
+    if rates:
+        result["rate"] = statistics.median(rates)
+    return result
+
+
+def run_benchmarks(pattern: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Time every registered benchmark.
+
+    Parameters
+    ----------
+    pattern : str, optional
+        Only run benchmarks whose names contain this.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        Timings by benchmark name and parameter.
+    """
+    results = {}
+    for bench in REGISTRY:
+        if pattern is not None and pattern not in bench.name:
+            continue
+
+        results[bench.name] = {}
+        for param in bench.params:
+            logger.info("Timing %s[%s].", bench.name, param)
+            timing = time_benchmark(bench, param)
+            results[bench.name][str(param)] = timing
+            print(f"{bench.name}[{param}]: {timing['median']:.3e} s", flush=True)
+    return results
+
+
+def commit_id() -> str:
+    """Return the current commit, marked dirty if there are changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        changes = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "-dirty" if changes else commit
+
+
+def save(results: Dict[str, Dict[str, Any]], folder: str) -> str:
+    """Save timings as JSON named after the current commit.
+
+    Parameters
+    ----------
+    results : Dict[str, Dict[str, Any]]
+        Timings from `run_benchmarks`.
+    folder : str
+        The folder to save to.
+
+    Returns
+    -------
+    str
+        The file written.
+    """
+    commit = commit_id()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{commit}.json")
+    record = {
+        "commit": commit,
+        "date": datetime.now().isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, mode="w") as file:
+        json.dump(record, file, indent=2)
+    return path
+
+
+def compare(old_path: str, new_path: str, threshold: float = 1.1) -> List[str]:
+    """Compare the median times of two saved runs.
+
+    Parameters
+    ----------
+    old_path, new_path : str
+        Files written by `save`.
+    threshold : float, default 1.1
+        Ratio of new to old time above which to flag a regression.
+
+    Returns
+    -------
+    List[str]
+        A line for each benchmark timed in both runs.
+    """
+    with open(old_path) as file:
+        old = json.load(file)["results"]
+    with open(new_path) as file:
+        new = json.load(file)["results"]
+
+    lines = []
+    for name, timings in new.items():
+        for param, timing in timings.items():
+            if param not in old.get(name, {}):
+                continue
+            ratio = timing["median"] / old[name][param]["median"]
+            flag = " REGRESSION" if ratio > threshold else ""
+            if ratio < 1 / threshold:
+                flag = " improved"
+            lines.append(f"{name}[{param}]: {ratio:.2f}x{flag}")
+    return lines
@@ -0,0 +1,70 @@
+"""Run the benchmarks and save their timings.
+
+Usage::
+
+    python -m benchmarks.run [--filter NAME] [--output FOLDER]
+    python -m benchmarks.run --compare OLD.json NEW.json
+
+Timings are saved to ``benchmarks/results/<commit>.json``. Modules
+which can't be imported, e.g. without NetSquid, are skipped.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+
+from .harness import compare, run_benchmarks, save
+
+logger = logging.getLogger(__name__)
+
+MODULES = ("bench_network", "bench_quantum", "bench_io")
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parseargs() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--filter", default=None, help="Only run benchmarks whose names contain this."
+    )
+    parser.add_argument(
+        "--output", default=RESULTS_FOLDER, help="Folder to save timings to."
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        default=None,
+        help="Compare two saved runs rather than running benchmarks.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.1,
+        help="Slowdown ratio to flag as a regression when comparing.",
+    )
+    return parser.parse_args()
+
+
+def import_modules() -> None:
+    """Import the benchmark modules, registering their benchmarks."""
+    for name in MODULES:
+        try:
+            importlib.import_module(f"{__package__}.{name}")
+        except ImportError as error:
+            logger.warning("Skipping %s: %s", name, error)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    args = parseargs()
+
+    if args.compare is not None:
+        for line in compare(*args.compare, threshold=args.threshold):
+            print(line)
+    else:
+        import_modules()
+        results = run_benchmarks(args.filter)
+        print(f"Saved timings to {save(results, args.output)}")
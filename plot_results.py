@@ -1,15 +1,14 @@
 """Plot out data from datafiles."""
 import argparse
-import csv
 import os
-import re
-from pathlib import Path
-from pprint import pprint as print
 from typing import Dict, List, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 
+from qmulticast.analytics import star_predictions, validate
+from qmulticast.results import load_folder
+
 
 def parseargs() -> argparse.Namespace:
     """Parse args for plotter."""
@@ -51,6 +50,12 @@ def parseargs() -> argparse.Namespace:
         default=False,
         help="Whether to overlay plots of analytic model predictions or not.",
     )
+    parser.add_argument(
+        "--closed_form",
+        "-c",
+        action="store_true",
+        help="Overlay closed form predictions and report how far the data is from them.",
+    )
     parser.add_argument(
         "--noise_rates",
         "-n",
@@ -59,12 +64,19 @@ def parseargs() -> argparse.Namespace:
         default=[1e7],
         help="The noise rate(s) to plot data for.",
     )
+    parser.add_argument(
+        "--graph",
+        "-g",
+        type=str,
+        default="star",
+        help="The graph to plot data for, e.g. star, butterfly or repeater.",
+    )
     args = parser.parse_args()
     args.type += "partite" if args.type in ["bi", "multi"] else ""
     return args
 
 
-def analytic_data(network: str) -> List[Tuple[np.ndarray, np.ndarrray, int]]:
+def analytic_data(network: str) -> List[Tuple[np.ndarray, np.ndarray, int]]:
     """Define plottable datasets for the analytic model of each network type.
 
     Parameters
@@ -103,91 +115,81 @@ def analytic_data(network: str) -> List[Tuple[np.ndarray, np.ndarrray, int]]:
         raise ValueError("network must be 'bipartite' or 'multipartite'.")
 
 
-def get_file_data(datafile: Path) -> Dict:
-    """Extract data from CSV file.
+def add_results(
+    data: Dict, columns: Dict[str, np.ndarray], graph: str = "star"
+) -> None:
+    """Split columns of results by network into data.
 
     Parameters
     ----------
-    datafile : Path
-        Path to the file to extract data from.
+    data : Dict
+        Data by number of nodes, network type and noise rate to add to.
+    columns : Dict[str, np.ndarray]
+        Columns loaded with `load_folder`.
+    graph : str, default "star"
+        Only add points on this graph. Points from before the graph was
+        recorded were all on stars.
     """
+    graphs = columns["graph"]
+    on_graph = graphs == graph
+    if graph == "star":
+        on_graph |= graphs == ""
+    networks = set(
+        zip(
+            columns["number of edges"][on_graph].tolist(),
+            columns["type"][on_graph].tolist(),
+            columns["noise rate"][on_graph].tolist(),
+        )
+    )
 
-    data = {}
-    with open(datafile) as file:
-        reader = csv.reader(file, delimiter=",")
-
-        fields = []
-        temp = []
-
-        # Header has passed read main data.
-        for index, line in enumerate(reader):
-            if index == 0 or index == 1:
-                fields += line
-                data = {
-                    field.strip(): np.array([], dtype=np.float32) for field in fields
-                }
-            elif index % 2 == 0:
-                temp += line
-            elif index % 2 == 1:
-                temp += line
-                for field, item in zip(fields, temp):
-                    if item == "nan":
-                        item = None
-                    elif item == "":
-                        item = None
-                    elif item is not None:
-                        item = float(item)
-                    data[field.strip()] = np.append(data[field.strip()], item)
-                temp = []
-
-    return data
-
-
-def get_all_data(folder_names: str) -> Dict:
+    for num_nodes, type, noise_rate in networks:
+        mask = (
+            on_graph
+            & (columns["number of edges"] == num_nodes)
+            & (columns["type"] == type)
+            & (columns["noise rate"] == noise_rate)
+        )
+        # Points from several sweeps are plotted in order of length.
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(columns["edge length"][rows], kind="stable")]
+        data.setdefault(int(num_nodes), {}).setdefault(type, {})[noise_rate] = {
+            field: column[rows] for field, column in columns.items()
+        }
+
+
+def get_all_data(folder_names: str, graph: str = "star") -> Dict:
     """Get all the data from all files.
 
     Parameters
     ----------
     folder_names : str
         The names or partial names of folders to extract data from.
+    graph : str, default "star"
+        The graph to get the points of.
     """
-    folders = os.listdir("data/")
-    folders.sort()
+    folders = sorted(
+        folder for folder in os.listdir("data/") if os.path.isdir("data/" + folder)
+    )
 
     if folder_names == "last" or "last" in folder_names:
         folders = [folders[-1]]
     elif folder_names:
         folders = [f for f in folders if any([time in f for time in folder_names])]
 
-    data = {}
+    if not folders:
+        raise ValueError("No data folders match the names given.")
 
-    files = []
-    for folder in folders:
-        files += [folder + "/" + file for file in os.listdir("data/" + folder)]
-
-    for file in files:
-        pattern = re.compile(pattern="nodes:(\d)")
-        num_nodes = pattern.search(file).groups()[0]
-        num_nodes = int(num_nodes)
-
-        if "bipartite" in file:
-            type = "bipartite"
-        elif "multipartite" in file:
-            type = "multipartite"
-        else:
-            raise NameError("Cannot parse network type from filename.")
-
-        data[num_nodes] = data.get(num_nodes, {})
-        data[num_nodes][type] = data[num_nodes].get(type, {})
-
-        if "noise" in file:
-            pattern = re.compile(pattern="noise:(\d+)")
-            noise_rate = pattern.search(file).groups()[0]
-            noise_rate = float(noise_rate)
-            data[num_nodes][type][noise_rate] = get_file_data("data/" + file)
-        else:
-            data[num_nodes][type][1e7] = get_file_data("data/" + file)
+    parts = [load_folder("data/" + folder) for folder in folders]
+    if len(parts) == 1:
+        columns = parts[0]
+    else:
+        columns = {
+            field: np.concatenate([part[field] for part in parts])
+            for field in parts[0]
+        }
 
+    data = {}
+    add_results(data, columns, graph)
     return data
 
 
@@ -198,6 +200,7 @@ def plot_these(
     num_nodes: List[int],
     measure: str,
     noise_rates: List[float],
+    closed_form: bool = False,
 ) -> None:
     """Plot the data.
 
@@ -221,6 +224,9 @@ def plot_these(
     noise_rate : List[float], default 1e7
         The noise rate to plot data for.
 
+    closed_form : bool, default False
+        Whether to overlay closed form predictions at the simulated points.
+
     """
     networks = []
     type = type.lower()
@@ -293,6 +299,26 @@ def plot_these(
                 if measure in ["time"]:
                     plt.fill_between(x, lower, upper, alpha=0.5)
 
+                if closed_form:
+                    predictions = star_predictions(
+                        x,
+                        dataset["number of edges"],
+                        dataset["noise rate"],
+                        p_loss_init=dataset["p_loss_init"],
+                        p_loss_length=dataset["p_loss_length"],
+                    )
+                    plt.plot(
+                        x,
+                        predictions[datakey],
+                        linestyle="--",
+                        label=label + " closed form",
+                    )
+                    for name, comparison in validate(dataset).items():
+                        print(
+                            f"{network} links={num} {name}: "
+                            f"max |z| {np.nanmax(np.abs(comparison['z'])):.2f}"
+                        )
+
     title = f"{type} {datakey}: "
     if len(num_nodes) == 1:
         title += f"{num} Links "
@@ -311,7 +337,7 @@ def plot_these(
 
 if __name__ == "__main__":
     args = parseargs()
-    data = get_all_data(folder_names=args.directories)
+    data = get_all_data(folder_names=args.directories, graph=args.graph)
     plot_these(
         data,
         type=args.type,
@@ -319,4 +345,5 @@ if __name__ == "__main__":
         num_nodes=args.link_numbers,
         measure=args.measure,
         noise_rates=args.noise_rates,
+        closed_form=args.closed_form,
     )
@@ -0,0 +1,231 @@
+"""Closed form predictions for GHZ distribution over star networks.
+
+For a star with ``n`` links of length ``L`` both protocols send one
+qubit down each link per round, and a round takes the transmission
+time of a link (plus the small margin the output protocols wait).
+
+Each photon survives its link with probability
+
+    pg = (1 - p_loss_init) * 10 ** (-L / p_loss_length)
+
+so a round succeeds with probability ``pg ** n``. Every qubit of the
+final ``n + 1`` qubit GHZ state has spent one round time in either a
+fibre or a memory, both of which apply a `DepolarNoiseModel`. Writing
+``l = exp(-noise_rate * round_time)`` for the fraction of each qubit's
+state that survives,
+
+    F = (((1 + l) / 2) ** (n + 1) + ((1 - l) / 2) ** (n + 1) + l ** (n + 1)) / 2
+
+All functions broadcast over NumPy arrays, so whole parameter grids
+are evaluated in one call.
+"""
+
+import logging
+from typing import Dict, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Speed of light in fibre used by FibreDelayModel [km/s].
+FIBRE_SPEED = 200000.0
+
+# The output protocols wait this much longer than the transmission time.
+TIMER_MARGIN = 1.0000001
+
+
+def link_success_probability(
+    length: np.ndarray, p_loss_init: float = 0.2, p_loss_length: float = 0.2
+) -> np.ndarray:
+    """Probability that a photon survives a link, as in `CerysLossModel`.
+
+    Parameters
+    ----------
+    length : np.ndarray
+        Link lengths [km].
+    p_loss_init : float
+        Probability of losing a photon as it enters the channel.
+    p_loss_length : float
+        Length over which a tenth of the photons survive [km].
+    """
+    length = np.asarray(length, dtype=float)
+    return (1 - p_loss_init) * np.exp(length * np.log(0.1) / p_loss_length)
+
+
+def round_time(length: np.ndarray, speed: float = FIBRE_SPEED) -> np.ndarray:
+    """Time taken by one round of the output protocols [s].
+
+    Parameters
+    ----------
+    length : np.ndarray
+        Link lengths [km].
+    speed : float
+        Speed of light in the fibre [km/s].
+    """
+    return np.asarray(length, dtype=float) / speed * TIMER_MARGIN
+
+
+def ghz_depolarised_fidelity(
+    num_qubits: np.ndarray, survival: np.ndarray
+) -> np.ndarray:
+    """Fidelity of a GHZ state with every qubit partly depolarised.
+
+    Parameters
+    ----------
+    num_qubits : np.ndarray
+        The number of qubits in the GHZ state.
+    survival : np.ndarray
+        The probability that each qubit is not depolarised.
+    """
+    num_qubits = np.asarray(num_qubits, dtype=float)
+    survival = np.asarray(survival, dtype=float)
+    return (
+        ((1 + survival) / 2) ** num_qubits
+        + ((1 - survival) / 2) ** num_qubits
+        + survival ** num_qubits
+    ) / 2
+
+
+def star_predictions(
+    length: np.ndarray,
+    num_links: np.ndarray,
+    noise_rate: np.ndarray,
+    p_loss_init: float = 0.2,
+    p_loss_length: float = 0.2,
+    speed: float = FIBRE_SPEED,
+) -> Dict[str, np.ndarray]:
+    """Predict the statistics `fidelity_from_node` measures on a star.
+
+    Arguments are broadcast against each other and the results have
+    the broadcast shape. Keys match the columns of the output files.
+
+    Parameters
+    ----------
+    length : np.ndarray
+        Link lengths [km].
+    num_links : np.ndarray
+        The number of receivers connected to the source.
+    noise_rate : np.ndarray
+        Depolarising rate of fibres and memories [Hz].
+    p_loss_init : float
+        Probability of losing a photon as it enters the channel.
+    p_loss_length : float
+        Length over which a tenth of the photons survive [km].
+    speed : float
+        Speed of light in the fibre [km/s].
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        Predicted statistics.
+    """
+    length, num_links, noise_rate = np.broadcast_arrays(
+        np.asarray(length, dtype=float),
+        np.asarray(num_links, dtype=float),
+        np.asarray(noise_rate, dtype=float),
+    )
+    link_probability = link_success_probability(length, p_loss_init, p_loss_length)
+    success_probability = link_probability ** num_links
+    period = round_time(length, speed)
+    survival = np.exp(-noise_rate * period)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_time = period / success_probability
+        time_std = period * np.sqrt(1 - success_probability) / success_probability
+
+    return {
+        "success probability": success_probability,
+        "mean fidelity": ghz_depolarised_fidelity(num_links + 1, survival),
+        "loss rate": num_links * (1 - link_probability) / (num_links + 1),
+        "min time": period,
+        "mean time": mean_time,
+        "time std": time_std,
+        # The entanglement rate written by the simulation is min/mean time.
+        "entanglement rate": success_probability,
+    }
+
+
+def star_grid(
+    lengths: Iterable[float],
+    num_links: Iterable[int],
+    noise_rates: Iterable[float],
+    **kwargs,
+) -> Dict[str, np.ndarray]:
+    """Predict statistics over a whole (length, links, noise) grid.
+
+    Parameters
+    ----------
+    lengths : Iterable[float]
+        Link lengths [km].
+    num_links : Iterable[int]
+        Numbers of receivers.
+    noise_rates : Iterable[float]
+        Depolarising rates [Hz].
+    **kwargs
+        Passed on to `star_predictions`.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        Predicted statistics with shape (lengths, links, noise rates).
+    """
+    grid = np.meshgrid(
+        np.asarray(list(lengths), dtype=float),
+        np.asarray(list(num_links), dtype=float),
+        np.asarray(list(noise_rates), dtype=float),
+        indexing="ij",
+    )
+    return star_predictions(*grid, **kwargs)
+
+
+def validate(dataset: Dict[str, np.ndarray]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Compare simulation results with the closed form predictions.
+
+    Network constants are read from each row of the dataset, so rows
+    may come from different sweeps.
+
+    Parameters
+    ----------
+    dataset : Dict[str, np.ndarray]
+        Columns of simulation output as loaded by `plot_results`.
+
+    Returns
+    -------
+    Dict[str, Dict[str, np.ndarray]]
+        For each compared measure the predicted and simulated values,
+        their difference and the difference in standard errors.
+    """
+    predictions = star_predictions(
+        dataset["edge length"],
+        dataset["number of edges"],
+        dataset["noise rate"],
+        p_loss_init=dataset["p_loss_init"],
+        p_loss_length=dataset["p_loss_length"],
+    )
+    runs = np.asarray(dataset["runs"], dtype=float)
+    hits = np.asarray(dataset["hits"], dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probability = predictions["success probability"]
+        errors = {
+            "mean fidelity": np.asarray(dataset["fidelity std"], dtype=float)
+            / np.sqrt(hits),
+            "entanglement rate": np.sqrt(probability * (1 - probability) / runs),
+            "loss rate": np.sqrt(
+                predictions["loss rate"] * (1 - predictions["loss rate"]) / runs
+            ),
+        }
+
+        comparison = {}
+        for measure, error in errors.items():
+            simulated = np.asarray(dataset[measure], dtype=float)
+            residual = simulated - predictions[measure]
+            comparison[measure] = {
+                "predicted": predictions[measure],
+                "simulated": simulated,
+                "residual": residual,
+                "z": residual / error,
+            }
+            logger.debug("%s: max |z| %s", measure, np.nanmax(np.abs(residual / error)))
+
+    return comparison
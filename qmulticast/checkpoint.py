@@ -0,0 +1,172 @@
+"""Checkpoints that let an interrupted sweep carry on where it stopped.
+
+Every finished point is appended to a manifest, a JSON lines file
+holding the point's key and its result row. A key is a hash of all
+the parameters of the point, including its seed, and of the source
+code of the package and ``simulate.py``, so results are only reused when rerunning the
+point would reproduce them.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, TextIO
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    """Return a hash of the source code of the package and sweep script.
+
+    ``simulate.py`` assigns protocols and runs each point, so it is
+    hashed along with the package when it is next to it.
+    """
+    package = Path(__file__).parent
+    paths = sorted(package.rglob("*.py"))
+    script = package.parent / "simulate.py"
+    if script.exists():
+        paths.append(script)
+
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path.relative_to(package.parent)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _to_json(value: Any) -> Any:
+    """Convert NumPy scalars and other values json can't write."""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def point_key(parameters: Dict[str, Any]) -> str:
+    """Return the key of a sweep point.
+
+    Parameters
+    ----------
+    parameters : Dict[str, Any]
+        Everything the result of the point depends on.
+
+    Returns
+    -------
+    str
+        A hash of the parameters and the code version.
+    """
+    record = {"parameters": parameters, "code version": code_version()}
+    encoded = json.dumps(record, sort_keys=True, default=_to_json)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class Manifest:
+    """Append only record of the points of a sweep that have finished.
+
+    Each record is flushed and synced to disk before `record` returns,
+    so at most the record being written is lost if the process dies.
+
+    Parameters
+    ----------
+    path : str
+        The manifest file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Read the finished points, repairing a partly written last line.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            The result row of each finished point by key.
+        """
+        if not os.path.exists(self.path):
+            return {}
+
+        with open(self.path, mode="rb") as file:
+            content = file.read()
+
+        # Anything after the last newline was cut off part way through.
+        end = content.rfind(b"\n") + 1
+        if end < len(content):
+            logger.warning("Truncating partial record at the end of %s.", self.path)
+            with open(self.path, mode="r+b") as file:
+                file.truncate(end)
+
+        finished = {}
+        for number, line in enumerate(content[:end].splitlines(), start=1):
+            try:
+                record = json.loads(line)
+                finished[record["key"]] = record["row"]
+            except (ValueError, KeyError):
+                logger.warning(
+                    "Skipping bad record on line %s of %s.", number, self.path
+                )
+        return finished
+
+    def record(self, key: str, row: Dict[str, Any]) -> None:
+        """Record that a point has finished.
+
+        Parameters
+        ----------
+        key : str
+            The key of the point.
+        row : Dict[str, Any]
+            The result row of the point.
+        """
+        if self._file is None:
+            self._file = open(self.path, mode="a")
+
+        self._file.write(json.dumps({"key": key, "row": row}, default=_to_json) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Close the manifest file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def write_in_order(
+    writer: Any, keys: Sequence[str], finished: Dict[str, Dict[str, Any]], written: int
+) -> int:
+    """Write the rows of finished points which can go next in a sweep.
+
+    Rows are written in the order of ``keys``, stopping at the first
+    point which hasn't finished, so a resumed sweep writes the same rows
+    in the same order as one which was never stopped.
+
+    Parameters
+    ----------
+    writer : ResultsWriter
+        The writer to append rows to.
+    keys : Sequence[str]
+        The key of every point of the sweep, in output order.
+    finished : Dict[str, Dict[str, Any]]
+        The result row of each finished point by key.
+    written : int
+        The number of rows already written.
+
+    Returns
+    -------
+    int
+        The number of rows written now.
+    """
+    while written < len(keys) and keys[written] in finished:
+        writer.append(finished[keys[written]])
+        written += 1
+    return written
@@ -1,5 +1,5 @@
 """init prgrams"""
 
-from .create_ghz import CreateGHZ
+from .create_ghz import FUSION_PROGRAMS, CreateGHZ, CreateGHZTree
 
-__all__ = [CreateGHZ]
+__all__ = [CreateGHZ, CreateGHZTree, FUSION_PROGRAMS]
@@ -1,9 +1,14 @@
 """Program to entangle states to GHZ."""
 
 import logging
-from typing import List
+from typing import Dict, List, Tuple
 
-from netsquid.components.instructions import INSTR_CNOT, INSTR_H, INSTR_MEASURE
+from netsquid.components.instructions import (
+    INSTR_CNOT,
+    INSTR_H,
+    INSTR_MEASURE,
+    INSTR_MEASURE_X,
+)
 from netsquid.components.qprogram import QuantumProgram
 
 logger = logging.getLogger(__name__)
@@ -26,33 +31,178 @@ class CreateGHZ(QuantumProgram):
 
     default_num_qubits = -1
 
-    def __init__(self, bell_qubits: List[int]) -> None:
+    def __init__(self, bell_qubits: List[int], relay: bool = False) -> None:
         """Initialise.
 
         Parameters
         ----------
         bell_qubits : List[int]
             A list of memory positions to act upon.
+        relay : bool, default False
+            Whether the first qubit is measured in the X basis once the
+            others are fused to it, as on a node which only passes the
+            GHZ state on.
         """
         super().__init__()
-        # we don't want to do operations on 0.
+        # The first qubit is kept, we don't want to measure it.
+        self.root = bell_qubits[0]
         self.bell_qubits = bell_qubits[1:]
+        self.relay = relay
 
     def program(self) -> None:
         """Create a GHZ state from qubits in memory."""
         logger.debug("Beginning GHZ creation.")
-        logger.debug(f"Using qubits {self.bell_qubits}")
+        logger.debug("Using qubits %s", self.bell_qubits)
 
         for qubit in self.bell_qubits:
             self.apply(
-                INSTR_CNOT, [0, qubit], physical=False, output_key=f"cnot-{qubit}"
+                INSTR_CNOT,
+                [self.root, qubit],
+                physical=False,
+                output_key=f"cnot-{qubit}",
             )
-            logger.debug(f"Applying CNOT 0->{qubit}")
+            logger.debug("Applying CNOT %s->%s", self.root, qubit)
 
         for qubit in self.bell_qubits:
             self.apply(
                 INSTR_MEASURE, qubit, output_key=f"measure-{qubit}", physical=False
             )
-            logger.debug(f"Measurement on qubit {qubit}")
+            logger.debug("Measurement on qubit %s", qubit)
+
+        if self.relay:
+            self.apply(
+                INSTR_MEASURE_X,
+                self.root,
+                output_key=f"measure-x-{self.root}",
+                physical=False,
+            )
+            logger.debug("X measurement on relay qubit %s", self.root)
 
         yield self.run()
+
+    def corrections(self) -> Dict[int, int]:
+        """Find which Bell pairs need an X correction once run.
+
+        Returns
+        -------
+        Dict[int, int]
+            1 for each memory position whose partner should be
+            flipped, 0 otherwise.
+        """
+        return {qubit: self.output[f"measure-{qubit}"][0] for qubit in self.bell_qubits}
+
+    def phase(self) -> int:
+        """Find whether the GHZ state needs a Z correction once run.
+
+        Returns
+        -------
+        int
+            1 if measuring out a relay's qubit flipped the phase of the
+            rest of the GHZ state, 0 otherwise.
+        """
+        if not self.relay:
+            return 0
+        return self.output[f"measure-x-{self.root}"][0]
+
+
+class CreateGHZTree(QuantumProgram):
+    """Turn the bell states into GHZ states in logarithmic depth.
+
+    Bell pairs are fused in a binary tree. In each layer the first
+    qubit of every group fuses with the first qubit of the group next
+    to it, doubling the size of groups, so n pairs are fused in
+    ceil(log2 n) layers of CNOTs and measurements rather than in n.
+    Each measured qubit leaves the rest of its group flipped, so the
+    partner of a qubit needs the parity of the outcomes of every
+    qubit fused above it, see `corrections`.
+
+    Properties
+    ----------
+    bell_qubits : List[int]
+        A list of memory positions to find qubits at.
+    parallel : bool
+        Whether the gates of each layer are run at once.
+    """
+
+    default_num_qubits = -1
+
+    def __init__(self, bell_qubits: List[int], parallel: bool = True) -> None:
+        """Initialise.
+
+        Parameters
+        ----------
+        bell_qubits : List[int]
+            A list of memory positions to act upon, the first is kept.
+        parallel : bool, default True
+            Run the gates of each layer in parallel, if the processor
+            supports it.
+        """
+        super().__init__()
+        self.qubits = list(bell_qubits)
+        self.bell_qubits = self.qubits[1:]
+        self.parallel = parallel
+
+    def layers(self) -> List[List[Tuple[int, int]]]:
+        """Return the (control, target) pairs fused in each layer."""
+        layers = []
+        step = 1
+        while step < len(self.qubits):
+            layers.append(
+                [
+                    (self.qubits[start], self.qubits[start + step])
+                    for start in range(0, len(self.qubits) - step, 2 * step)
+                ]
+            )
+            step *= 2
+        return layers
+
+    def program(self) -> None:
+        """Create a GHZ state from qubits in memory."""
+        logger.debug("Beginning tree GHZ creation.")
+        for layer in self.layers():
+            logger.debug("Fusing %s", layer)
+            for control, target in layer:
+                self.apply(
+                    INSTR_CNOT,
+                    [control, target],
+                    physical=False,
+                    output_key=f"cnot-{target}",
+                )
+            yield self.run(parallel=self.parallel)
+
+            for _, target in layer:
+                self.apply(
+                    INSTR_MEASURE,
+                    target,
+                    output_key=f"measure-{target}",
+                    physical=False,
+                )
+            yield self.run(parallel=self.parallel)
+
+    def corrections(self) -> Dict[int, int]:
+        """Find which Bell pairs need an X correction once run.
+
+        Returns
+        -------
+        Dict[int, int]
+            1 for each memory position whose partner should be
+            flipped, 0 otherwise.
+        """
+        flips = {}
+        for index, qubit in enumerate(self.bell_qubits, start=1):
+            flip = 0
+            step = 1
+            while step < len(self.qubits):
+                offset = index % (2 * step)
+                # The qubit is in the group fused in this layer, whose
+                # first qubit was measured.
+                if offset >= step:
+                    measured = self.qubits[index - offset + step]
+                    flip ^= self.output[f"measure-{measured}"][0]
+                step *= 2
+            flips[qubit] = flip
+        return flips
+
+
+# Programs the bipartite output protocol can fuse Bell pairs with.
+FUSION_PROGRAMS = {"linear": CreateGHZ, "tree": CreateGHZTree}
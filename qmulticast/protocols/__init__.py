@@ -2,5 +2,6 @@
 
 from .bipartiteprotocol import BipartiteProtocol
 from .multipartiteprotocol import MultipartiteProtocol
+from .routedprotocol import RoutedMulticastProtocol
 
-__all__ = [BipartiteProtocol, MultipartiteProtocol]
+__all__ = [BipartiteProtocol, MultipartiteProtocol, RoutedMulticastProtocol]
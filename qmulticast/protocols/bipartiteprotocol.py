@@ -2,15 +2,17 @@
 import logging
 import operator
 from functools import reduce
-from typing import Optional
+from typing import Dict, Generator, List, Optional
 
 from netsquid.components.instructions import INSTR_X
 from netsquid.nodes import Node
 from netsquid.protocols import NodeProtocol
+from netsquid.util.simtools import sim_time
 
-from qmulticast.programs import CreateGHZ
+from qmulticast.programs import FUSION_PROGRAMS
 from qmulticast.protocols.outputprotocol import OutputProtocol
-from qmulticast.utils import fidelity_from_node
+from qmulticast.utils.instrumentation import emit
+from qmulticast.utils.layout import banked
 
 from .inputprotocol import QuantumInputProtocol
 
@@ -43,14 +45,26 @@ class BipartiteProtocol(NodeProtocol):
             Whether this node should act as a source.
             If not the node is a reciever.
         """
-        logger.debug(f"Initialising Bipartite protocol for node {node.name}.")
+        logger.debug("Initialising Bipartite protocol for node %s.", node.name)
         super().__init__(node=node, name=name)
 
         self._output = source
         self._input = receiver
 
         if self._output:
-            self.add_subprotocol(BipartiteOutputProtocol(self.node))
+            output = BipartiteOutputProtocol(self.node)
+            self.add_subprotocol(output)
+            # Pipelined rounds each use their own memory bank and share
+            # the fidelity statistics of the first.
+            for bank in range(1, self.node.supercomponent.pipeline_depth):
+                self.add_subprotocol(
+                    BipartiteOutputProtocol(
+                        self.node,
+                        name=f"output-{self.node.name}-bank{bank}",
+                        bank=bank,
+                        fidelity=output.fidelity,
+                    )
+                )
 
         if self._input:
             self.add_subprotocol(
@@ -60,27 +74,55 @@ class BipartiteProtocol(NodeProtocol):
     def run(self) -> None:
         """Run the protocol."""
         node = self.node
-        logger.debug(f"Running bipartite protocol on node {node.name}.")
+        logger.debug("Running bipartite protocol on node %s.", node.name)
         self.start_subprotocols()
 
 
 class BipartiteOutputProtocol(OutputProtocol):
-    """Defines behaviour of node when outputting qubits"""
+    """Defines behaviour of node when outputting qubits
+
+    With a pipeline depth above one there is a protocol per memory
+    bank. Bank b starts b / depth of a transmission time after bank 0,
+    so a new round starts every transmission time / depth rather than
+    once per transmission time.
+
+    If ``network.keep_links`` is set, the Bell pairs which arrive are
+    kept and only the links which failed are retried, until all are
+    present and fused. Pairs kept for longer than
+    ``network.memory_cutoff`` are discarded and retried too.
+
+    If ``network.heralded`` is set, a round ends once every reciever
+    has heralded its qubit rather than after the transmission time.
+    A round ends as soon as a qubit is heralded lost, skipping the
+    corrections, and qubits of that round still in flight are discarded
+    as they arrive.
+    """
 
-    def __init__(self, node: Node, name: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        node: Node,
+        name: Optional[str] = None,
+        bank: int = 0,
+        fidelity: Optional[Generator] = None,
+    ) -> None:
         logger.debug("Initialising bipartite output protocol.")
-        super().__init__(node=node, name=name)
+        super().__init__(node=node, name=name, bank=bank, fidelity=fidelity)
+        network = self.node.supercomponent
         mem_ports = self.node.qmemory.ports
         self.q_out_ports = [
-            value for key, value in self.node.ports.items() if "qout" in key
+            self.node.ports[banked(edge.qout, bank)] for edge in self.edges
         ]
-        self.source_mem = [
-            mem_ports[f"qin{num}"] for num in range(0, len(self.q_out_ports) * 2, 2)
+        self.bell_qubits = [
+            edge.local_position + self.bank_offset for edge in self.edges
         ]
-        self.sources = [
-            f"qsource-{port.name.lstrip('qout-')}" for port in self.q_out_ports
-        ]
-        self.fidelity = fidelity_from_node(self.node)
+        self.source_mem = [mem_ports[f"qin{position}"] for position in self.bell_qubits]
+        self.sources = [banked(edge.source, bank) for edge in self.edges]
+        self.depth = network.pipeline_depth
+        # Other banks or sessions may be using the rest of the memory.
+        self.shared_memory = self.depth > 1 or len(network.sessions) > 1
+        self.program = FUSION_PROGRAMS[network.fusion]
+        self.keep_links = network.keep_links
+        self.memory_cutoff = network.memory_cutoff
 
     def _trigger_all_sources(self) -> None:
         """Trigger all sources on the node."""
@@ -90,54 +132,174 @@ class BipartiteOutputProtocol(OutputProtocol):
         for source in self.sources:
             # Trigger the source
             self.node.subcomponents[source].trigger()
-            logger.debug(f"Triggered source {source}.")
+            logger.debug("Triggered source %s.", source)
 
-    def _do_corrections(self, prog_output: dict) -> None:
+    def _do_corrections(self, corrections: Dict[int, int]) -> Generator:
         """Correct qubits for GHZ state creation.
 
         Parameters
         ---------
-        prog_output : dict
-            The output of a quantum program.
+        corrections : Dict[int, int]
+            Whether the partner of each memory position needs flipping,
+            as found by the fusion program.
         """
         logger.debug("Completing corrections.")
         network = self.node.supercomponent
+        layout = network.layout
+
+        for qubit_no, flip in corrections.items():
+            # If there is no flip do nothing.
+            if not flip:
+                logger.debug("No correction for qubit %s", qubit_no)
+                continue
+
+            logger.debug("Correcting for qubit %s", qubit_no)
+            edge = layout.local_edge(self.node.name, qubit_no)
+
+            end_qmemory = network.nodes[edge.end].qmemory
+            position = edge.remote_position + layout.bank_offset(edge.end, self.bank)
+            if end_qmemory.peek(position, skip_noise=True)[0] is None:
+                logger.warning("Could not find qubit on node %s", edge.end)
+                logger.debug("Skipping run.")
+                continue
+
+            yield from self._await_processor(end_qmemory)
+            end_qmemory.execute_instruction(
+                instruction=INSTR_X,
+                qubit_mapping=[position],
+                physical=False,
+            )
 
-        for record, value in prog_output.items():
-            if "measure" in record:
-                # If the measurement is 0 do nothing.
-                if value == [0]:
-                    logger.debug("No correction for measure %s", record)
-                    continue
+            logger.debug("Completed correction on node %s", edge.end)
+            emit("bipartite.correction", node=self.node.name, edge=edge.name)
 
-                logger.debug("Correcting for measure %s", record)
-                qubit_no = int(record.lstrip("measure-"))
-                qubit = self.node.qmemory.peek(qubit_no)[0]
+    def _discard_link(self, link: int) -> None:
+        """Discard both halves of the Bell pair of a link.
 
-                edgenodes = qubit.name.split("-")[1:3]
-                end_name = edgenodes[-1]
-                edge_name = "-".join(edgenodes)
+        Parameters
+        ----------
+        link : int
+            The index of the link's edge.
+        """
+        self.node.qmemory.pop(self.bell_qubits[link], skip_noise=True)
+        self._discard_remote(link)
 
-                end_qmemory = network.nodes[end_name].qmemory
-                qubit = end_qmemory.get_matching_qubits("edge", value=edge_name)
+    def _retry_failed(self) -> Generator:
+        """Retry failed links until all are present, then fuse them.
 
-                if len(qubit) == 0:
-                    logger.warning("Could not find qubit on node %s", end_name)
-                    logger.debug("Skipping run.")
-                    continue
+        Each attempt triggers the sources of the links without a Bell
+        pair and is sent to the fidelity generator, which only finds
+        the fidelity once every link is present. With heralds an
+        attempt ends as soon as a link is heralded lost, so that link
+        is retried while the others are still in flight.
+        """
+        network = self.node.supercomponent
+        layout = network.layout
+        remote = [
+            (
+                network.nodes[edge.end].qmemory,
+                edge.remote_position + layout.bank_offset(edge.end, self.bank),
+            )
+            for edge in self.edges
+        ]
+        # The time the Bell pair of each link which was sent was made.
+        created: Dict[int, float] = {}
+        # Links sent but not heralded yet.
+        in_flight: List[int] = []
 
-                end_qmemory.execute_instruction(
-                    instruction=INSTR_X, qubit_mapping=qubit, physical=False
-                )
+        while True:
+            self._phase("source_wait")
+            pending = [link for link in range(len(self.edges)) if link not in created]
+            await_sources = [
+                self.await_port_input(self.source_mem[link]) for link in pending
+            ]
+            for link in pending:
+                self.node.subcomponents[self.sources[link]].trigger()
+                created[link] = sim_time()
+            logger.debug("Triggered sources of links %s.", pending)
+            if pending:
+                yield reduce(operator.and_, await_sources)
+
+            if self.heralded:
+                self._phase("heralds")
+                waiting = in_flight + pending
+                heralds = yield from self._await_heralds(waiting, keep_in_flight=True)
+                failed = [link for link, arrived in heralds.items() if not arrived]
+                in_flight = [link for link in waiting if link not in heralds]
+            else:
+                await_recieved = [
+                    self.await_timer(
+                        self._transmission_time(self.q_out_ports[link].name)
+                    )
+                    for link in pending
+                ]
+                self._phase("timers")
+                yield reduce(operator.and_, await_recieved)
+                failed = [
+                    link
+                    for link in pending
+                    if remote[link][0].peek(remote[link][1], skip_noise=True)[0] is None
+                ]
+
+            for link in failed:
+                del created[link]
+
+            if self.memory_cutoff is not None:
+                now = sim_time()
+                for link in list(created):
+                    if link in pending or link in in_flight:
+                        continue
+                    if now - created[link] > self.memory_cutoff:
+                        logger.debug("Link %s passed the memory cutoff.", link)
+                        self._discard_link(link)
+                        del created[link]
+                        emit("bipartite.cutoff", node=self.node.name, link=link)
+
+            if len(created) < len(self.edges) or in_flight:
+                # Count the attempt, keeping the links which arrived.
+                self._phase("fidelity")
+                self.fidelity.send((self.bank, None))
+                self._phase("reset")
+                for link in failed:
+                    self.node.qmemory.pop(self.bell_qubits[link], skip_noise=True)
+                emit("bipartite.retry", node=self.node.name, failed=len(failed))
+                continue
+
+            self._phase("program")
+            prog = self.program(self.bell_qubits)
+            yield from self._await_processor(self.node.qmemory)
+            self.node.qmemory.execute_program(prog)
+            yield self.await_program(self.node.qmemory)
+            logger.debug("Program complete, output %s.", prog.output)
+            emit(
+                "bipartite.fused", node=self.node.name, output=lambda: dict(prog.output)
+            )
+            self._phase("corrections")
+            yield from self._do_corrections(prog.corrections())
 
-                logger.debug("Completed correction on node %s", end_name)
+            self._phase("fidelity")
+            self.fidelity.send((self.bank, prog.output))
+
+            # Only clear this source's qubits, the node may be keeping
+            # links for other sources.
+            self._phase("reset")
+            self.node.qmemory.pop(self.bell_qubits, skip_noise=True)
+            created.clear()
 
     def run(self) -> None:
         """The protocol to be run by a source node."""
-        logger.debug(f"Running Bipartite Output protocol.")
+        logger.debug("Running Bipartite Output protocol.")
 
-        while True:
+        if self.keep_links:
+            yield from self._retry_failed()
 
+        if self.bank:
+            # Stagger the banks evenly over the longest transmission time.
+            delay = max(self._transmission_time(port.name) for port in self.q_out_ports)
+            yield self.await_timer(delay * self.bank / self.depth)
+
+        while True:
+            self._phase("source_wait")
             await_all_sources = [
                 self.await_port_input(port) for port in self.source_mem
             ]
@@ -146,25 +308,43 @@ class BipartiteOutputProtocol(OutputProtocol):
             logger.debug("Got all memory input from sources.")
 
             # Do entanglement
-            bell_qubits = [
-                pos for pos in self.node.qmemory.used_positions if pos % 2 == 0
-            ]
-            prog = CreateGHZ(bell_qubits)
-            logger.debug(f"Executing program with qubits {bell_qubits}")
+            self._phase("program")
+            prog = self.program(self.bell_qubits)
+            logger.debug("Executing program with qubits %s", self.bell_qubits)
+            yield from self._await_processor(self.node.qmemory)
             self.node.qmemory.execute_program(prog)
             yield self.await_program(self.node.qmemory)
             logger.debug("Program complete, output %s.", prog.output)
+            emit(
+                "bipartite.fused", node=self.node.name, output=lambda: dict(prog.output)
+            )
 
-            await_recieved = [
-                self.await_timer(self._transmission_time(port_name))
-                for port_name in self.node.ports
-                if "qout" in port_name
-            ]
-            logger.debug("Waiting transmission time.")
-            yield reduce(operator.and_, await_recieved)
-            self._do_corrections(prog.output)
-
-            next(self.fidelity)
+            if self.heralded:
+                self._phase("heralds")
+                # A loss ends the wait with other qubits still in flight.
+                heralds = yield from self._await_heralds(range(len(self.edges)))
+                complete = len(heralds) == len(self.edges) and all(heralds.values())
+            else:
+                await_recieved = [
+                    self.await_timer(self._transmission_time(port.name))
+                    for port in self.q_out_ports
+                ]
+                logger.debug("Waiting transmission time.")
+                self._phase("timers")
+                yield reduce(operator.and_, await_recieved)
+                complete = True
+
+            # There is no GHZ state to correct if a qubit was lost.
+            if complete:
+                self._phase("corrections")
+                yield from self._do_corrections(prog.corrections())
+
+            self._phase("fidelity")
+            self.fidelity.send((self.bank, prog.output))
 
             logger.debug("Clearing local memory.")
-            self.node.qmemory.reset()
+            self._phase("reset")
+            if self.shared_memory:
+                self.node.qmemory.pop(self.bell_qubits, skip_noise=True)
+            else:
+                self.node.qmemory.reset()
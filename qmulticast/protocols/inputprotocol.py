@@ -8,8 +8,15 @@ from netsquid.components.component import Port
 from netsquid.nodes import Node
 from netsquid.protocols import NodeProtocol
 
+from qmulticast.utils.instrumentation import emit
+from qmulticast.utils.layout import EdgeLayout
+
 logger = logging.getLogger(__name__)
 
+# Messages recievers herald their qubits with.
+HERALD_ARRIVED = "Herald arrived"
+HERALD_LOST = "Herald lost"
+
 
 class QuantumInputProtocol(NodeProtocol):
     """ Defines behviour needed when a source expects input qubits."""
@@ -25,34 +32,91 @@ class QuantumInputProtocol(NodeProtocol):
             A name to assign the protocol.
         """
         super().__init__(node=node, name=name)
-        mem_positions = self.node.qmemory.num_positions
         mem_ports = self.node.qmemory.ports
-        self.q_in_ports = [mem_ports[f"qin{num}"] for num in range(1, mem_positions, 2)]
-
-        self.c_in_ports = [
-            port for port in self.node.ports.values() if "cin" in port.name
+        layout = self.node.supercomponent.layout
+        in_edges = layout.in_edges[self.node.name]
+        # Each in-edge has a memory position in every bank.
+        positions = [
+            edge.remote_position + layout.bank_offset(self.node.name, bank)
+            for bank in range(layout.banks)
+            for edge in in_edges
         ]
+        self.q_in_ports = [mem_ports[f"qin{position}"] for position in positions]
+        self.c_in_ports = [self.node.ports[edge.cin] for edge in in_edges]
         self.add_signal(label="recieved")
 
+        if self.node.supercomponent.heralded:
+            for edge in in_edges:
+                self.add_subprotocol(
+                    HeraldProtocol(self.node, edge, name=f"herald-{edge.name}")
+                )
+
     def run(self) -> None:
         """Protocol for reciver."""
         # Get input
-        logger.debug(f"Running Quantum Input protocol.")
+        logger.debug("Running Quantum Input protocol.")
         await_quantum_input = [self.await_port_input(port) for port in self.q_in_ports]
 
         self.start_subprotocols()
 
         while True:
             yield reduce(operator.or_, await_quantum_input)
-            logger.debug(
-                f"Got qubit input: memory useage {self.node.qmemory.used_positions}"
-            )
-            logger.debug(
-                f"Node {self.node.name} used memory: {self.node.qmemory.used_positions}"
+            logger.debug("Node %s got qubit input.", self.node.name)
+            emit(
+                "input.received",
+                node=self.node.name,
+                used_positions=lambda: self.node.qmemory.used_positions,
             )
             self.send_signal("recieved")
 
 
+class HeraldProtocol(NodeProtocol):
+    """Herald whether the qubit of an in-edge arrived to its source.
+
+    A lost qubit which still reaches the memory port, as an empty
+    message, is heralded as lost. Otherwise the source stops waiting
+    once the transmission time is up. Classical channels have no
+    delay, so the source hears of each qubit as soon as it arrives.
+    """
+
+    def __init__(
+        self, node: Node, edge: EdgeLayout, name: Optional[str] = None
+    ) -> None:
+        """Initialise
+
+        Paramters
+        ---------
+        node : Node
+            The node on which the protocol should be run.
+        edge : EdgeLayout
+            The in-edge to herald the qubits of.
+        name : str
+            A name to assign the protocol.
+        """
+        super().__init__(node=node, name=name)
+        self.edge = edge
+        self.position = edge.remote_position
+        self.q_in_port = self.node.qmemory.ports[f"qin{self.position}"]
+        self.c_port = self.node.ports[edge.cin]
+
+    def run(self) -> None:
+        """Send a herald for every qubit input."""
+        while True:
+            yield self.await_port_input(self.q_in_port)
+            # Let the memory store the qubit before looking for it.
+            yield self.await_timer(0)
+            qubit = self.node.qmemory.peek(self.position, skip_noise=True)[0]
+            arrived = qubit is not None
+            logger.debug("Node %s heralding %s.", self.node.name, arrived)
+            self.c_port.tx_output(HERALD_ARRIVED if arrived else HERALD_LOST)
+            emit(
+                "input.herald",
+                node=self.node.name,
+                edge=self.edge.name,
+                arrived=arrived,
+            )
+
+
 class ClassicalInputPortProtocol(NodeProtocol):
     """For listening on classical ports. NOT IN USE."""
 
@@ -62,12 +126,12 @@ class ClassicalInputPortProtocol(NodeProtocol):
 
     def run(self) -> None:
         """Wait for input signal and delete qubit as appropriate."""
-        logger.debug(f"Node {self.node.name} listening on {self.port.name}.")
+        logger.debug("Node %s listening on %s.", self.node.name, self.port.name)
         while True:
             yield self.await_port_input(self.port)
             message = self.port.rx_input()
             logger.debug("Node %s recieved message %s", self.node, message.items)
-            edge = self.port.name.lstrip("cin-")
+            edge = self.port.name[len("cin-") :]
             matching_qubits = self.node.qmemory.get_matching_qubits("edge", value=edge)
 
             if f"Delete qubit {edge}" in message.items:
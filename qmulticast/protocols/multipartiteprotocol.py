@@ -43,14 +43,11 @@ class MultipartiteProtocol(NodeProtocol):
             Whether this node should act as a source.
             If not the node is a reciever.
         """
-        logger.debug(f"Initialising Bipartite protocol for node {node.name}.")
+        logger.debug("Initialising Bipartite protocol for node %s.", node.name)
         super().__init__(node=node, name=name)
 
-        self.input_ports = [port for port in self.node.qmemory.ports if "qin" in port]
-        self.input_ports.remove("qin")
-        self.input_ports = [
-            port for port in self.input_ports if int(port.lstrip("qin")) % 2 == 1
-        ]
+        in_edges = self.node.supercomponent.layout.in_edges[self.node.name]
+        self.input_ports = [f"qin{edge.remote_position}" for edge in in_edges]
         self.fidelity = fidelity_from_node(self.node)
 
         self._output = source
@@ -65,7 +62,7 @@ class MultipartiteProtocol(NodeProtocol):
     def run(self) -> None:
         """Run the protocol."""
         node = self.node
-        logger.debug(f"Running bipartite protocol on node {node.name}.")
+        logger.debug("Running bipartite protocol on node %s.", node.name)
         self.start_subprotocols()
 
 
@@ -79,28 +76,34 @@ class MultipartiteOutputProtocol(OutputProtocol):
     def run(self) -> None:
         """Protocol for reciver."""
         # Get input
-        logger.debug(f"Running Multi output protocol.")
+        logger.debug("Running Multi output protocol.")
 
         """Run the protocol."""
         node = self.node
-        logger.debug(f"Running multipartite protocol on node {node.name}.")
-        logger.debug(f"Node: {node.name} " + f"has {self._mem_size} memory slots.")
+        logger.debug("Running multipartite protocol on node %s.", node.name)
+        logger.debug("Node: %s has %s memory slots.", node.name, self._mem_size)
         has_triggered = False
         while True:
             if not (has_triggered):
+                self._phase("source_wait")
                 self.node.subcomponents[f"qsource-{node.name}"].trigger()
-                logger.debug(f"Triggered source qsource-{node.name}.")
+                logger.debug("Triggered source qsource-%s.", node.name)
 
                 yield self.await_port_input(node.qmemory.ports["qin0"])
 
                 logger.debug("source got own qubit in memory")
 
                 self.send_signal(Signals.SUCCESS)
-                await_recieved = [
-                    self.await_timer(self._transmission_time(port_name))
-                    for port_name in self.node.ports
-                    if "qout" in port_name
-                ]
-                logger.debug("Waiting transmission time.")
-                yield reduce(operator.and_, await_recieved)
+                if self.heralded:
+                    self._phase("heralds")
+                    yield from self._await_heralds(range(len(self.edges)))
+                else:
+                    await_recieved = [
+                        self.await_timer(self._transmission_time(edge.qout))
+                        for edge in self.edges
+                    ]
+                    logger.debug("Waiting transmission time.")
+                    self._phase("timers")
+                    yield reduce(operator.and_, await_recieved)
+                self._phase("fidelity")
                 next(self.fidelity)
@@ -1,12 +1,21 @@
 """Defines the base output protocol."""
 
 import logging
-from typing import Optional
+import operator
+from functools import reduce
+from typing import Dict, Generator, Iterable, Optional
 
+from netsquid.components import QuantumProcessor
 from netsquid.nodes import Node
 from netsquid.protocols import NodeProtocol
+from netsquid.util.simtools import sim_time
 
 from qmulticast.utils import fidelity_from_node
+from qmulticast.utils.instrumentation import emit
+from qmulticast.utils.layout import banked
+from qmulticast.utils.sessions import record_contention
+
+from .inputprotocol import HERALD_ARRIVED
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +23,13 @@ logger = logging.getLogger(__name__)
 class OutputProtocol(NodeProtocol):
     """Defines behaviour of node when outputting qubits"""
 
-    def __init__(self, node: Node, name: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        node: Node,
+        name: Optional[str] = None,
+        bank: int = 0,
+        fidelity: Optional[Generator] = None,
+    ) -> None:
         """Initialise
 
         Paramters
@@ -23,33 +38,167 @@ class OutputProtocol(NodeProtocol):
             The node on which the protocol should be run.
         name : str
             A name to assign the protocol.
+        bank : int, default 0
+            The memory bank the protocol's rounds use.
+        fidelity : Generator, optional
+            A started `fidelity_from_node` generator to share with the
+            node's other output protocols, a new one is made if not given.
         """
         super().__init__(node=node, name=name)
         logger.debug("Initialing base output protocol.")
-        self.fidelity = fidelity_from_node(self.node)
+        network = self.node.supercomponent
+        self.edges = network.layout.out_edges[self.node.name]
+        self.bank = bank
+        self.bank_offset = network.layout.bank_offset(self.node.name, bank)
+        # Set to a PhaseProfiler to time each phase of every round.
+        self.profiler = getattr(network, "profiler", None)
+        self.heralded = getattr(network, "heralded", False)
+        # Heralds still to come, by link, for qubits of rounds which
+        # were ended early by a loss.
+        self._stale: Dict[int, int] = {}
+        if fidelity is None:
+            fidelity = fidelity_from_node(self.node)
+            next(fidelity)
+        self.fidelity = fidelity
+
+    def _phase(self, phase: str) -> None:
+        """Mark the start of a phase of a round if profiling.
+
+        Parameters
+        ----------
+        phase : str
+            The name of the phase.
+        """
+        if self.profiler is not None:
+            self.profiler.enter(type(self).__name__, phase)
+
+    def _await_processor(self, qmemory: QuantumProcessor) -> Generator:
+        """Wait for a processor to finish what other protocols run on it.
+
+        Waits are recorded as contention of this protocol's session.
+
+        Parameters
+        ----------
+        qmemory : QuantumProcessor
+            The processor to wait for.
+        """
+        if not qmemory.busy:
+            return
+
+        start = sim_time()
+        while qmemory.busy:
+            yield self.await_program(qmemory)
+        wait = sim_time() - start
+        logger.debug("Waited %s for processor %s.", wait, qmemory.name)
+        record_contention(self.node.supercomponent, self.node.name, wait)
+        emit(
+            "session.contention", node=self.node.name, processor=qmemory.name, wait=wait
+        )
 
     def _send_all_delete(self) -> None:
         """Send a classical message to each reciever node."""
         logger.debug("Sending delete instruction to all nodes.")
-        for port_name, port in self.node.ports.items():
-            if "cout" in port_name:
-                edge = port_name.lstrip("cout-")
-                port.tx_output(f"Delete qubit {edge}")
+        for edge in self.edges:
+            self.node.ports[edge.cout].tx_output(f"Delete qubit {edge.name}")
+
+    def _await_heralds(
+        self, links: Iterable[int], keep_in_flight: bool = False
+    ) -> Generator:
+        """Wait for the recievers of links to herald their qubits.
 
-    def _transmission_time(self, port_name: str) -> None:
+        The wait ends as soon as a qubit is heralded lost, as the round
+        has then failed. The qubits of links still in flight are then
+        discarded as they arrive, unless ``keep_in_flight`` is set and
+        the caller waits for them again. Heralds which never come, as
+        when a lost qubit doesn't reach its reciever at all, are given
+        up on after the transmission time, with one timer for the wait.
+
+        Parameters
+        ----------
+        links : Iterable[int]
+            The indices of the edges to wait for.
+        keep_in_flight : bool, default False
+            Leave the qubits still in flight when a loss ends the wait.
+
+        Returns
+        -------
+        Dict[int, bool]
+            Whether the qubit of each link arrived, for the links which
+            were heralded or given up on.
+        """
+        links = list(links)
+        ports = {link: self.node.ports[self.edges[link].cout] for link in links}
+        await_timeout = self.await_timer(
+            end_time=sim_time()
+            + max(
+                self._transmission_time(banked(self.edges[link].qout, self.bank))
+                for link in links
+            )
+        )
+        heralds: Dict[int, bool] = {}
+        while len(heralds) < len(links) and all(heralds.values()):
+            await_heralds = [
+                self.await_port_input(port)
+                for link, port in ports.items()
+                if link not in heralds
+            ]
+            expression = yield reduce(operator.or_, await_heralds) | await_timeout
+            if expression.second_term.value:
+                logger.debug("Gave up waiting for heralds.")
+                return {link: heralds.get(link, False) for link in links}
+
+            for link, port in ports.items():
+                message = None if link in heralds else port.rx_input()
+                if message is None:
+                    continue
+                if self._stale.get(link):
+                    # A qubit of a round which was ended early.
+                    self._stale[link] -= 1
+                    self._discard_remote(link)
+                    continue
+                heralds[link] = HERALD_ARRIVED in message.items
+
+        in_flight = [link for link in links if link not in heralds]
+        if in_flight:
+            logger.debug("Qubit lost with links %s in flight.", in_flight)
+            emit("output.herald_lost", node=self.node.name, in_flight=len(in_flight))
+            if not keep_in_flight:
+                for link in in_flight:
+                    self._stale[link] = self._stale.get(link, 0) + 1
+        return heralds
+
+    def _discard_remote(self, link: int) -> None:
+        """Discard the qubit at the end of a link.
+
+        Parameters
+        ----------
+        link : int
+            The index of the link's edge.
+        """
+        network = self.node.supercomponent
+        edge = self.edges[link]
+        position = edge.remote_position + network.layout.bank_offset(
+            edge.end, self.bank
+        )
+        network.nodes[edge.end].qmemory.pop(position, skip_noise=True)
+
+    def _transmission_time(self, port_name: str, node: Optional[Node] = None) -> None:
         """Wait for a qubit to be received at the end of a channel.
 
         Paramters
         ---------
         port_name : str
             The name of an ns.Port object to find the transmission time of.
+        node : Node, optional
+            The node the port is on, by default the protocol's node.
         """
-
-        connection = self.node.ports[port_name].connected_port.component
+        if node is None:
+            node = self.node
+        connection = node.ports[port_name].connected_port.component
         channel = connection.channel_AtoB
 
         delay = channel.compute_delay()
-        logger.debug(f"Found transmission time {delay} for channel {channel.name}")
+        logger.debug("Found transmission time %s for channel %s", delay, channel.name)
 
         # Have to wait slightly longer than transmission time as NS
         # doesn't let us have access to things at the instant they happen.
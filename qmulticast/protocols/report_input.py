@@ -52,9 +52,9 @@ class MoveInput(NodeProtocol):
         spaces = self.node.qmemory.unused_positions
         if spaces:
             input_qubit = self.node.qmemory.pop(self.mem_pos)
-            logger.debug(f"Node {self.node.name} got qubit {input_qubit}")
+            logger.debug("Node %s got qubit %s", self.node.name, input_qubit)
             self.node.qmemory.put(qubits=input_qubit, positions=spaces[0])
             logger.debug("\tput qubit in memory position %s", spaces[0])
-            logger.debug(f"\tEmpty memory: {self.node.qmemory.unused_positions}")
+            logger.debug("\tEmpty memory: %s", self.node.qmemory.unused_positions)
         else:
-            logger.debug(f"Node: {self.node.name} No memory spaces left.")
+            logger.debug("Node: %s No memory spaces left.", self.node.name)
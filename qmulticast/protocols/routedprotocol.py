@@ -0,0 +1,220 @@
+"""Defines the protocol to multicast GHZ states along routed trees."""
+
+import logging
+import operator
+from functools import reduce
+from typing import Dict, Generator, Iterable, Optional
+
+from netsquid.components.instructions import INSTR_X, INSTR_Z
+from netsquid.nodes import Node
+
+from qmulticast.programs import CreateGHZ
+from qmulticast.utils import fidelity_from_node
+from qmulticast.utils.instrumentation import emit
+from qmulticast.utils.layout import EdgeLayout
+from qmulticast.utils.routing import steiner_route
+
+from .outputprotocol import OutputProtocol
+
+logger = logging.getLogger(__name__)
+
+
+class RoutedMulticastProtocol(OutputProtocol):
+    """Share GHZ states with receivers the source isn't linked to.
+
+    The links of the least loss tree reaching the receivers, found by
+    `steiner_route`, each get a Bell pair from the source at their
+    start. Once the photons have crossed, every node of the tree fuses
+    the qubit from its parent with the local halves of the links to its
+    children, and relays measure their own qubit out of the state.
+
+    The protocol runs on the source and applies the corrections of the
+    whole tree itself, as classical messages take no time. A round
+    fails if any link loses its photon, and the receivers below that
+    link are then left without a qubit.
+    """
+
+    def __init__(
+        self, node: Node, receivers: Iterable[str], name: Optional[str] = None
+    ) -> None:
+        """Initialise
+
+        Paramters
+        ---------
+        node : Node
+            The source node.
+        receivers : Iterable[str]
+            The names of the nodes to share GHZ states with.
+        name : str
+            A name to assign the protocol.
+        """
+        logger.debug("Initialising routed multicast protocol.")
+        network = node.supercomponent
+        layout = network.layout
+        route = steiner_route(
+            network.graph,
+            node.name,
+            receivers,
+            network.constants["p_loss_init"],
+            network.constants["p_loss_length"],
+        )
+        links = [layout.edge(start, end) for start, end in route.links]
+        # Receivers get their GHZ qubit over the link from their parent.
+        receiver_links = [edge for edge in links if edge.end in route.receivers]
+        root = next(edge for edge in links if edge.start == node.name)
+        fidelity = fidelity_from_node(node, receiver_links, root=root.local_position)
+        next(fidelity)
+        super().__init__(node=node, name=name, fidelity=fidelity)
+
+        self.route = route
+        self.links = links
+        self.root = root.local_position
+
+    def _arrived(self, edge: EdgeLayout) -> bool:
+        """Check whether the photon of a link reached its end.
+
+        Parameters
+        ----------
+        edge : EdgeLayout
+            The link to check.
+        """
+        qmemory = self.node.supercomponent.nodes[edge.end].qmemory
+        return qmemory.peek(edge.remote_position, skip_noise=True)[0] is not None
+
+    def _fuse(self) -> Generator:
+        """Start the programs fusing the qubits of each node of the tree.
+
+        Returns
+        -------
+        Dict[str, CreateGHZ]
+            The program running on each node with qubits to fuse.
+        """
+        network = self.node.supercomponent
+        programs = {}
+        for node_name in [self.route.source, *(end for _, end in self.route.links)]:
+            out_links = [edge for edge in self.links if edge.start == node_name]
+            if node_name == self.route.source:
+                qubits = [edge.local_position for edge in out_links]
+            elif out_links:
+                in_link = next(edge for edge in self.links if edge.end == node_name)
+                qubits = [in_link.remote_position]
+                qubits += [edge.local_position for edge in out_links]
+            else:
+                # Leaves keep the qubit they were sent as it is.
+                continue
+
+            program = CreateGHZ(qubits, relay=node_name in self.route.relays)
+            logger.debug("Fusing qubits %s on node %s.", qubits, node_name)
+            qmemory = network.nodes[node_name].qmemory
+            yield from self._await_processor(qmemory)
+            qmemory.execute_program(program)
+            programs[node_name] = program
+        return programs
+
+    def _do_corrections(self, programs: Dict[str, CreateGHZ]) -> Generator:
+        """Correct the receivers' qubits for the fusions of every node.
+
+        A qubit needs flipping if an odd number of the measurements on
+        its path from the source found its pair flipped. The phase
+        flips of relays measured out of the state are corrected on the
+        source's qubit.
+
+        Parameters
+        ----------
+        programs : Dict[str, CreateGHZ]
+            The finished program of each node which fused qubits.
+        """
+        network = self.node.supercomponent
+        # Whether the qubit each node got from its parent needs a flip.
+        flips = {self.route.source: 0}
+        for edge in self.links:
+            flip = flips[edge.start]
+            if edge.start in programs:
+                flip ^= programs[edge.start].corrections().get(edge.local_position, 0)
+            flips[edge.end] = flip
+
+            if flip and edge.end in self.route.receivers:
+                qmemory = network.nodes[edge.end].qmemory
+                yield from self._await_processor(qmemory)
+                qmemory.execute_instruction(
+                    instruction=INSTR_X,
+                    qubit_mapping=[edge.remote_position],
+                    physical=False,
+                )
+                emit("routed.correction", node=edge.end, edge=edge.name)
+
+        phase = 0
+        for program in programs.values():
+            phase ^= program.phase()
+        if phase:
+            yield from self._await_processor(self.node.qmemory)
+            self.node.qmemory.execute_instruction(
+                instruction=INSTR_Z, qubit_mapping=[self.root], physical=False
+            )
+            emit("routed.phase", node=self.node.name)
+
+    def _clear(self, links: Iterable[EdgeLayout]) -> None:
+        """Discard both halves of the Bell pairs of links.
+
+        Only the tree's own memory positions are cleared, as other
+        sessions may be using the rest of each node's memory.
+
+        Parameters
+        ----------
+        links : Iterable[EdgeLayout]
+            The links to clear.
+        """
+        nodes = self.node.supercomponent.nodes
+        for edge in links:
+            nodes[edge.start].qmemory.pop(edge.local_position, skip_noise=True)
+            nodes[edge.end].qmemory.pop(edge.remote_position, skip_noise=True)
+
+    def run(self) -> None:
+        """The protocol to be run by the source node."""
+        logger.debug("Running routed multicast protocol over %s.", self.route.links)
+        nodes = self.node.supercomponent.nodes
+
+        while True:
+            self._phase("source_wait")
+            await_all_sources = [
+                self.await_port_input(
+                    nodes[edge.start].qmemory.ports[f"qin{edge.local_position}"]
+                )
+                for edge in self.links
+            ]
+            for edge in self.links:
+                nodes[edge.start].subcomponents[edge.source].trigger()
+            yield reduce(operator.and_, await_all_sources)
+
+            # Every link is sent at once, so one timer covers them all.
+            self._phase("timers")
+            yield self.await_timer(
+                max(
+                    self._transmission_time(edge.qout, nodes[edge.start])
+                    for edge in self.links
+                )
+            )
+
+            lost = [edge for edge in self.links if not self._arrived(edge)]
+            if lost:
+                # Nothing below a lost link can join the GHZ state.
+                for edge in lost:
+                    logger.debug("Lost qubit on link %s.", edge.name)
+                    emit("routed.lost", edge=edge.name)
+                    below = self.route.subtree(edge.end)
+                    self._clear(link for link in self.links if link.end in below)
+            else:
+                self._phase("program")
+                programs = yield from self._fuse()
+                yield reduce(
+                    operator.and_,
+                    [self.await_program(nodes[name].qmemory) for name in programs],
+                )
+                self._phase("corrections")
+                yield from self._do_corrections(programs)
+
+            self._phase("fidelity")
+            self.fidelity.send((self.bank, None))
+
+            self._phase("reset")
+            self._clear(self.links)
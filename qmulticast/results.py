@@ -0,0 +1,357 @@
+"""Columnar storage of sweep results.
+
+A sweep is stored as a single NumPy ``.npz`` file holding one array
+per column and one row per simulated point, so a whole sweep loads
+with one read. Numeric columns are floats with NaN for missing values.
+
+Folders of CSV files written by older sweeps can still be loaded, and
+are converted once into a cache next to them.
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The parameters of a point.
+PARAMETER_FIELDS = (
+    "type",
+    "graph",
+    "number of edges",
+    "edge length",
+    "p_loss_length",
+    "p_loss_init",
+    "noise rate",
+    "seed",
+)
+
+# The statistics measured at a point, in the order `fidelity_from_node` finds them.
+STATISTIC_FIELDS = (
+    "runs",
+    "hits",
+    "mean fidelity",
+    "fidelity std",
+    "loss rate",
+    "min time",
+    "mean time",
+    "time std",
+    "entanglement rate",
+    "fidelity median",
+    "time median",
+    "stop reason",
+    "fidelity ci",
+    "rate ci",
+)
+
+# The statistics of all sessions of a point, see `qmulticast.utils.sessions`.
+NETWORK_FIELDS = (
+    "sessions",
+    "network throughput",
+    "contentions",
+    "contention time",
+)
+
+FIELDS = PARAMETER_FIELDS + STATISTIC_FIELDS + NETWORK_FIELDS
+
+# Columns stored as strings rather than floats.
+TEXT_FIELDS = frozenset({"type", "graph", "stop reason"})
+
+
+def to_columns(
+    rows: Sequence[Dict[str, Any]], fields: Sequence[str] = FIELDS
+) -> Dict[str, np.ndarray]:
+    """Turn rows of results into columns.
+
+    Parameters
+    ----------
+    rows : Sequence[Dict[str, Any]]
+        The rows, missing values may be left out or None.
+    fields : Sequence[str]
+        The columns to make.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        An array for each field.
+    """
+    columns = {}
+    for field in fields:
+        values = [row.get(field) for row in rows]
+        if field in TEXT_FIELDS:
+            columns[field] = np.array(
+                ["" if value is None else str(value) for value in values], dtype=str
+            )
+        else:
+            columns[field] = np.array(
+                [np.nan if value is None else value for value in values], dtype=float
+            )
+    return columns
+
+
+class ResultsWriter:
+    """Collect result rows and write them to one ``.npz`` file.
+
+    Rows are buffered in memory. Every `flush` rewrites the file with
+    all rows so far, replacing it atomically so that a reader never
+    sees a partly written file.
+
+    Parameters
+    ----------
+    path : str
+        The file to write.
+    fields : Sequence[str], default FIELDS
+        The columns to write.
+    flush_every : int, optional, default 100
+        Flush after this many new rows, if None only flush on `close`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fields: Sequence[str] = FIELDS,
+        flush_every: Optional[int] = 100,
+    ) -> None:
+        self.path = path
+        self.fields = tuple(fields)
+        self.flush_every = flush_every
+        self.rows: List[Dict[str, Any]] = []
+        self._unflushed = 0
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """Add a row.
+
+        Parameters
+        ----------
+        row : Dict[str, Any]
+            Values by field, missing fields are stored as missing values.
+        """
+        unknown = set(row) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown result fields {sorted(unknown)}.")
+
+        self.rows.append(row)
+        self._unflushed += 1
+        if self.flush_every is not None and self._unflushed >= self.flush_every:
+            self.flush()
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Add several rows.
+
+        Parameters
+        ----------
+        rows : Iterable[Dict[str, Any]]
+            The rows to add.
+        """
+        for row in rows:
+            self.append(row)
+
+    def flush(self) -> None:
+        """Write every row so far to the file."""
+        logger.debug("Writing %s rows to %s.", len(self.rows), self.path)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, mode="wb") as file:
+            np.savez(file, **to_columns(self.rows, self.fields))
+        os.replace(tmp_path, self.path)
+        self._unflushed = 0
+
+    def close(self) -> None:
+        """Write any rows not yet written."""
+        if self._unflushed or not os.path.exists(self.path):
+            self.flush()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def load_results(path: str) -> Dict[str, np.ndarray]:
+    """Load the columns of a results file.
+
+    Parameters
+    ----------
+    path : str
+        A file written by `ResultsWriter`.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        An array for each field.
+    """
+    with np.load(path) as file:
+        return {field: file[field] for field in file.files}
+
+
+# Older sweeps wrote a CSV file per network, named after its parameters.
+_TYPE_PATTERN = re.compile(r"type:(bipartite|multipartite)")
+_NODES_PATTERN = re.compile(r"nodes:(\d+)")
+_NOISE_PATTERN = re.compile(r"noise:([0-9.]+(?:[eE][-+]?\d+)?)(?=\.csv$|-|$)")
+
+# Noise rate of CSV files written before it was put in their names.
+LEGACY_NOISE_RATE = 1e7
+
+# CSV files written before the loss constants were configurable record
+# a p_loss_length of 2, but the loss model was built with p_loss_init
+# for both its arguments, so they were simulated with 0.2.
+RECORDED_P_LOSS_LENGTH = 2.0
+LEGACY_P_LOSS_LENGTH = 0.2
+
+# Bumped when the columns loaded from the same files change.
+CACHE_VERSION = 2
+
+CACHE_FOLDER = ".cache"
+
+
+def parse_filename(name: str) -> Dict[str, Any]:
+    """Find the network parameters in the name of a CSV results file.
+
+    Parameters
+    ----------
+    name : str
+        The name of the file.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The type, number of edges and noise rate named.
+    """
+    name = os.path.basename(name)
+    type_match = _TYPE_PATTERN.search(name)
+    if type_match is None:
+        raise ValueError(f"Cannot parse network type from filename {name}.")
+    nodes_match = _NODES_PATTERN.search(name)
+    if nodes_match is None:
+        raise ValueError(f"Cannot parse number of nodes from filename {name}.")
+    noise_match = _NOISE_PATTERN.search(name)
+
+    return {
+        "type": type_match.group(1),
+        "number of edges": int(nodes_match.group(1)),
+        "noise rate": float(noise_match.group(1)) if noise_match else LEGACY_NOISE_RATE,
+    }
+
+
+def _parse_value(field: str, value: str) -> Any:
+    """Parse a value read from a CSV file, None if it is missing."""
+    value = value.strip()
+    if value in ("", "nan", "None"):
+        return None
+    if field in TEXT_FIELDS:
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def read_csv_results(path: str) -> Dict[str, np.ndarray]:
+    """Read a CSV results file written by older sweeps.
+
+    These have a two line header, and a line of network constants
+    followed by a line of statistics for each point. Their recorded
+    p_loss_length of 2 is corrected to the 0.2 they were simulated
+    with, see `LEGACY_P_LOSS_LENGTH`.
+
+    Parameters
+    ----------
+    path : str
+        The file to read.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        An array for each field, as `load_results` returns.
+    """
+    named = parse_filename(path)
+    with open(path, newline="") as file:
+        lines = list(csv.reader(file))
+
+    fields = [field.strip() for field in lines[0] + lines[1]]
+    rows = []
+    for constants, statistics in zip(lines[2::2], lines[3::2]):
+        row = dict(named)
+        for field, value in zip(fields, constants + statistics):
+            parsed = _parse_value(field, value)
+            if parsed is not None or field not in row:
+                row[field] = parsed
+        if row.get("p_loss_length") == RECORDED_P_LOSS_LENGTH:
+            row["p_loss_length"] = LEGACY_P_LOSS_LENGTH
+        rows.append(row)
+
+    return to_columns(rows, FIELDS)
+
+
+def _source_files(folder: str) -> Dict[str, float]:
+    """Return the results files in a folder with their modification times."""
+    if os.path.exists(os.path.join(folder, "results.npz")):
+        names = ["results.npz"]
+    else:
+        names = sorted(name for name in os.listdir(folder) if name.endswith(".csv"))
+    return {name: os.path.getmtime(os.path.join(folder, name)) for name in names}
+
+
+def load_folder(folder: str, use_cache: bool = True) -> Dict[str, np.ndarray]:
+    """Load every result in a sweep folder.
+
+    The first load converts the folder into a cache of ``.npy`` files,
+    one per column, which later loads memory map. The cache is rebuilt
+    whenever a results file is added, removed or modified, or the way
+    files are read changes, as when the p_loss_length of legacy CSV
+    files was corrected to 0.2.
+
+    Parameters
+    ----------
+    folder : str
+        A folder written by a sweep.
+    use_cache : bool, default True
+        Read and write the cache.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        An array for each field.
+    """
+    sources = _source_files(folder)
+    cache = os.path.join(folder, CACHE_FOLDER)
+    meta_path = os.path.join(cache, "meta.json")
+
+    if use_cache and os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta["sources"] == sources and meta.get("version") == CACHE_VERSION:
+            logger.debug("Loading %s from cache.", folder)
+            return {
+                field: np.load(os.path.join(cache, f"{index}.npy"), mmap_mode="r")
+                for index, field in enumerate(meta["fields"])
+            }
+
+    logger.debug("Converting %s.", folder)
+    if "results.npz" in sources:
+        columns = load_results(os.path.join(folder, "results.npz"))
+    else:
+        columns = to_columns([], FIELDS)
+        parts = [read_csv_results(os.path.join(folder, name)) for name in sources]
+        if parts:
+            columns = {
+                field: np.concatenate([part[field] for part in parts])
+                for field in FIELDS
+            }
+
+    if use_cache:
+        os.makedirs(cache, exist_ok=True)
+        fields = list(columns)
+        for index, field in enumerate(fields):
+            np.save(os.path.join(cache, f"{index}.npy"), columns[field])
+        with open(meta_path, mode="w") as file:
+            json.dump(
+                {"sources": sources, "fields": fields, "version": CACHE_VERSION}, file
+            )
+
+    return columns
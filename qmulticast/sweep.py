@@ -0,0 +1,353 @@
+"""Declarative descriptions of parameter sweeps.
+
+A sweep is described by a TOML or JSON spec such as::
+
+    types = ["bipartite", "multipartite"]
+    graph = "star"
+    nodes = [1, 2, 3, 4, 5]
+    noise_rates = [1e6]
+    p_loss_init = [0.2]
+    p_loss_length = [0.2]
+    seed = 123456
+
+    [length]
+    min = 0.0
+    max = 0.25
+    steps = 100
+
+Every combination of the listed values is a network, and each network
+is simulated at ``steps`` evenly spaced lengths. Every key is optional
+and defaults to the values above.
+
+Adding an ``[adaptive]`` table replaces the even spacing. Each network
+starts with ``initial`` lengths, and more are added between
+neighbouring lengths where a measure changes by more than
+``tolerance``, or, for stars, where the simulation and the closed form
+predictions of `qmulticast.analytics` differ by more than it beyond
+the confidence interval of the simulated value::
+
+    [adaptive]
+    initial = 9
+    max_points = 40
+    tolerance = 0.02
+    min_spacing = 0.001
+    measures = ["mean fidelity", "entanglement rate"]
+    analytic = true
+"""
+
+import itertools
+import json
+import logging
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from qmulticast.analytics import star_predictions
+
+logger = logging.getLogger(__name__)
+
+# Graphs a sweep can simulate. Stars have a number of receivers set by
+# the nodes axis, the others are the fixed graphs of `graphlibrary`.
+GRAPH_FAMILIES = ("star", "butterfly", "twin", "repeater", "triangle")
+
+TYPES = ("bipartite", "multipartite")
+
+# Every sweep point derives its own seed from this one.
+BASE_SEED = 123456
+
+# The result field holding the relative confidence interval half-width
+# of each measure.
+CI_FIELDS = {"mean fidelity": "fidelity ci", "entanglement rate": "rate ci"}
+
+
+class NetworkSpec(NamedTuple):
+    """The parameters of a network in a sweep, other than its length."""
+
+    bipartite: bool
+    graph: str
+    num_nodes: int
+    noise_rate: float
+    p_loss_init: float
+    p_loss_length: float
+
+
+class AdaptiveSampler:
+    """Choose lengths to simulate where the results change quickly.
+
+    Parameters
+    ----------
+    initial : int, default 9
+        The number of evenly spaced lengths to start with.
+    max_points : int, default 40
+        The most lengths to simulate per network.
+    tolerance : float, default 0.02
+        Refine between neighbouring lengths whose measures differ by
+        more than this, or which differ from predictions by more than
+        this outside the confidence intervals of the simulated values.
+        Values without an interval aren't compared with predictions.
+    min_spacing : float, default 0.0
+        Never simulate lengths closer together than this [km].
+    measures : Sequence[str], default ("mean fidelity", "entanglement rate")
+        The result fields to compare.
+    analytic : bool, default True
+        Also refine where stars disagree with the closed form predictions.
+    """
+
+    def __init__(
+        self,
+        initial: int = 9,
+        max_points: int = 40,
+        tolerance: float = 0.02,
+        min_spacing: float = 0.0,
+        measures: Sequence[str] = ("mean fidelity", "entanglement rate"),
+        analytic: bool = True,
+    ) -> None:
+        if initial < 2:
+            raise ValueError("initial must be at least 2.")
+
+        self.initial = initial
+        self.max_points = max_points
+        self.tolerance = tolerance
+        self.min_spacing = min_spacing
+        self.measures = tuple(measures)
+        self.analytic = analytic
+
+    def refine(
+        self,
+        network: NetworkSpec,
+        lengths: Sequence[float],
+        results: Sequence[Dict[str, Any]],
+    ) -> List[float]:
+        """Choose new lengths to simulate a network at.
+
+        Parameters
+        ----------
+        network : NetworkSpec
+            The network simulated.
+        lengths : Sequence[float]
+            The lengths simulated so far.
+        results : Sequence[Dict[str, Any]]
+            The result row at each length.
+
+        Returns
+        -------
+        List[float]
+            Midpoints of the intervals to refine, empty once converged.
+        """
+        budget = self.max_points - len(lengths)
+        if budget <= 0:
+            return []
+
+        order = np.argsort(lengths)
+        lengths = np.asarray(lengths, dtype=float)[order]
+        values = {
+            measure: np.array(
+                [
+                    np.nan if results[i].get(measure) is None else results[i][measure]
+                    for i in order
+                ],
+                dtype=float,
+            )
+            for measure in self.measures
+        }
+
+        # How far each length is from the prediction, in the worst measure.
+        error = np.zeros(len(lengths))
+        if self.analytic and network.graph == "star":
+            predictions = star_predictions(
+                lengths,
+                network.num_nodes,
+                network.noise_rate,
+                p_loss_init=network.p_loss_init,
+                p_loss_length=network.p_loss_length,
+            )
+            for measure, value in values.items():
+                if measure not in predictions:
+                    continue
+                # Sampling noise alone moves estimates by about the
+                # half-width of their interval, so only the rest counts.
+                half_width = np.zeros(len(lengths))
+                if measure in CI_FIELDS:
+                    relative = np.array(
+                        [
+                            np.nan
+                            if results[i].get(CI_FIELDS[measure]) is None
+                            else results[i][CI_FIELDS[measure]]
+                            for i in order
+                        ],
+                        dtype=float,
+                    )
+                    half_width = relative * np.abs(value)
+                excess = np.abs(value - predictions[measure]) - half_width
+                error = np.fmax(error, np.fmax(excess, 0))
+
+        # How much each interval changes, in the worst measure.
+        change = np.zeros(len(lengths) - 1)
+        for value in values.values():
+            change = np.fmax(change, np.abs(np.diff(value)))
+        change = np.fmax(change, np.fmax(error[:-1], error[1:]))
+
+        wide = np.diff(lengths) / 2 >= self.min_spacing
+        refine = np.flatnonzero(wide & (change > self.tolerance))
+        # Spend what is left of the budget on the worst intervals first.
+        refine = refine[np.argsort(-change[refine], kind="stable")][:budget]
+        midpoints = (lengths[refine] + lengths[refine + 1]) / 2
+        logger.debug("Refining %s at %s lengths.", network, len(midpoints))
+        return sorted(midpoints.tolist())
+
+
+class SweepSpec:
+    """A parameter sweep over networks and lengths.
+
+    Parameters
+    ----------
+    types : Sequence[str], default ("bipartite", "multipartite")
+        The source types to simulate.
+    graph : str, default "star"
+        The graph family, one of `GRAPH_FAMILIES`.
+    nodes : Sequence[int], default 1 to 5
+        The numbers of receivers of a star, ignored for other graphs.
+    noise_rates : Sequence[float], default (1e6,)
+        Depolarising rates of fibres and memories [Hz].
+    p_loss_init : Sequence[float], default (0.2,)
+        Probabilities of losing a photon as it enters a channel.
+    p_loss_length : Sequence[float], default (0.2,)
+        Lengths over which a tenth of photons survive [km].
+    min_length, max_length : float, default 0 and 0.25
+        The range of edge lengths [km].
+    steps : int, default 100
+        The number of evenly spaced lengths without adaptive sampling.
+    adaptive : AdaptiveSampler, optional
+        Choose lengths adaptively rather than evenly.
+    seed : int, default 123456
+        The seed every point's seed is derived from.
+    """
+
+    def __init__(
+        self,
+        types: Sequence[str] = TYPES,
+        graph: str = "star",
+        nodes: Sequence[int] = (1, 2, 3, 4, 5),
+        noise_rates: Sequence[float] = (1e6,),
+        p_loss_init: Sequence[float] = (0.2,),
+        p_loss_length: Sequence[float] = (0.2,),
+        min_length: float = 0.0,
+        max_length: float = 0.25,
+        steps: int = 100,
+        adaptive: Optional[AdaptiveSampler] = None,
+        seed: int = BASE_SEED,
+    ) -> None:
+        if graph not in GRAPH_FAMILIES:
+            raise ValueError(f"graph must be one of {GRAPH_FAMILIES}.")
+        if not set(types) <= set(TYPES):
+            raise ValueError(f"types must be some of {TYPES}.")
+
+        self.types = tuple(types)
+        self.graph = graph
+        # Other graphs are fixed, the nodes axis only applies to stars.
+        self.nodes = tuple(nodes) if graph == "star" else (0,)
+        self.noise_rates = tuple(noise_rates)
+        self.p_loss_init = tuple(p_loss_init)
+        self.p_loss_length = tuple(p_loss_length)
+        self.min_length = min_length
+        self.max_length = max_length
+        self.steps = steps
+        self.adaptive = adaptive
+        self.seed = seed
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "SweepSpec":
+        """Make a sweep from a parsed spec.
+
+        Parameters
+        ----------
+        spec : Dict[str, Any]
+            The spec, laid out as in the module docstring.
+        """
+        spec = dict(spec)
+        length = spec.pop("length", {})
+        adaptive = spec.pop("adaptive", None)
+        known = {
+            "types",
+            "graph",
+            "nodes",
+            "noise_rates",
+            "p_loss_init",
+            "p_loss_length",
+            "seed",
+        }
+        if not set(spec) <= known or not set(length) <= {"min", "max", "steps"}:
+            unknown = (set(spec) - known) | (set(length) - {"min", "max", "steps"})
+            raise ValueError(f"Unknown sweep spec keys {sorted(unknown)}.")
+
+        # Single values are allowed in place of lists.
+        for key in ("types", "nodes", "noise_rates", "p_loss_init", "p_loss_length"):
+            if key in spec and not isinstance(spec[key], list):
+                spec[key] = [spec[key]]
+
+        if "min" in length:
+            spec["min_length"] = length["min"]
+        if "max" in length:
+            spec["max_length"] = length["max"]
+        if "steps" in length:
+            spec["steps"] = length["steps"]
+        if adaptive is not None:
+            spec["adaptive"] = AdaptiveSampler(**adaptive)
+        return cls(**spec)
+
+    @classmethod
+    def load(cls, path: str) -> "SweepSpec":
+        """Read a sweep from a TOML or JSON file.
+
+        Parameters
+        ----------
+        path : str
+            The spec file, read as TOML unless it ends in ``.json``.
+        """
+        if path.endswith(".json"):
+            with open(path) as file:
+                return cls.from_dict(json.load(file))
+
+        try:
+            import tomllib
+        except ModuleNotFoundError:
+            # Before Python 3.11 TOML needs the tomli package.
+            try:
+                import tomli as tomllib
+            except ModuleNotFoundError:
+                raise ModuleNotFoundError(
+                    f"Reading the TOML spec {path} needs Python 3.11 or the tomli "
+                    "package, or give the spec as JSON."
+                ) from None
+
+        with open(path, mode="rb") as file:
+            return cls.from_dict(tomllib.load(file))
+
+    def networks(self) -> Iterator[NetworkSpec]:
+        """Generate the networks of the sweep in output order."""
+        for (
+            type,
+            noise_rate,
+            num_nodes,
+            p_loss_init,
+            p_loss_length,
+        ) in itertools.product(
+            self.types,
+            self.noise_rates,
+            self.nodes,
+            self.p_loss_init,
+            self.p_loss_length,
+        ):
+            yield NetworkSpec(
+                bipartite=type == "bipartite",
+                graph=self.graph,
+                num_nodes=num_nodes,
+                noise_rate=noise_rate,
+                p_loss_init=p_loss_init,
+                p_loss_length=p_loss_length,
+            )
+
+    def initial_lengths(self) -> List[float]:
+        """Return the lengths every network is first simulated at."""
+        steps = self.adaptive.initial if self.adaptive is not None else self.steps
+        return np.linspace(self.min_length, self.max_length, steps).tolist()
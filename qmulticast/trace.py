@@ -0,0 +1,176 @@
+"""Per-round traces of simulations.
+
+A `TraceRecorder` writes one row of `TRACE_DTYPE` per round straight
+into a memory mapped file which grows as needed. The file is a normal
+``.npy`` file, so a trace loads with `load_trace` or ``np.load``, and
+one cut short by a crash still holds every round up to the last time
+it grew.
+
+Links are numbered by the order of the source's out-edges. Bit ``i``
+of ``lost`` is set if the qubit sent down link ``i`` was lost, and bit
+``i`` of ``outcomes`` if the measurement fusing link ``i`` into the
+GHZ state gave 1.
+"""
+
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRACE_DTYPE = np.dtype(
+    [
+        ("run", "<i8"),
+        ("time", "<f8"),
+        ("hit", "?"),
+        ("fidelity", "<f8"),
+        ("lost", "<u8"),
+        ("outcomes", "<u8"),
+    ]
+)
+
+# The most links whose outcomes fit in a row.
+MAX_LINKS = 64
+
+# Space kept for the .npy header before the rows, so it can be
+# rewritten in place as the trace grows.
+_HEADER_SIZE = 4096
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def _header(dtype: np.dtype, count: int) -> bytes:
+    """Make a .npy header for ``count`` rows of a dtype."""
+    fields = (
+        f"{{'descr': {np.lib.format.dtype_to_descr(dtype)!r}, "
+        f"'fortran_order': False, 'shape': ({count},), }}"
+    )
+    padding = _HEADER_SIZE - len(_MAGIC) - 2 - len(fields) - 1
+    header = fields + " " * padding + "\n"
+    return _MAGIC + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+
+class TraceRecorder:
+    """Record the outcome of every round to a memory mapped file.
+
+    Parameters
+    ----------
+    path : str
+        The ``.npy`` file to write.
+    capacity : int, default 4096
+        The number of rows to make space for at first. Space doubles
+        whenever it runs out.
+    """
+
+    def __init__(self, path: str, capacity: int = 4096) -> None:
+        self.path = path
+        self.count = 0
+        self._capacity = 0
+        self._rows: Optional[np.memmap] = None
+        self._file = open(path, mode="w+b")
+        self._grow(capacity)
+
+    def _grow(self, capacity: int) -> None:
+        """Resize the file to hold ``capacity`` rows and map it again."""
+        logger.debug("Growing trace %s to %s rows.", self.path, capacity)
+        if self._rows is not None:
+            self._rows.flush()
+
+        self._file.truncate(_HEADER_SIZE + capacity * TRACE_DTYPE.itemsize)
+        self._write_header()
+        self._capacity = capacity
+        self._rows = np.memmap(
+            self._file,
+            dtype=TRACE_DTYPE,
+            mode="r+",
+            offset=_HEADER_SIZE,
+            shape=(capacity,),
+        )
+        # Writing to each field directly avoids building a row per round.
+        self._run = self._rows["run"]
+        self._time = self._rows["time"]
+        self._hit = self._rows["hit"]
+        self._fidelity = self._rows["fidelity"]
+        self._lost = self._rows["lost"]
+        self._outcomes = self._rows["outcomes"]
+
+    def _write_header(self) -> None:
+        """Write the header for the rows recorded so far."""
+        self._file.seek(0)
+        self._file.write(_header(TRACE_DTYPE, self.count))
+        self._file.flush()
+
+    def record(
+        self,
+        run: int,
+        time: float,
+        fidelity: Optional[float],
+        lost: int,
+        outcomes: int,
+    ) -> None:
+        """Record a round.
+
+        Parameters
+        ----------
+        run : int
+            The number of the round.
+        time : float
+            The simulation time at the end of the round [ns].
+        fidelity : float, optional
+            The fidelity of the GHZ state made, None if qubits were lost.
+        lost : int
+            Bit mask of the links whose qubits were lost.
+        outcomes : int
+            Bit mask of the links whose fusion measurements gave 1.
+        """
+        if self.count == self._capacity:
+            self._grow(2 * self._capacity)
+
+        index = self.count
+        self._run[index] = run
+        self._time[index] = time
+        self._hit[index] = fidelity is not None
+        self._fidelity[index] = np.nan if fidelity is None else fidelity
+        self._lost[index] = lost
+        self._outcomes[index] = outcomes
+        self.count += 1
+
+    def close(self) -> None:
+        """Write the final header and trim the file to the rows recorded."""
+        if self._file.closed:
+            return
+
+        self._rows.flush()
+        self._rows = None
+        self._run = self._time = self._hit = None
+        self._fidelity = self._lost = self._outcomes = None
+        self._write_header()
+        self._file.truncate(_HEADER_SIZE + self.count * TRACE_DTYPE.itemsize)
+        self._file.close()
+        logger.debug("Closed trace %s with %s rows.", self.path, self.count)
+
+    def __enter__(self) -> "TraceRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def load_trace(path: str) -> np.ndarray:
+    """Memory map a trace.
+
+    Parameters
+    ----------
+    path : str
+        A file written by `TraceRecorder`.
+
+    Returns
+    -------
+    np.ndarray
+        The rows of the trace, with `TRACE_DTYPE`.
+    """
+    if os.path.getsize(path) == _HEADER_SIZE:
+        # np.load can't memory map an empty array.
+        return np.zeros(0, dtype=TRACE_DTYPE)
+    return np.load(path, mmap_mode="r")
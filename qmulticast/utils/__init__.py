@@ -1,15 +1,45 @@
 """Init utils modules"""
 
-from .create_network import create_network
-from .functions import fidelity_from_node, gen_GHZ_ket, log_entanglement_rate
+from .create_network import cached_network, create_network, reconfigure_network
+from .functions import (
+    fidelity_from_node,
+    gen_GHZ_ket,
+    gen_GHZ_stabilizer,
+    ghz_fidelity,
+    ghz_state_sampler,
+    log_entanglement_rate,
+    stabilizer_ghz_fidelity,
+)
 from .graphlibrary import ButterflyGraph, RepeaterGraph, TwinGraph
+from .layout import EdgeLayout, NetworkLayout, banked
+from .routing import Route, steiner_route
+from .sessions import Session, check_disjoint_sessions, make_sessions
+from .statistics import Histogram, RunningStats
+from .stopping import StoppingRule
 
 __all__ = [
     ButterflyGraph,
     TwinGraph,
     RepeaterGraph,
     gen_GHZ_ket,
+    gen_GHZ_stabilizer,
+    ghz_state_sampler,
+    ghz_fidelity,
+    stabilizer_ghz_fidelity,
     fidelity_from_node,
     log_entanglement_rate,
     create_network,
+    cached_network,
+    reconfigure_network,
+    RunningStats,
+    Histogram,
+    StoppingRule,
+    EdgeLayout,
+    NetworkLayout,
+    banked,
+    Route,
+    steiner_route,
+    Session,
+    make_sessions,
+    check_disjoint_sessions,
 ]
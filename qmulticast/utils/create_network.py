@@ -4,28 +4,53 @@ TODO maybe make this a subclass of the Network class and build things in init.
     That'd be neater but not high prority.
 """
 
-import csv
 import logging
-from typing import Any, Dict, Hashable
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence, Tuple
 
-import netsquid.qubits.ketstates as ks
 from netsquid.components import ClassicalChannel, QuantumChannel, QuantumProcessor
 from netsquid.components.models.delaymodels import FibreDelayModel, FixedDelayModel
 from netsquid.components.models.qerrormodels import DepolarNoiseModel
 from netsquid.components.qsource import QSource, SourceStatus
 from netsquid.nodes import Network, Node
+from netsquid.qubits.qformalism import QFormalism, get_qstate_formalism
 from netsquid.qubits.state_sampler import StateSampler
+from netsquid.util import simtools
 from networkx import DiGraph
 
 from qmulticast.models.ceryslossmodel import CerysLossModel
+from qmulticast.programs import FUSION_PROGRAMS
 
-from .functions import gen_GHZ_ket
+from .functions import ghz_state_sampler
+from .layout import NetworkLayout, banked
+from .sessions import make_sessions
+from .stopping import StoppingRule
 
 logger = logging.getLogger(__name__)
 
+# Networks built by `cached_network` in this process, by `reuse_key`.
+_NETWORKS: Dict[Hashable, Network] = {}
+
+# Loss model constants. The loss model has always been built with
+# p_loss_init for both arguments, so this is the length scale it uses.
+P_LOSS_LENGTH = 0.2
+P_LOSS_INIT = 0.2
+
 
 def create_network(
-    name: str, graph: DiGraph, output_file: str, bipartite: bool, noise_rate: float
+    name: str,
+    graph: DiGraph,
+    bipartite: bool,
+    noise_rate: float,
+    stopping_rule: Optional[StoppingRule] = None,
+    p_loss_init: float = P_LOSS_INIT,
+    p_loss_length: float = P_LOSS_LENGTH,
+    fusion: str = "linear",
+    pipeline_depth: int = 1,
+    keep_links: bool = False,
+    memory_cutoff: Optional[float] = None,
+    heralded: bool = False,
+    routed: bool = False,
+    sessions: Optional[Iterable[Tuple[str, Sequence[str]]]] = None,
 ) -> Network:
     """Turn graph into netsquid network.
 
@@ -38,12 +63,41 @@ def create_network(
         The name of the network.
     graph : Graph
         Graph representing the desired network.
-    output_file : Pathlike
-        The file to output data about network constants to.
     bipartite: bool
         True for bipartite network, false for multipartite.
     noise_rate : float
         Constant to use for noise models.
+    stopping_rule : StoppingRule, optional
+        When to stop simulating the network, defaults to `StoppingRule()`.
+    p_loss_init : float, default P_LOSS_INIT
+        Probability of losing a photon as it enters a channel.
+    p_loss_length : float, default P_LOSS_LENGTH
+        Length over which a tenth of photons survive [km].
+    fusion : "linear", "tree"
+        How bipartite sources fuse Bell pairs into GHZ states, with
+        `CreateGHZ` or the log depth `CreateGHZTree`.
+    pipeline_depth : int, default 1
+        The number of rounds a bipartite source may have in flight at
+        once. Every node gets a memory bank, and every edge a source
+        and channel, per round in flight.
+    keep_links : bool, default False
+        Whether bipartite sources keep the Bell pairs which arrived and
+        retry only the links which failed, fusing once all are present.
+    memory_cutoff : float, optional
+        How long kept Bell pairs may wait in memory before they are
+        discarded [ns], they are kept indefinitely if not given.
+    heralded : bool, default False
+        Whether recievers herald each qubit, or its loss, to the source
+        over the classical channels, rather than the source waiting out
+        the transmission time. Pipelined sources can't be heralded.
+    routed : bool, default False
+        Whether GHZ states are routed over a tree of bipartite links,
+        with `RoutedMulticastProtocol`, to receivers the source isn't
+        linked to. Routed rounds aren't pipelined, kept or heralded.
+    sessions : Iterable[Tuple[str, Sequence[str]]], optional
+        The source and receivers of each multicast session to run at
+        once, see `make_sessions`. Defaults to one session from node "0".
+        Only bipartite sources can run more than one session.
 
     Returns
     -------
@@ -61,114 +115,276 @@ def create_network(
     network.add_nodes([n for n in nodes.values()])
 
     network.source_type = "bipartite" if bipartite else "multipartite"
-    network.output_file = output_file
     network.graph = graph
+    network.stopping_rule = stopping_rule or StoppingRule()
+    if fusion not in FUSION_PROGRAMS:
+        raise ValueError(f"fusion must be one of {list(FUSION_PROGRAMS)}.")
+    network.fusion = fusion
+    if pipeline_depth > 1 and not bipartite:
+        raise ValueError("Only bipartite sources can be pipelined.")
+    network.pipeline_depth = pipeline_depth
+    if keep_links and not bipartite:
+        raise ValueError("Only bipartite sources can keep links.")
+    if keep_links and pipeline_depth > 1:
+        raise ValueError("Links can't be kept by pipelined sources.")
+    network.keep_links = keep_links
+    network.memory_cutoff = memory_cutoff
+    if heralded and pipeline_depth > 1:
+        raise ValueError("Heralds can't tell apart the rounds of pipelined sources.")
+    network.heralded = heralded
+    if routed and not bipartite:
+        raise ValueError("Only bipartite sources can be routed.")
+    if routed and (pipeline_depth > 1 or keep_links or heralded):
+        raise ValueError("Routed rounds can't be pipelined, kept or heralded.")
+    network.routed = routed
+    # Filled in by fidelity_from_node once the simulation stops.
+    network.results = None
+    # Set to a TraceRecorder to record every round.
+    network.trace = None
+    # Set to a PhaseProfiler to time each phase of every round.
+    network.profiler = None
+    # Statistics of each session by source, filled in as they finish.
+    network.session_results = {}
+    # Waits of each session for processors busy with other sessions.
+    network.contention = {}
 
     # Delay and noise models to use for components.
-    p_loss_length = 2
-    p_loss_init = 0.2
-
     models = {
         "source_delay": FixedDelayModel(delay=0),
         "source_noise": None,
         "fibre_delay": FibreDelayModel(),
-        "fibre_loss": CerysLossModel(p_loss_init, p_loss_init),
+        "fibre_loss": CerysLossModel(p_loss_init, p_loss_length),
         "depolar_noise": DepolarNoiseModel(noise_rate),
     }
+    network.models = models
+    network.constants = {
+        "p_loss_length": p_loss_length,
+        "p_loss_init": p_loss_init,
+        "noise_rate": noise_rate,
+    }
+
+    # Lay out every node's edges once rather than searching the graph.
+    layout = NetworkLayout(graph, bipartite, banks=pipeline_depth)
+    network.layout = layout
+    network.sessions = make_sessions(layout, sessions, routed)
+    if len(network.sessions) > 1 and not bipartite:
+        # Multipartite sources all keep their own qubit in position 0.
+        raise ValueError("Only bipartite sources can run concurrent sessions.")
 
-    # Set up state sampler.
-    if bipartite:
-        state = [ks.b00]
-    else:
-        n_qubits = graph.out_degree["0"] + 1
-        state = gen_GHZ_ket(n_qubits)
-
-    state_sampler = StateSampler(state)
-
-    logger.debug(f"Writing network data to file {output_file}.")
-    with open(output_file, mode="a") as file:
-        writer = csv.writer(file)
-        data = [
-            graph.out_degree["0"],
-            graph.length,
-            p_loss_length,
-            p_loss_init,
-            noise_rate,
-        ]
-        writer.writerow(data)
+    # Sources make stabilizer states when NetSquid is set to the STAB
+    # formalism, which keeps large GHZ states small.
+    stabilizer = get_qstate_formalism() == QFormalism.STAB
+
+    # Set up state sampler, a Bell pair is the two qubit GHZ state.
+    state_sampler = ghz_state_sampler(2, stabilizer)
 
     logger.debug("Adding unique components to nodes.")
     for node_name, node in nodes.items():
-        add_processor(node, graph, models)
+        add_processor(node, layout, models)
 
         if not bipartite:
-            add_mulitpartite_source(node, graph, models, state_sampler)
+            # One GHZ qubit for the node and one for each out-edge.
+            num_qubits = len(layout.out_edges[node.name]) + 1
+            add_mulitpartite_source(
+                node, graph, models, ghz_state_sampler(num_qubits, stabilizer)
+            )
 
     # We need more than one of some components because of
     # the network topology.
     logger.debug("Adding non-unique components to nodes.")
     for node_name, node in nodes.items():
-        add_connections(node, graph, models)
+        add_connections(node, layout, models)
 
         if bipartite:
-            add_bipartite_sources(node, graph, models, state_sampler)
+            add_bipartite_sources(node, layout, models, state_sampler)
 
         # We now need to redirect input
-        redirect_outputs(node, graph)
-        redirect_inputs(node)
+        redirect_outputs(node, layout)
+        redirect_inputs(node, layout)
 
     return network
 
 
-def unpack_edge_values(node: str, graph: DiGraph) -> Dict[Hashable, Any]:
-    """Return the start, end and weight of a nodes edges.
+def reuse_key(
+    name: str, graph: DiGraph, bipartite: bool, options: Dict[str, Any]
+) -> Optional[Hashable]:
+    """Return the key `cached_network` reuses a network under.
+
+    The key is made of everything `reconfigure_network` can't change,
+    which is all but the edge length and noise rate.
 
     Parameters
     ----------
-    node : str
-        The name of the node.
-    graph : networkx.DiGraph
+    name : str
+        The name of the network.
+    graph : DiGraph
         Graph representing the network.
+    bipartite : bool
+        Whether the network has bipartite sources.
+    options : Dict[str, Any]
+        The other keyword arguments of `create_network`.
 
     Returns
     -------
-    Dict[Hashable, float | int ]
-        A dict of names of edge ends and weightings.
+    Hashable, optional
+        The key, None unless every edge of the graph has one length
+        which `reconfigure_network` can set.
     """
-    logger.debug("Unpacking edges.")
+    lengths = {length for _, _, length in graph.edges.data("weight")}
+    if len(lengths) != 1:
+        return None
+
+    edges = tuple(sorted((str(start), str(end)) for start, end in graph.edges))
+    return (
+        name,
+        edges,
+        bipartite,
+        get_qstate_formalism(),
+        # Options hold lists, such as sessions, so are keyed by repr.
+        repr(sorted(options.items())),
+    )
+
 
-    edges = {}
-    for edge in graph.edges.data():
-        start, stop, weight = edge[0], edge[1], edge[2]["weight"]
-        if str(start) != node.name:
-            continue
-        edges[stop] = weight
-    logger.debug("Found edges: %s", edges)
+def cached_network(
+    name: str,
+    graph: DiGraph,
+    bipartite: bool,
+    noise_rate: float,
+    stopping_rule: Optional[StoppingRule] = None,
+    **options: Any,
+) -> Network:
+    """Create a network, or reuse the one this process built like it.
 
-    return edges
+    Every network built is kept by `reuse_key`, and a later call with
+    the same key reconfigures and returns the same live network rather
+    than a copy, so only one simulation may use it at a time. Networks
+    aren't shared between processes, as NetSquid components can't be
+    pickled.
 
+    Parameters
+    ----------
+    name : str
+        The name of the network.
+    graph : DiGraph
+        Graph representing the network.
+    bipartite : bool
+        Whether to use bipartite sources.
+    noise_rate : float
+        Constant for the depolarising noise models.
+    stopping_rule : StoppingRule, optional
+        When to stop simulating.
+    **options
+        Other keyword arguments of `create_network`.
+
+    Returns
+    -------
+    Network
+        A network ready to simulate.
+    """
+    key = reuse_key(name, graph, bipartite, options)
+    network = _NETWORKS.get(key) if key is not None else None
+    if network is None:
+        network = create_network(
+            name,
+            graph,
+            bipartite=bipartite,
+            noise_rate=noise_rate,
+            stopping_rule=stopping_rule,
+            **options,
+        )
+        if key is not None:
+            _NETWORKS[key] = network
+        return network
+
+    logger.debug("Reusing network %s.", name)
+    length = next(iter(graph.edges.data("weight")))[2]
+    reconfigure_network(network, length, noise_rate)
+    network.stopping_rule = stopping_rule or StoppingRule()
+    network.trace = None
+    network.profiler = None
+    return network
+
+
+def network_parameters(network: Network) -> Dict[str, Any]:
+    """Return the parameters of a star network as result fields.
+
+    Parameters
+    ----------
+    network : Network
+        A network made by `create_network`.
+    """
+    return {
+        "type": network.source_type,
+        "number of edges": network.graph.out_degree["0"],
+        "edge length": network.graph.length,
+        "p_loss_length": network.constants["p_loss_length"],
+        "p_loss_init": network.constants["p_loss_init"],
+        "noise rate": network.constants["noise_rate"],
+    }
+
+
+def reconfigure_network(
+    network: Network, length: float, noise_rate: Optional[float] = None
+) -> None:
+    """Reuse a network for another edge length without rebuilding it.
 
-def add_processor(node: Node, graph: DiGraph, models: dict) -> None:
+    Updates the graph weights and channel lengths and clears all
+    memories and results.
+
+    Parameters
+    ----------
+    network : Network
+        A network made by `create_network`.
+    length : float
+        The new length of every edge.
+    noise_rate : float, optional
+        A new constant for the noise models.
+    """
+    logger.debug("Reconfiguring network for length %s.", length)
+    graph = network.graph
+    graph.length = length
+    for _, _, data in graph.edges.data():
+        data["weight"] = length
+
+    for connection in network.connections.values():
+        connection.channel_AtoB.length = length
+        if connection.channel_BtoA is not None:
+            connection.channel_BtoA.length = length
+
+    models = network.models
+    if noise_rate is not None:
+        models["depolar_noise"].depolar_rate = noise_rate
+        network.constants["noise_rate"] = noise_rate
+
+    # Models hold on to the random state they were made with,
+    # point them at the current one in case it has been reseeded.
+    models["fibre_loss"].rng = simtools.get_random_state()
+
+    for node in network.nodes.values():
+        node.qmemory.reset()
+    network.results = None
+    network.session_results = {}
+    network.contention = {}
+
+
+def add_processor(node: Node, layout: NetworkLayout, models: dict) -> None:
     """Add a processor to the node.
 
     Parameters
     ----------
     node : str
         The name of the node.
-    graph : networkx.DiGraph
-        Graph representing the network.
+    layout : NetworkLayout
+        Wiring of the network.
     """
-    logger.debug(f"Node: {node.name}.")
-
-    node_connections = unpack_edge_values(node, graph)
+    logger.debug("Node: %s.", node.name)
 
     # Names need to be strings for NetSquid object names
     node_name = str(node.name)
 
-    mem_size = len(node_connections) * 2  # input and output
+    mem_size = layout.num_positions[node_name]  # input and output
     # Add a quantum memory to each of the nodes.
-    logger.debug(f"Adding quantum memory 'qmemory-{node_name}'")
-    logger.debug(f"\tsize: {mem_size}")
+    logger.debug("Adding quantum memory 'qmemory-%s' size: %s", node_name, mem_size)
     qmemory = QuantumProcessor(
         name="qmemory",
         num_positions=mem_size,
@@ -191,7 +407,7 @@ def add_mulitpartite_source(
         Graph representing the network.
     """
     node_name = node.name
-    logger.debug(f"Adding QSource for node 'qsource-{node_name}'.")
+    logger.debug("Adding QSource for node 'qsource-%s'.", node_name)
     num_ports = state_sampler._num_qubits
 
     qsource = QSource(
@@ -211,173 +427,154 @@ def add_mulitpartite_source(
     qsource.ports["qout0"].connect(node.subcomponents["qmemory"].ports[f"qin{0}"])
 
 
-def add_connections(node: Node, graph: DiGraph, models: Dict) -> None:
+def add_connections(node: Node, layout: NetworkLayout, models: Dict) -> None:
     """Add connections to the network.
 
     Parameters
     ----------
     node : str
         The name of the node.
-    graph : networkx.DiGraph
-        Graph representing the network.
+    layout : NetworkLayout
+        Wiring of the network.
     models : Dict
         Definitions of noise and loss models.
     """
-    logger.debug(f"Node: {node.name}")
+    logger.debug("Node: %s", node.name)
 
     network = node.supercomponent
 
-    node_connections = unpack_edge_values(node, graph)
-
     # Add channels
     logger.debug("Adding connections.")
-    # Iterate over memory positions
-    for end, length in node_connections.items():
-        # need the names as a string for the channel
-        node_name = str(node.name)
-        end_name = str(end)
-        edge_name = node_name + "-" + end_name
-
-        logger.debug(f"Creating channel 'qchannel-{edge_name}.")
-        qc_channel = QuantumChannel(
-            name=f"qchannel-{edge_name}",
-            length=length,
-            models={
-                "delay_model": models["fibre_delay"],
-                "quantum_loss_model": models["fibre_loss"],
-                "quantum_noise_model": models["depolar_noise"],
-            },
-        )
-        logger.debug(f"Adding network connection on edge {edge_name}.")
-        network.add_connection(
-            node_name,
-            end_name,
-            channel_to=qc_channel,
-            label=f"Q-{edge_name}",
-            bidirectional=False,
-            port_name_node1=f"qout-{edge_name}",
-            port_name_node2=f"qin-{edge_name}",
-        )
+    for edge in layout.out_edges[node.name]:
+        # Each bank has its own channel, standing in for the time bins
+        # of pipelined rounds sharing one fibre.
+        for bank in range(layout.banks):
+            channel_name = banked(f"qchannel-{edge.name}", bank)
+            logger.debug("Creating channel '%s'.", channel_name)
+            qc_channel = QuantumChannel(
+                name=channel_name,
+                length=edge.length,
+                models={
+                    "delay_model": models["fibre_delay"],
+                    "quantum_loss_model": models["fibre_loss"],
+                    "quantum_noise_model": models["depolar_noise"],
+                },
+            )
+            logger.debug("Adding network connection on edge %s.", edge.name)
+            network.add_connection(
+                edge.start,
+                edge.end,
+                channel_to=qc_channel,
+                label=banked(f"Q-{edge.name}", bank),
+                bidirectional=False,
+                port_name_node1=banked(edge.qout, bank),
+                port_name_node2=banked(edge.qin, bank),
+            )
 
         # Classical connection
-        logger.debug(f"Creating classical channel 'cchannel-{edge_name}'.")
+        logger.debug("Creating classical channel 'cchannel-%s'.", edge.name)
         c_channel = ClassicalChannel(
-            name=f"cchannel-{edge_name}",
-            length=length,
+            name=f"cchannel-{edge.name}",
+            length=edge.length,
             models={
                 "delay_model": None,
             },
         )
 
-        logger.debug(f"Adding classical connectin on edge {edge_name}.")
+        # Heralds are sent back to the source over the same connection.
+        herald_channel = None
+        if network.heralded:
+            herald_channel = ClassicalChannel(
+                name=f"cchannel-{edge.name}-herald",
+                length=edge.length,
+                models={
+                    "delay_model": None,
+                },
+            )
+
+        logger.debug("Adding classical connectin on edge %s.", edge.name)
         network.add_connection(
-            node_name,
-            end_name,
+            edge.start,
+            edge.end,
             channel_to=c_channel,
-            label=f"C-{edge_name}",
-            bidirectional=False,
-            port_name_node1=f"cout-{edge_name}",
-            port_name_node2=f"cin-{edge_name}",
+            channel_from=herald_channel,
+            label=f"C-{edge.name}",
+            bidirectional=network.heralded,
+            port_name_node1=edge.cout,
+            port_name_node2=edge.cin,
         )
 
 
 def add_bipartite_sources(
-    node: Node, graph: DiGraph, models: Dict, state_sampler: StateSampler
+    node: Node, layout: NetworkLayout, models: Dict, state_sampler: StateSampler
 ) -> None:
     """Add a source for each connection from a bipartite source.
     Parameters
     ----------
     node : str
         The name of the node.
-    graph : networkx.DiGraph
-        Graph representing the network.
+    layout : NetworkLayout
+        Wiring of the network.
     models : Dict
         Definitions of noise and loss models.
 
     """
-    node_connections = unpack_edge_values(node, graph)
-
-    for end in node_connections.keys():
-        node_name = str(node.name)
-        end_name = str(end)
-        edge_name = node_name + "-" + end_name
-
-        # Add a bipartite source.
-        qsource = QSource(
-            name=f"qsource-{edge_name}",
-            state_sampler=state_sampler,
-            models={
-                "emission_delay_model": models["source_delay"],
-                "emissions_noise_model": models["source_noise"],
-            },
-            num_ports=2,
-            status=SourceStatus.EXTERNAL,
-            output_meta={"edge": edge_name, "origin": node_name},
-        )
-        node.add_subcomponent(qsource)
+    for edge in layout.out_edges[node.name]:
+        for bank in range(layout.banks):
+            # Add a bipartite source.
+            qsource = QSource(
+                name=banked(edge.source, bank),
+                state_sampler=state_sampler,
+                models={
+                    "emission_delay_model": models["source_delay"],
+                    "emissions_noise_model": models["source_noise"],
+                },
+                num_ports=2,
+                status=SourceStatus.EXTERNAL,
+                output_meta={"edge": edge.name, "origin": edge.start},
+            )
+            node.add_subcomponent(qsource)
 
 
-def redirect_outputs(node: Node, graph: DiGraph) -> None:
+def redirect_outputs(node: Node, layout: NetworkLayout) -> None:
     """Redirect source output to connection ports.
     Parameters
     ----------
     node : str
         The name of the node.
-    graph : networkx.DiGraph
-        Graph representing the network.
+    layout : NetworkLayout
+        Wiring of the network.
     """
-    mem_position = 0
-    node_output = 1
-    node_connections = unpack_edge_values(node, graph)
-
-    network = node.supercomponent
-
-    for end in node_connections.keys():
-        node_name = str(node.name)
-        end_name = str(end)
-        edge_name = node_name + "-" + end_name
-
-        if network.source_type == "bipartite":
+    for edge in layout.out_edges[node.name]:
+        for bank in range(layout.banks):
             logger.debug("Redirecting qsource ports.")
-
-            qsource = node.subcomponents[f"qsource-{edge_name}"]
-
-            qsource.ports["qout0"].forward_output(node.ports[f"qout-{edge_name}"])
-            qsource.ports["qout1"].connect(
-                node.subcomponents["qmemory"].ports[f"qin{mem_position}"]
+            qsource = node.subcomponents[banked(edge.source, bank)]
+            qsource.ports[edge.source_port].forward_output(
+                node.ports[banked(edge.qout, bank)]
             )
-            mem_position += 2
 
-        if network.source_type == "multipartite":
-            logger.debug("Redirecting qsource ports.")
-            node.subcomponents[f"qsource-{node_name}"].ports[
-                f"qout{node_output}"
-            ].forward_output(node.ports[f"qout-{edge_name}"])
-            node_output += 1
+            if layout.bipartite:
+                position = edge.local_position + layout.bank_offset(node.name, bank)
+                qsource.ports["qout1"].connect(
+                    node.subcomponents["qmemory"].ports[f"qin{position}"]
+                )
 
 
-def redirect_inputs(node: Node) -> None:
+def redirect_inputs(node: Node, layout: NetworkLayout) -> None:
     """Redirect input ports to qmemory.
 
      Parameters
     ----------
     node : str
         The name of the node.
+    layout : NetworkLayout
+        Wiring of the network.
     """
-    # Now go through each node and assign the port
-    # for the input from each channel.
-    mem_position = 1
-    for port in node.ports.values():
-        if "out" in port.name:
-            continue
-        if "cin" in port.name:
-            continue
-
-        logger.debug("Redirecting input port to memory %s.", mem_position)
-
-        # Now from the connection we need to redirect the qubit to the
-        # qmemory of the recieving node.
-        # TODO how do we assing it to an empyty memory slot.
-
-        port.forward_input(node.subcomponents["qmemory"].ports[f"qin{mem_position}"])
-        mem_position += 2
+    # Each in-edge has its own memory position in each bank.
+    for edge in layout.in_edges[node.name]:
+        for bank in range(layout.banks):
+            position = edge.remote_position + layout.bank_offset(node.name, bank)
+            logger.debug("Redirecting input port to memory %s.", position)
+            node.ports[banked(edge.qin, bank)].forward_input(
+                node.subcomponents["qmemory"].ports[f"qin{position}"]
+            )
@@ -1,31 +1,47 @@
 """Helper functions."""
 
 # define a generic GHZ
-import csv
 import logging
-from typing import Tuple
+import re
+from functools import lru_cache
+from time import perf_counter
+from typing import List, Optional, Tuple
 
 import netsquid as ns
 import numpy as np
 from netsquid.nodes import Node
+from netsquid.qubits.dmtools import DenseDMRepr
+from netsquid.qubits.kettools import KetRepr
+from netsquid.qubits.qubit import Qubit
 from netsquid.qubits.qubitapi import discard, fidelity
+from netsquid.qubits.stabtools import StabRepr
+from netsquid.qubits.state_sampler import StateSampler
 from netsquid.util.simtools import sim_stop, sim_time
 
+from qmulticast.results import STATISTIC_FIELDS
+from qmulticast.trace import MAX_LINKS
+
+from .instrumentation import emit
+from .layout import EdgeLayout
+from .statistics import Histogram, RunningStats
+from .stopping import StoppingRule
+
 logger = logging.getLogger(__name__)
 
-res_logger = logging.Logger(name="results", level=logging.ERROR)
-fhandler = logging.FileHandler(filename="results.txt", mode="w")
-formatter = logging.Formatter("%(asctime)s:%(levelname)s:%(filename)s - %(message)s")
-fhandler.setFormatter(formatter)
-res_logger.addHandler(fhandler)
+# Output keys of the measurements fusing a link's qubit, as opposed to
+# the X measurement of a relay's own qubit.
+_FUSION_MEASUREMENT = re.compile(r"measure-(\d+)$")
 
 
+@lru_cache(maxsize=None)
 def gen_GHZ_ket(n) -> np.ndarray:
     """Create a GHZ state of n qubits.
 
     Wants a list returned in the form of weights of each element of ket
     e.g. |X> =  0.5|00> + 0|01> + 0|10> 0.5|11> => [[0.5],[0],[0],[0.5]]
 
+    Kets are cached by size and shared, so they are read only.
+
     Parameters
     ----------
     n : int
@@ -40,28 +56,235 @@ def gen_GHZ_ket(n) -> np.ndarray:
     x = np.zeros((k, 1), dtype=complex)
     x[k - 1] = 1
     x[0] = 1
-    return x / np.sqrt(2)
+    x /= np.sqrt(2)
+    x.setflags(write=False)
+    return x
+
+
+@lru_cache(maxsize=None)
+def gen_GHZ_stabilizer(n: int) -> StabRepr:
+    """Create the stabilizer representation of a GHZ state of n qubits.
+
+    The state is stabilized by X on every qubit and by Z on the first
+    qubit with Z on each other qubit, so it takes O(n^2) memory rather
+    than the O(2^n) of a ket.
+
+    Parameters
+    ----------
+    n : int
+        The number of qubits.
+
+    Returns
+    -------
+    StabRepr
+        The GHZ state, for the STAB formalism.
+    """
+    check_matrix = np.zeros((n, 2 * n), dtype=int)
+    # Check matrix rows are the X part then the Z part of a generator.
+    check_matrix[0, :n] = 1
+    check_matrix[1:, n] = 1
+    check_matrix[np.arange(1, n), n + np.arange(1, n)] = 1
+    return StabRepr(check_matrix, np.ones(n, dtype=int))
+
+
+@lru_cache(maxsize=None)
+def ghz_state_sampler(n: int, stabilizer: bool = False) -> StateSampler:
+    """Return a shared state sampler of the n qubit GHZ state.
+
+    Parameters
+    ----------
+    n : int
+        The number of qubits.
+    stabilizer : bool, default False
+        Sample stabilizer states, for the STAB formalism, rather than kets.
+    """
+    if stabilizer:
+        return StateSampler([gen_GHZ_stabilizer(n)])
+    return StateSampler([gen_GHZ_ket(n)])
+
 
+def stabilizer_ghz_fidelity(check_matrix: np.ndarray, phases: np.ndarray) -> float:
+    """Find the squared fidelity of a stabilizer state with the GHZ state.
 
-def fidelity_from_node(source: Node) -> None:
+    The circuit making a GHZ state from |0...0> is undone on the
+    state's tableau, which leaves the overlap with |0...0>. That is
+    zero if the state is stabilized by minus a product of Zs, and
+    otherwise 2^-k where k is the rank of the X part of the tableau,
+    found by Gaussian elimination over GF(2). Signs are tracked as in
+    Aaronson and Gottesman, Phys. Rev. A 70, 052328 (2004).
+
+    Parameters
+    ----------
+    check_matrix : np.ndarray
+        The (n, 2n) check matrix of the state, the X part then the Z part.
+    phases : np.ndarray
+        The sign of each generator, +1 or -1.
+
+    Returns
+    -------
+    float
+        The squared fidelity.
+    """
+    n = check_matrix.shape[0]
+    x = np.array(check_matrix[:, :n], dtype=bool)
+    z = np.array(check_matrix[:, n:], dtype=bool)
+    sign = np.asarray(phases) < 0
+
+    # Undo the CNOTs from the first qubit to each other one.
+    for qubit in range(1, n):
+        sign ^= x[:, 0] & z[:, qubit] & ~(x[:, qubit] ^ z[:, 0])
+        x[:, qubit] ^= x[:, 0]
+        z[:, 0] ^= z[:, qubit]
+    # Then the Hadamard on the first qubit.
+    sign ^= x[:, 0] & z[:, 0]
+    x[:, 0], z[:, 0] = z[:, 0].copy(), x[:, 0].copy()
+
+    rank = 0
+    for column in range(n):
+        rows = np.flatnonzero(x[rank:, column]) + rank
+        if len(rows) == 0:
+            continue
+
+        pivot = rows[0]
+        for array in (x, z, sign):
+            array[[rank, pivot]] = array[[pivot, rank]]
+        # The row swapped out has no X here, so only later rows need clearing.
+        if len(rows) > 1:
+            _multiply_rows(x, z, sign, rows[1:], rank)
+        rank += 1
+
+    if sign[rank:].any():
+        return 0.0
+    return 2.0 ** -rank
+
+
+def _multiply_rows(
+    x: np.ndarray, z: np.ndarray, sign: np.ndarray, targets: np.ndarray, row: int
+) -> None:
+    """Multiply the target rows of a tableau by another row in place."""
+    x1, z1 = x[row].astype(int), z[row].astype(int)
+    x2, z2 = x[targets].astype(int), z[targets].astype(int)
+    # The power of i from multiplying the Paulis on each qubit.
+    power = (
+        x1 * z1 * (z2 - x2)
+        + x1 * (1 - z1) * z2 * (2 * x2 - 1)
+        + (1 - x1) * z1 * x2 * (1 - 2 * z2)
+    ).sum(axis=1)
+    power += 2 * sign[targets] + 2 * sign[row]
+    sign[targets] = power % 4 == 2
+    x[targets] ^= x[row]
+    z[targets] ^= z[row]
+
+
+def ghz_fidelity(qubits: List[Qubit]) -> float:
+    """Find the squared fidelity of qubits with the GHZ state.
+
+    The GHZ state only overlaps with |0...0> and |1...1>, which do not
+    depend on the order of qubits. When the qubits make up a whole
+    shared state only those elements are read, rather than building
+    the full overlap. Stabilizer states are compared with
+    `stabilizer_ghz_fidelity` without building a ket at all.
+
+    Parameters
+    ----------
+    qubits : List[Qubit]
+        The qubits to compare with a GHZ state.
+
+    Returns
+    -------
+    float
+        The squared fidelity.
+    """
+    qstate = qubits[0].qstate
+    if (
+        qstate is not None
+        and qstate.num_qubits == len(qubits)
+        and all(qubit.qstate is qstate for qubit in qubits)
+    ):
+        qrepr = qstate.qrepr
+        if isinstance(qrepr, KetRepr):
+            ket = qrepr.ket
+            return float(abs(ket.flat[0] + ket.flat[-1]) ** 2 / 2)
+        if isinstance(qrepr, DenseDMRepr):
+            dm = qrepr.dm
+            return float((dm[0, 0] + dm[-1, -1] + 2 * dm[0, -1]).real / 2)
+        if isinstance(qrepr, StabRepr):
+            return stabilizer_ghz_fidelity(qrepr.check_matrix, qrepr.phases)
+
+    return fidelity(qubits, gen_GHZ_ket(len(qubits)), squared=True)
+
+
+def fidelity_from_node(
+    source: Node, edges: Optional[List[EdgeLayout]] = None, root: int = 0
+) -> None:
     """Calculate the fidelity of GHZ state creation.
 
+    Once the stopping rule is met the statistics are stored by field
+    name in ``network.session_results`` under the source's name, with
+    the GHZ states per second of simulation as ``throughput``. When
+    every session has finished the first session's statistics are
+    stored in ``network.results`` and the simulation is stopped.
+
+    Protocols start the generator with `next` and then advance it once
+    per round. They may send the memory bank the round used with the
+    output of the program that fused the GHZ state, which is recorded
+    with each round if ``network.trace`` is a `TraceRecorder`. Rounds
+    advanced with `next` use bank 0.
+
+    If ``network.keep_links`` is set, a round is an attempt at the
+    links which failed and the qubits of a round missing some are left
+    for the source to retry, so the rate is of GHZ states per attempt.
+
     Parameters
     ----------
     node : Node
         The node object to treat as source.
+    edges : List[EdgeLayout], optional
+        The edges whose ends hold the recievers' GHZ qubits, by
+        default the source's out-edges. Routed GHZ states reach some
+        recievers over edges from other nodes.
+    root : int, default 0
+        The memory position of the source's GHZ qubit in bank 0.
     """
-    logger.debug(f"Calculating fidelity of GHZ state from source {source}")
-    vals = np.array([])
+    logger.debug("Calculating fidelity of GHZ state from source %s", source)
+    fidelity_stats = RunningStats()
+    fidelity_sketch = Histogram(0, 1, bins=1000)
+    time_stats = RunningStats()
+    time_sketch = Histogram(1e-12, 1e3, bins=600, log=True)
 
     network = source.supercomponent  # hack
-    recievers = [str(reciever) for _, reciever in network.graph.out_edges(source.name)]
+    layout = network.layout
+    if edges is None:
+        edges = layout.out_edges[source.name]
+    recievers = [edge.end for edge in edges]
+    # Each reciever stores its qubit where the layout says, in each bank.
+    reciever_slots = [
+        [
+            (
+                network.nodes[edge.end],
+                edge.remote_position + layout.bank_offset(edge.end, bank),
+            )
+            for edge in edges
+        ]
+        for bank in range(layout.banks)
+    ]
+    stopping_rule = getattr(network, "stopping_rule", None) or StoppingRule()
+    keep_links = getattr(network, "keep_links", False)
+    # Other sessions may be using the rest of each node's memory.
+    shared_memory = layout.banks > 1 or keep_links or len(network.sessions) > 1
+    trace = getattr(network, "trace", None)
+    if trace is not None and len(edges) > MAX_LINKS:
+        raise ValueError(f"Can only trace up to {MAX_LINKS} links.")
 
     # define multipartite receivers
 
-    rate = log_entanglement_rate()
-    next(rate)
+    # Protocols start the generator when they are made. The first
+    # round then only starts the clock.
     yield
+    rate = log_entanglement_rate(time_stats, time_sketch)
+    next(rate)
+    bank, prog_output = (yield) or (0, None)
+    start_time = perf_counter()
     run = 0
     hits = 0
     lost_qubits = 0
@@ -82,20 +305,23 @@ def fidelity_from_node(source: Node) -> None:
         run += 1
         qubits = []
         qmems = []
-        for node in network.nodes.values():
-            if node is source:
-                # Assume that the source has a qubit
-                # and that it's in the 0 position.
-                qubits += node.qmemory.peek(0)
-                qmems.append(node.qmemory)
-
-            if node.name in recievers:
-                mem_pos = node.qmemory.get_matching_qubits("origin", value=source.name)
-                if not mem_pos:
-                    logger.debug("Node %s has not recieved a qubit.", node.name)
-                    lost_qubits += 1
-                qubits += node.qmemory.peek(mem_pos)
-                qmems.append(node.qmemory)
+        # Assume that the source has a qubit
+        # and that it's in the root position.
+        qubits += source.qmemory.peek(root + layout.bank_offset(source.name, bank))
+        qmems.append(source.qmemory)
+        fidelity_val = None
+        lost_links = 0
+
+        for link, (node, mem_pos) in enumerate(reciever_slots[bank]):
+            qubit = node.qmemory.peek(mem_pos)[0]
+            if qubit is None:
+                logger.debug("Node %s has not recieved a qubit.", node.name)
+                emit("fidelity.lost", run=run, node=node.name)
+                lost_qubits += 1
+                lost_links |= 1 << link
+            else:
+                qubits.append(qubit)
+            qmems.append(node.qmemory)
 
         # Bit ugly this walrus but I haven't been able to
         # use it yet and I think it's cute.
@@ -107,89 +333,137 @@ def fidelity_from_node(source: Node) -> None:
         else:
             hits += 1
             logger.debug("GHZ Qubit(s) %s", qubits)
-            fidelity_val = fidelity(qubits, gen_GHZ_ket(len(qubits)), squared=True)
-            vals = np.append(vals, fidelity_val)
-            mean_fidelity = np.mean(vals)
+            fidelity_val = ghz_fidelity(qubits)
+            fidelity_stats.update(fidelity_val)
+            fidelity_sketch.update(fidelity_val)
+            mean_fidelity = fidelity_stats.mean
 
             loss_rate = lost_qubits / (run * (len(recievers) + 1))
             # dm = convert_to(qubits, DMRepr)
-            res_logger.info(f"Run {run} Fidelity: {fidelity_val}")
-            res_logger.info(f"Average Fidelity: {mean_fidelity}")
-            res_logger.info(f"Qubit loss rate: {loss_rate}")
-            logger.info(f"Run {run} Fidelity: {fidelity_val}")
-            logger.info(f"Average Fidelity: {mean_fidelity}")
-            logger.info(f"Qubit loss rate: {loss_rate}")
-            fidelity_std = np.std(vals)
+            logger.info("Run %s Fidelity: %s", run, fidelity_val)
+            logger.info("Average Fidelity: %s", mean_fidelity)
+            logger.info("Qubit loss rate: %s", loss_rate)
+            fidelity_std = fidelity_stats.std
 
             mean_time, time_std = next(rate)
 
-            res_logger.debug("Average Run time: %s", mean_time)
-            logger.debug("Average Run time: %s", time_std)
-            res_logger.debug("Min Run time: %s", min_time)
+            logger.debug("Average Run time: %s", mean_time)
             logger.debug("Min Run time: %s", min_time)
+            emit(
+                "fidelity.hit",
+                run=run,
+                fidelity=fidelity_val,
+                mean_fidelity=mean_fidelity,
+                loss_rate=loss_rate,
+                mean_time=mean_time,
+            )
 
             if mean_time == 0:
                 logger.warning("No time has passed - entanglement rate infinite.")
-                res_logger.warning("No time has passed - entanglement rate infinite.")
             elif min_time and mean_time:
-                res_logger.info(f"Entanglement Rate: {min_time/mean_time}Hz")
-                logger.info(f"Entanglement Rate: {min_time/mean_time}Hz")
-
-        # Clean up by getting rid of qubits
-        logger.debug("Discarding qubits.")
-        for qmem in qmems:
-            qmem.reset()
-        for qubit in qubits:
-            discard(qubit)
-
-        if hits >= 100 or run >= 10000:
-            logger.debug("Logging results.")
-            # assumes we have defined these at the top of the file.
-            with open(network.output_file, mode="a") as file:
-                writer = csv.writer(file)
-                if min_time and mean_time:
-                    entanglement_rate = min_time / mean_time
-                data = [
-                    run,
-                    hits,
-                    mean_fidelity,
-                    fidelity_std,
-                    loss_rate,
-                    min_time,
-                    mean_time,
-                    time_std,
-                    entanglement_rate,
-                ]
-                writer.writerow(data)
-            sim_stop()
-
-        yield
-
-
-def log_entanglement_rate() -> Tuple[float, float]:
+                logger.info("Entanglement Rate: %sHz", min_time / mean_time)
+
+        if trace is not None:
+            outcomes = 0
+            for record, value in (prog_output or {}).items():
+                match = _FUSION_MEASUREMENT.match(record)
+                if match is not None and value == [1]:
+                    position = int(match.group(1))
+                    link = layout.local_edge(source.name, position).index
+                    outcomes |= 1 << link
+            trace.record(run, sim_time(), fidelity_val, lost_links, outcomes)
+
+        # Clean up by getting rid of qubits, unless the links which
+        # arrived are kept for the next attempt.
+        if fidelity_val is not None or not keep_links:
+            logger.debug("Discarding qubits.")
+            if not shared_memory:
+                for qmem in qmems:
+                    qmem.reset()
+            else:
+                # Other banks, kept links or other sessions may still
+                # be using the recievers' memories.
+                for node, mem_pos in reciever_slots[bank]:
+                    node.qmemory.pop(mem_pos, skip_noise=True)
+                source.qmemory.pop(
+                    root + layout.bank_offset(source.name, bank), skip_noise=True
+                )
+            for qubit in qubits:
+                discard(qubit)
+
+        stop_reason = stopping_rule.check(
+            run, hits, fidelity_stats, time_stats, perf_counter() - start_time
+        )
+        # Sessions which have finished keep running as load on the others.
+        if stop_reason is not None and source.name not in network.session_results:
+            logger.debug("Logging results, stopped for %s.", stop_reason)
+            emit("fidelity.stop", reason=stop_reason, runs=run, hits=hits)
+            if min_time and mean_time:
+                entanglement_rate = min_time / mean_time
+            data = [
+                run,
+                hits,
+                mean_fidelity,
+                fidelity_std,
+                loss_rate,
+                min_time,
+                mean_time,
+                time_std,
+                entanglement_rate,
+                # Medians scan the whole sketch, so are only found here.
+                fidelity_sketch.median,
+                time_sketch.median,
+                stop_reason,
+                stopping_rule.rel_half_width(fidelity_stats),
+                stopping_rule.rel_half_width(time_stats),
+            ]
+            elapsed = sim_time(ns.SECOND)
+            network.session_results[source.name] = dict(
+                zip(STATISTIC_FIELDS, data),
+                throughput=hits / elapsed if elapsed else None,
+            )
+            sessions = [session.source for session in network.sessions]
+            if all(name in network.session_results for name in sessions):
+                first = network.session_results[sessions[0]]
+                network.results = {field: first[field] for field in STATISTIC_FIELDS}
+                sim_stop()
+
+        bank, prog_output = (yield) or (0, None)
+
+
+def log_entanglement_rate(
+    stats: Optional[RunningStats] = None, sketch: Optional[Histogram] = None
+) -> Tuple[float, float]:
     """Generator to find the entanglement rate.
 
+    Each call records the time since the previous one, so the cost
+    per call is constant however long the simulation runs.
+
+    Parameters
+    ----------
+    stats : RunningStats, optional
+        Accumulator to record the times between calls in.
+    sketch : Histogram, optional
+        Histogram to record the times between calls in.
+
     Returns
     -------
     Tuple[float, float]
-        The entanglement rate and standard diviation.
+        The mean and standard deviation of the time between calls.
     """
-    vals = np.array([sim_time(ns.SECOND)])
+    stats = stats if stats is not None else RunningStats()
+    last_time = sim_time(ns.SECOND)
     logger.info("Entanglement rate initialised.")
     yield
 
     while True:
         time = sim_time(ns.SECOND)
-        vals = np.append(vals, time)
-        res_logger.debug("Run time: %s", vals[-1] - vals[-2])
-        logger.debug("Run time: %s", vals[-1] - vals[-2])
-        # Take mean difference so that we get more
-        # accurate over time.
-        mean_diff = np.mean(vals[1:] - vals[0:-1])
-        res_logger.debug("Average Run time: %s", mean_diff)
-        logger.debug("Average Run time: %s", mean_diff)
-
-        std = np.std(vals)
-        output = (mean_diff, std)
-
-        yield output
+        diff = time - last_time
+        last_time = time
+        stats.update(diff)
+        if sketch is not None:
+            sketch.update(diff)
+        logger.debug("Run time: %s", diff)
+        emit("rate.interval", interval=diff, mean=stats.mean)
+
+        yield stats.mean, stats.std
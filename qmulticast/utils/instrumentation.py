@@ -0,0 +1,226 @@
+"""Structured events for tracing simulations.
+
+Hot loops report what happens with `emit`, giving each event a dotted
+name and a payload of keyword values::
+
+    emit("fidelity.hit", run=run, fidelity=fidelity_val)
+
+Nothing is recorded, and nothing is created, until a sink is added
+with `add_sink`. While there are no sinks `emit` returns straight
+away. Payload values that are callables are only called once a sink
+wants the payload, so expensive values cost nothing when tracing is
+off. Code which would spend time just building a payload can guard
+it with `enabled`.
+"""
+
+import json
+import logging
+import os
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional, TextIO
+
+from netsquid.util.simtools import sim_time
+
+logger = logging.getLogger(__name__)
+
+
+class Event(NamedTuple):
+    """A named event at a simulation time [ns]."""
+
+    name: str
+    time: float
+    payload: Dict[str, Any]
+
+
+class Sink:
+    """Base class for destinations of events.
+
+    Parameters
+    ----------
+    names : Iterable[str], optional
+        Only accept events whose names start with one of these,
+        by default every event is accepted.
+    """
+
+    # Whether the sink reads payloads, so they need evaluating.
+    needs_payload = True
+
+    def __init__(self, names: Optional[Iterable[str]] = None) -> None:
+        self.names = tuple(names) if names is not None else None
+
+    def accepts(self, name: str) -> bool:
+        """Check whether the sink wants events with a name.
+
+        Parameters
+        ----------
+        name : str
+            The name of the event.
+        """
+        return self.names is None or name.startswith(self.names)
+
+    def handle(self, event: Event) -> None:
+        """Record an event.
+
+        Parameters
+        ----------
+        event : Event
+            The event, with its payload evaluated if the sink needs it.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release anything held by the sink."""
+
+
+class CounterSink(Sink):
+    """Count events by name without evaluating their payloads."""
+
+    needs_payload = False
+
+    def __init__(self, names: Optional[Iterable[str]] = None) -> None:
+        super().__init__(names)
+        self.counts: Counter = Counter()
+
+    def handle(self, event: Event) -> None:
+        self.counts[event.name] += 1
+
+
+class RingBufferSink(Sink):
+    """Keep the most recent events in memory.
+
+    Parameters
+    ----------
+    capacity : int, default 10000
+        The number of events to keep.
+    names : Iterable[str], optional
+        Only accept events whose names start with one of these.
+    """
+
+    def __init__(
+        self, capacity: int = 10000, names: Optional[Iterable[str]] = None
+    ) -> None:
+        super().__init__(names)
+        self.buffer: Deque[Event] = deque(maxlen=capacity)
+
+    def handle(self, event: Event) -> None:
+        self.buffer.append(event)
+
+    @property
+    def events(self) -> List[Event]:
+        """List[Event]: The kept events, oldest first."""
+        return list(self.buffer)
+
+
+class FileSink(Sink):
+    """Write events to a file as JSON lines.
+
+    The file is only opened when the first event arrives, and is line
+    buffered so events survive worker processes being terminated. A
+    ``{pid}`` in the path is replaced by the process id, so worker
+    processes can share a sink without sharing a file.
+
+    Parameters
+    ----------
+    path : str
+        The file to write to.
+    names : Iterable[str], optional
+        Only accept events whose names start with one of these.
+    """
+
+    def __init__(self, path: str, names: Optional[Iterable[str]] = None) -> None:
+        super().__init__(names)
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    def handle(self, event: Event) -> None:
+        if self._file is None:
+            path = self.path.replace("{pid}", str(os.getpid()))
+            logger.debug("Opening event file %s.", path)
+            self._file = open(path, mode="a", buffering=1)
+
+        record = {"name": event.name, "time": event.time, **event.payload}
+        self._file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_sinks: List[Sink] = []
+
+
+def add_sink(sink: Sink) -> Sink:
+    """Start sending events to a sink.
+
+    Parameters
+    ----------
+    sink : Sink
+        The sink to add.
+
+    Returns
+    -------
+    Sink
+        The sink added.
+    """
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Sink) -> None:
+    """Stop sending events to a sink and close it.
+
+    Parameters
+    ----------
+    sink : Sink
+        The sink to remove.
+    """
+    _sinks.remove(sink)
+    sink.close()
+
+
+def clear_sinks() -> None:
+    """Remove and close every sink."""
+    while _sinks:
+        remove_sink(_sinks[-1])
+
+
+def enabled(name: Optional[str] = None) -> bool:
+    """Check whether any sink would record an event.
+
+    Parameters
+    ----------
+    name : str, optional
+        The name of the event, by default check for any sink at all.
+    """
+    if not _sinks:
+        return False
+    return name is None or any(sink.accepts(name) for sink in _sinks)
+
+
+def emit(name: str, **payload: Any) -> None:
+    """Send an event to every sink which accepts it.
+
+    Parameters
+    ----------
+    name : str
+        The name of the event.
+    **payload
+        Values describing the event. Callables are called for their
+        value only if a sink needs the payload.
+    """
+    if not _sinks:
+        return
+
+    sinks = [sink for sink in _sinks if sink.accepts(name)]
+    if not sinks:
+        return
+
+    if any(sink.needs_payload for sink in sinks):
+        payload = {
+            key: value() if callable(value) else value
+            for key, value in payload.items()
+        }
+    event = Event(name, sim_time(), payload)
+    for sink in sinks:
+        sink.handle(event)
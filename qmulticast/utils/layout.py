@@ -0,0 +1,188 @@
+"""Defines how edges of a network map onto ports, sources and memory."""
+
+import logging
+from typing import Dict, List, NamedTuple
+
+from networkx import DiGraph
+
+logger = logging.getLogger(__name__)
+
+
+def banked(name: str, bank: int) -> str:
+    """Return the name of a component or port of a memory bank.
+
+    Bank 0 keeps the plain name, so networks without pipelining are
+    wired as before.
+
+    Parameters
+    ----------
+    name : str
+        The name in bank 0.
+    bank : int
+        The bank.
+    """
+    return name if bank == 0 else f"{name}-bank{bank}"
+
+
+class EdgeLayout(NamedTuple):
+    """A directed edge and the ports, source and memory positions it uses.
+
+    The local half of a pair sent down the k-th out-edge of a node is
+    stored at even memory position 2k of that node. The qubit arriving
+    over the j-th in-edge of a node is stored at odd position 2j + 1.
+    These are the positions in bank 0, other banks are offset by
+    `NetworkLayout.bank_offset`.
+    """
+
+    start: str
+    end: str
+    length: float
+    name: str
+    index: int
+    source: str
+    source_port: str
+    local_position: int
+    remote_position: int
+
+    @property
+    def qout(self) -> str:
+        """str: Name of the quantum port at the start of the edge."""
+        return f"qout-{self.name}"
+
+    @property
+    def qin(self) -> str:
+        """str: Name of the quantum port at the end of the edge."""
+        return f"qin-{self.name}"
+
+    @property
+    def cout(self) -> str:
+        """str: Name of the classical port at the start of the edge."""
+        return f"cout-{self.name}"
+
+    @property
+    def cin(self) -> str:
+        """str: Name of the classical port at the end of the edge."""
+        return f"cin-{self.name}"
+
+
+class NetworkLayout:
+    """Wiring of every edge of a network, built once from its graph.
+
+    Parameters
+    ----------
+    graph : networkx.DiGraph
+        Graph representing the network.
+    bipartite : bool
+        True if each edge has its own source, False for one
+        multipartite source per node.
+    banks : int, default 1
+        The number of memory banks, each with its own copy of every
+        position, source and channel so rounds can be pipelined. The
+        positions of bank b follow on from those of bank b - 1.
+
+    Properties
+    ----------
+    out_edges : Dict[str, List[EdgeLayout]]
+        The edges leaving each node, in order of memory position.
+    in_edges : Dict[str, List[EdgeLayout]]
+        The edges arriving at each node, in order of memory position.
+    edges : Dict[str, EdgeLayout]
+        Every edge by name.
+    bank_size : Dict[str, int]
+        The number of memory positions in each bank of a node.
+    num_positions : Dict[str, int]
+        The number of memory positions each node needs.
+    """
+
+    def __init__(self, graph: DiGraph, bipartite: bool, banks: int = 1) -> None:
+        if banks < 1:
+            raise ValueError("A network needs at least one memory bank.")
+
+        self.bipartite = bipartite
+        self.banks = banks
+        self.out_edges: Dict[str, List[EdgeLayout]] = {
+            str(node): [] for node in graph.nodes
+        }
+        self.in_edges: Dict[str, List[EdgeLayout]] = {
+            str(node): [] for node in graph.nodes
+        }
+        self.edges: Dict[str, EdgeLayout] = {}
+        self._local: Dict[str, Dict[int, EdgeLayout]] = {
+            str(node): {} for node in graph.nodes
+        }
+
+        for start, end, length in graph.edges.data("weight"):
+            start, end = str(start), str(end)
+            name = f"{start}-{end}"
+            index = len(self.out_edges[start])
+            edge = EdgeLayout(
+                start=start,
+                end=end,
+                length=length,
+                name=name,
+                index=index,
+                source=f"qsource-{name}" if bipartite else f"qsource-{start}",
+                # Qubit 0 of a multipartite source stays on the node.
+                source_port="qout0" if bipartite else f"qout{index + 1}",
+                local_position=2 * index,
+                remote_position=2 * len(self.in_edges[end]) + 1,
+            )
+            self.out_edges[start].append(edge)
+            self.in_edges[end].append(edge)
+            self.edges[name] = edge
+            self._local[start][edge.local_position] = edge
+
+        self.bank_size = {
+            node: 2 * max(len(self.out_edges[node]), len(self.in_edges[node]), 1)
+            for node in self.out_edges
+        }
+        self.num_positions = {
+            node: banks * size for node, size in self.bank_size.items()
+        }
+        logger.debug("Laid out %s edges.", len(self.edges))
+
+    def edge(self, start: str, end: str) -> EdgeLayout:
+        """Return the edge between two nodes.
+
+        Parameters
+        ----------
+        start : str
+            The node the edge leaves.
+        end : str
+            The node the edge arrives at.
+        """
+        return self.edges[f"{start}-{end}"]
+
+    def local_edge(self, node: str, position: int) -> EdgeLayout:
+        """Return the out-edge whose local qubit is at a memory position.
+
+        Parameters
+        ----------
+        node : str
+            The name of the node.
+        position : int
+            A memory position of the node, in any bank.
+        """
+        return self._local[node][position % self.bank_size[node]]
+
+    def bank_offset(self, node: str, bank: int) -> int:
+        """Return the first memory position of a bank of a node.
+
+        Parameters
+        ----------
+        node : str
+            The name of the node.
+        bank : int
+            The bank.
+        """
+        return bank * self.bank_size[node]
+
+    def receivers(self, node: str) -> List[str]:
+        """Return the names of the nodes a node sends to.
+
+        Parameters
+        ----------
+        node : str
+            The name of the node.
+        """
+        return [edge.end for edge in self.out_edges[node]]
@@ -0,0 +1,166 @@
+"""Time spent in each phase of the output protocols.
+
+Profiling is opt in. Setting ``network.profiler`` to a `PhaseProfiler`
+makes the output protocols mark the phases of every round::
+
+    source_wait   triggering sources and waiting for their qubits
+    program       running the program fusing Bell pairs
+    timers        waiting for qubits to cross the channels
+    heralds       waiting for recievers to herald their qubits
+    corrections   sending corrections to receivers
+    fidelity      measuring the GHZ state in `fidelity_from_node`
+    reset         clearing the source's memory
+
+A phase lasts until the next one is entered, and both the wall clock
+and simulation time spent in it are added up. The profiler is also an
+instrumentation sink counting events by name, so adding it with
+`add_sink` reports how often qubits were lost, corrections applied,
+and so on.
+
+Profiles are exported as a summary table, and as collapsed stacks of
+``protocol;phase`` frames which flame graph tools such as
+``flamegraph.pl`` and speedscope read.
+"""
+
+import logging
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from netsquid.util.simtools import sim_time
+
+from .instrumentation import CounterSink
+
+logger = logging.getLogger(__name__)
+
+# Units of the counts written to collapsed stacks, per clock.
+_STACK_UNITS = {"wall": 1e6, "sim": 1.0}
+
+
+class PhaseProfiler(CounterSink):
+    """Add up the time spent in each phase of a protocol.
+
+    Parameters
+    ----------
+    names : Iterable[str], optional
+        Only count events whose names start with one of these.
+    """
+
+    def __init__(self, names: Optional[Iterable[str]] = None) -> None:
+        super().__init__(names)
+        # Wall time [s], simulation time [ns] and entries by stack.
+        self.wall: Dict[str, float] = {}
+        self.sim: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self._current: Optional[Tuple[str, float, float]] = None
+
+    def enter(self, protocol: str, phase: str) -> None:
+        """End the current phase and start another.
+
+        Parameters
+        ----------
+        protocol : str
+            The protocol the phase belongs to.
+        phase : str
+            The name of the phase.
+        """
+        wall = perf_counter()
+        now = sim_time()
+        self._end(wall, now)
+        self._current = (f"{protocol};{phase}", wall, now)
+
+    def exit(self) -> None:
+        """End the current phase."""
+        self._end(perf_counter(), sim_time())
+        self._current = None
+
+    def cancel(self) -> None:
+        """Drop the current phase without counting it.
+
+        The simulation stops part way through a round, so the phase it
+        stopped in should be cancelled rather than ended.
+        """
+        self._current = None
+
+    def _end(self, wall: float, now: float) -> None:
+        """Add the time since the current phase started to it."""
+        if self._current is None:
+            return
+
+        stack, wall_start, sim_start = self._current
+        self.wall[stack] = self.wall.get(stack, 0.0) + wall - wall_start
+        self.sim[stack] = self.sim.get(stack, 0.0) + now - sim_start
+        self.calls[stack] = self.calls.get(stack, 0) + 1
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Return a row of totals for each phase, slowest first.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The stack, number of entries, wall time [s], simulation
+            time [ns] and share of the total wall time of each phase.
+        """
+        total = sum(self.wall.values()) or 1.0
+        rows = [
+            {
+                "stack": stack,
+                "calls": self.calls[stack],
+                "wall time": wall,
+                "mean wall time": wall / self.calls[stack],
+                "sim time": self.sim[stack],
+                "wall share": wall / total,
+            }
+            for stack, wall in self.wall.items()
+        ]
+        return sorted(rows, key=lambda row: row["wall time"], reverse=True)
+
+    def format_table(self) -> str:
+        """Format the summary and event counts as a text table."""
+        lines = [
+            f"{'phase':<40} {'calls':>8} {'wall [s]':>10} {'mean [s]':>10} "
+            f"{'sim [ns]':>12} {'share':>6}"
+        ]
+        for row in self.summary():
+            lines.append(
+                f"{row['stack']:<40} {row['calls']:>8} {row['wall time']:>10.4f} "
+                f"{row['mean wall time']:>10.2e} {row['sim time']:>12.4g} "
+                f"{row['wall share']:>6.1%}"
+            )
+        if self.counts:
+            lines.append("")
+            lines.append(f"{'event':<40} {'count':>8}")
+            for name, count in self.counts.most_common():
+                lines.append(f"{name:<40} {count:>8}")
+        return "\n".join(lines) + "\n"
+
+    def collapsed_stacks(self, clock: str = "wall") -> str:
+        """Format the phases as collapsed stacks for flame graphs.
+
+        Parameters
+        ----------
+        clock : "wall", "sim"
+            Weight stacks by wall time [us] or simulation time [ns].
+        """
+        times = self.wall if clock == "wall" else self.sim
+        scale = _STACK_UNITS[clock]
+        return "".join(
+            f"{stack} {round(time * scale)}\n" for stack, time in sorted(times.items())
+        )
+
+    def write(self, path: str) -> None:
+        """Write the summary table and collapsed stacks of a profile.
+
+        Parameters
+        ----------
+        path : str
+            The path to write to without an extension. The table is
+            written to ``.txt``, and collapsed stacks weighted by wall
+            and simulation time to ``.folded`` and ``.sim.folded``.
+        """
+        logger.debug("Writing profile %s.", path)
+        with open(f"{path}.txt", mode="w") as file:
+            file.write(self.format_table())
+        with open(f"{path}.folded", mode="w") as file:
+            file.write(self.collapsed_stacks("wall"))
+        with open(f"{path}.sim.folded", mode="w") as file:
+            file.write(self.collapsed_stacks("sim"))
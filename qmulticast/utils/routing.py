@@ -0,0 +1,193 @@
+"""Routes for multicasting GHZ states over graphs other than stars.
+
+A GHZ state is shared over a tree of links from the source which
+reaches every receiver. Every link of the tree has to deliver its
+photon for the round to succeed, so the tree that is most likely to
+succeed is the one minimising the sum of ``-log`` of each link's
+survival probability. This is a Steiner tree problem, which is solved
+approximately with the edge lengths turned into these costs.
+
+Routes are cached by the graph's edges and lengths, the source, the
+receivers and the loss constants, so the tree is only searched for
+once per network however many rounds or points use it.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from networkx.algorithms.approximation import steiner_tree
+
+from qmulticast.analytics import link_success_probability
+
+logger = logging.getLogger(__name__)
+
+
+class Route(NamedTuple):
+    """A tree of links from a source reaching a set of receivers.
+
+    Properties
+    ----------
+    source : str
+        The node the tree is rooted at.
+    receivers : FrozenSet[str]
+        The nodes which share the GHZ state with the source.
+    links : Tuple[Tuple[str, str], ...]
+        The directed links of the tree, each after the link into its
+        start so that parents come before children.
+    cost : float
+        The sum of ``-log`` of each link's survival probability.
+    """
+
+    source: str
+    receivers: FrozenSet[str]
+    links: Tuple[Tuple[str, str], ...]
+    cost: float
+
+    @property
+    def success_probability(self) -> float:
+        """float: Probability that every link of the tree succeeds."""
+        return float(np.exp(-self.cost))
+
+    @property
+    def relays(self) -> List[str]:
+        """List[str]: Nodes of the tree which only forward qubits."""
+        return [end for _, end in self.links if end not in self.receivers]
+
+    def children(self, node: str) -> List[str]:
+        """Return the nodes a node sends to in the tree.
+
+        Parameters
+        ----------
+        node : str
+            The name of the node.
+        """
+        return [end for start, end in self.links if start == node]
+
+    def parent(self, node: str) -> Optional[str]:
+        """Return the node a node receives from, None for the source.
+
+        Parameters
+        ----------
+        node : str
+            The name of the node.
+        """
+        for start, end in self.links:
+            if end == node:
+                return start
+        return None
+
+    def subtree(self, node: str) -> List[str]:
+        """Return a node and all the nodes below it in the tree.
+
+        Parameters
+        ----------
+        node : str
+            The name of the node.
+        """
+        nodes = [node]
+        for start, end in self.links:
+            if start in nodes:
+                nodes.append(end)
+        return nodes
+
+
+def link_cost(length: float, p_loss_init: float, p_loss_length: float) -> float:
+    """Return ``-log`` of the probability a photon survives a link.
+
+    Parameters
+    ----------
+    length : float
+        The length of the link [km].
+    p_loss_init : float
+        Probability of losing a photon as it enters the channel.
+    p_loss_length : float
+        Length over which a tenth of the photons survive [km].
+    """
+    return float(-np.log(link_success_probability(length, p_loss_init, p_loss_length)))
+
+
+def steiner_route(
+    graph: nx.DiGraph,
+    source: str,
+    receivers: Iterable[str],
+    p_loss_init: float,
+    p_loss_length: float,
+) -> Route:
+    """Find the route of least loss from a source to receivers.
+
+    Parameters
+    ----------
+    graph : nx.DiGraph
+        The network, with edge lengths as ``weight``.
+    source : str
+        The node to multicast from.
+    receivers : Iterable[str]
+        The nodes to share a GHZ state with.
+    p_loss_init : float
+        Probability of losing a photon as it enters a channel.
+    p_loss_length : float
+        Length over which a tenth of photons survive [km].
+
+    Returns
+    -------
+    Route
+        The tree of links, found once for each graph, source, set of
+        receivers and loss constants.
+    """
+    edges = tuple(
+        sorted(
+            (str(start), str(end), float(length))
+            for start, end, length in graph.edges.data("weight")
+        )
+    )
+    return _steiner_route(
+        edges, str(source), frozenset(map(str, receivers)), p_loss_init, p_loss_length
+    )
+
+
+@lru_cache(maxsize=None)
+def _steiner_route(
+    edges: Tuple[Tuple[str, str, float], ...],
+    source: str,
+    receivers: FrozenSet[str],
+    p_loss_init: float,
+    p_loss_length: float,
+) -> Route:
+    """Find a route, cached by the edges of the graph."""
+    if source in receivers:
+        raise ValueError("The source can't be one of the receivers.")
+
+    # Only links which can be used in both directions can be searched
+    # without knowing which end will be nearer the source.
+    directed = {(start, end) for start, end, _ in edges}
+    costs: Dict[Tuple[str, str], float] = {}
+    for start, end, length in edges:
+        if (end, start) not in directed:
+            continue
+        cost = link_cost(length, p_loss_init, p_loss_length)
+        key = tuple(sorted((start, end)))
+        costs[key] = min(cost, costs.get(key, cost))
+
+    undirected = nx.Graph()
+    undirected.add_nodes_from(node for edge in edges for node in edge[:2])
+    for (start, end), cost in costs.items():
+        undirected.add_edge(start, end, cost=cost)
+
+    terminals = [source, *sorted(receivers)]
+    missing = [node for node in terminals if node not in undirected]
+    if missing:
+        raise ValueError(f"Nodes {missing} are not in the graph.")
+    if not all(nx.has_path(undirected, source, node) for node in receivers):
+        raise ValueError(f"Not every receiver can be reached from {source}.")
+
+    logger.debug("Finding Steiner tree from %s to %s.", source, sorted(receivers))
+    tree = steiner_tree(undirected, terminals, weight="cost")
+
+    # Orient the tree away from the source, parents before children.
+    links = tuple(nx.bfs_edges(tree, source))
+    cost = sum(tree.edges[link]["cost"] for link in links)
+    logger.debug("Route %s has cost %s.", links, cost)
+    return Route(source=source, receivers=receivers, links=links, cost=cost)
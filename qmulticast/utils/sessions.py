@@ -0,0 +1,174 @@
+"""Concurrent multicast sessions sharing one network.
+
+A session is a source sharing GHZ states with a group of receivers.
+Several sessions can run at once, each with its own protocol and
+`fidelity_from_node` statistics. The simulation stops once every
+session has met the stopping rule, and sessions which finish early
+keep running so the others still see their load.
+
+Every edge has its own memory positions at both of its ends, so
+sessions using different edges use different positions of each node's
+memory. Sessions still share each node's processor, and a session
+which finds a processor busy with another waits for it. These waits
+are counted by `record_contention`.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .layout import EdgeLayout, NetworkLayout
+from .statistics import RunningStats
+
+logger = logging.getLogger(__name__)
+
+# The session simulated when none are given.
+DEFAULT_SOURCE = "0"
+
+
+class Session(NamedTuple):
+    """A source and the receivers it shares GHZ states with."""
+
+    source: str
+    receivers: Tuple[str, ...]
+
+
+def make_sessions(
+    layout: NetworkLayout,
+    sessions: Optional[Iterable[Tuple[str, Sequence[str]]]],
+    routed: bool,
+) -> List[Session]:
+    """Check and fill in the sessions of a network.
+
+    Parameters
+    ----------
+    layout : NetworkLayout
+        Wiring of the network.
+    sessions : Iterable[Tuple[str, Sequence[str]]], optional
+        Each session's source and receivers. Sessions given no
+        receivers send to every other node if routed, otherwise to the
+        source's neighbours. Defaults to one session from node "0".
+    routed : bool
+        Whether GHZ states are routed to receivers the source isn't
+        linked to.
+
+    Returns
+    -------
+    List[Session]
+        The sessions with their receivers.
+    """
+    if sessions is None:
+        sessions = [(DEFAULT_SOURCE, ())]
+
+    filled = []
+    for source, receivers in sessions:
+        source = str(source)
+        if source not in layout.out_edges:
+            raise ValueError(f"Session source {source} is not in the network.")
+        if any(session.source == source for session in filled):
+            raise ValueError(f"Node {source} is the source of more than one session.")
+
+        neighbours = layout.receivers(source)
+        receivers = tuple(str(receiver) for receiver in receivers)
+        if not receivers:
+            if routed:
+                receivers = tuple(node for node in layout.out_edges if node != source)
+            else:
+                receivers = tuple(neighbours)
+        elif not routed and sorted(receivers) != sorted(neighbours):
+            raise ValueError(
+                f"Session {source} isn't routed, so sends to all of {neighbours}."
+            )
+        filled.append(Session(source=source, receivers=receivers))
+
+    logger.debug("Sessions %s.", filled)
+    return filled
+
+
+def check_disjoint_sessions(links: Dict[str, List[EdgeLayout]]) -> None:
+    """Check that no two sessions send Bell pairs over the same edge.
+
+    Each edge has its own memory positions at both ends, so sessions
+    over different edges never use the same positions.
+
+    Parameters
+    ----------
+    links : Dict[str, List[EdgeLayout]]
+        The edges each session, by source, sends Bell pairs over.
+    """
+    owners: Dict[str, str] = {}
+    for source, edges in links.items():
+        for edge in edges:
+            if owners.setdefault(edge.name, source) != source:
+                raise ValueError(
+                    f"Sessions {owners[edge.name]} and {source} both use edge "
+                    f"{edge.name}."
+                )
+
+
+def record_contention(network: Any, source: str, wait: float) -> None:
+    """Record a session waiting for a processor busy with another.
+
+    Parameters
+    ----------
+    network : Network
+        A network made by `create_network`.
+    source : str
+        The source of the waiting session.
+    wait : float
+        How long the session waited [ns].
+    """
+    network.contention.setdefault(source, RunningStats()).update(wait)
+
+
+def network_statistics(network: Any) -> Dict[str, Any]:
+    """Return the result fields of every session together.
+
+    Parameters
+    ----------
+    network : Network
+        A network whose sessions have all finished.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The number of sessions, their total throughput of GHZ states
+        [Hz], and the number and mean length [ns] of their waits for
+        busy processors.
+    """
+    waits = RunningStats()
+    for stats in network.contention.values():
+        waits.merge(stats)
+    throughputs = [
+        results["throughput"]
+        for results in network.session_results.values()
+        if results["throughput"] is not None
+    ]
+    return {
+        "sessions": len(network.sessions),
+        "network throughput": sum(throughputs) if throughputs else None,
+        "contentions": waits.count,
+        "contention time": waits.mean,
+    }
+
+
+def session_rows(network: Any) -> List[Dict[str, Any]]:
+    """Return the statistics of each session of a network.
+
+    Parameters
+    ----------
+    network : Network
+        A network whose sessions have all finished.
+    """
+    rows = []
+    for session in network.sessions:
+        waits = network.contention.get(session.source, RunningStats())
+        rows.append(
+            {
+                "source": session.source,
+                "receivers": list(session.receivers),
+                **network.session_results.get(session.source, {}),
+                "contentions": waits.count,
+                "contention time": waits.mean,
+            }
+        )
+    return rows
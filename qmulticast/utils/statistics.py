@@ -0,0 +1,236 @@
+"""Streaming statistics with constant memory and time per update."""
+
+import math
+from typing import Optional
+
+import numpy as np
+
+
+class RunningStats:
+    """Welford accumulator for the count, mean and variance of a stream.
+
+    Partial results, e.g. from different workers, can be combined
+    with `merge`.
+
+    Properties
+    ----------
+    count : int
+        The number of values seen.
+    mean : float
+        The mean of the values seen, None if there are none.
+    variance : float
+        The population variance of the values seen.
+    std : float
+        The population standard deviation of the values seen.
+    """
+
+    __slots__ = ("count", "_mean", "_m2", "min", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value: float) -> None:
+        """Add a value to the stream.
+
+        Parameters
+        ----------
+        value : float
+            The new value.
+        """
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """Combine the values seen by another accumulator into this one.
+
+        Parameters
+        ----------
+        other : RunningStats
+            The accumulator to merge in.
+
+        Returns
+        -------
+        RunningStats
+            This accumulator.
+        """
+        if other.count == 0:
+            return self
+
+        count = self.count + other.count
+        delta = other._mean - self._mean
+        self._mean += delta * other.count / count
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self) -> Optional[float]:
+        """float: The mean of the values seen."""
+        return self._mean if self.count else None
+
+    @property
+    def variance(self) -> Optional[float]:
+        """float: The population variance of the values seen."""
+        return self._m2 / self.count if self.count else None
+
+    @property
+    def std(self) -> Optional[float]:
+        """float: The population standard deviation of the values seen."""
+        return math.sqrt(self.variance) if self.count else None
+
+
+class Histogram:
+    """Fixed bin histogram sketch of a stream, used to estimate quantiles.
+
+    Values outside of ``[low, high)`` are counted in under and overflow
+    bins. Histograms with the same bins can be merged.
+
+    Parameters
+    ----------
+    low : float
+        The lower edge of the first bin.
+    high : float
+        The upper edge of the last bin.
+    bins : int, default 1000
+        The number of bins.
+    log : bool, default False
+        Space bins logarithmically, ``low`` must then be positive.
+    """
+
+    def __init__(
+        self, low: float, high: float, bins: int = 1000, log: bool = False
+    ) -> None:
+        if not low < high:
+            raise ValueError("low must be less than high.")
+        if log and low <= 0:
+            raise ValueError("low must be positive for log spaced bins.")
+
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.log = log
+        self.counts = np.zeros(bins + 2, dtype=np.int64)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+        if log:
+            self._start = math.log(low)
+            self._scale = bins / (math.log(high) - self._start)
+        else:
+            self._start = low
+            self._scale = bins / (high - low)
+
+    def update(self, value: float) -> None:
+        """Add a value to the stream.
+
+        Parameters
+        ----------
+        value : float
+            The new value.
+        """
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if value < self.low:
+            self.counts[0] += 1
+        elif value >= self.high:
+            self.counts[-1] += 1
+        else:
+            position = math.log(value) if self.log else value
+            index = int((position - self._start) * self._scale)
+            self.counts[min(index, self.bins - 1) + 1] += 1
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        """Combine the values seen by another histogram into this one.
+
+        Parameters
+        ----------
+        other : Histogram
+            A histogram with the same bins.
+
+        Returns
+        -------
+        Histogram
+            This histogram.
+        """
+        if (other.low, other.high, other.bins, other.log) != (
+            self.low,
+            self.high,
+            self.bins,
+            self.log,
+        ):
+            raise ValueError("Can only merge histograms with the same bins.")
+
+        self.counts += other.counts
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def edges(self) -> np.ndarray:
+        """Return the edges of the bins."""
+        if self.log:
+            return np.geomspace(self.low, self.high, self.bins + 1)
+        return np.linspace(self.low, self.high, self.bins + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile of the values seen.
+
+        Values are assumed to be spread evenly through their bin.
+
+        Parameters
+        ----------
+        q : float
+            The quantile to find, between 0 and 1.
+
+        Returns
+        -------
+        float
+            The estimate, None if no values have been seen.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1.")
+        if self.count == 0:
+            return None
+
+        target = q * self.count
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, target))
+        index = min(index, len(self.counts) - 1)
+
+        # Under and overflow values can only be bounded by what we've seen.
+        if index == 0:
+            return self.min
+        if index == len(self.counts) - 1:
+            return self.max
+
+        edges = self.edges()
+        lower, upper = edges[index - 1], edges[index]
+        below = cumulative[index - 1]
+        fraction = (target - below) / self.counts[index]
+        if self.log:
+            value = lower * (upper / lower) ** fraction
+        else:
+            value = lower + (upper - lower) * fraction
+        return float(min(max(value, self.min), self.max))
+
+    @property
+    def median(self) -> Optional[float]:
+        """float: An estimate of the median of the values seen."""
+        return self.quantile(0.5)
@@ -0,0 +1,132 @@
+"""Rules deciding when a simulation has gathered enough statistics."""
+
+import math
+from statistics import NormalDist
+from typing import Optional
+
+from .statistics import RunningStats
+
+# Successful runs needed before the normal approximation of the
+# confidence intervals is trusted.
+MIN_HITS = 30
+
+
+class StoppingRule:
+    """Decide when to stop simulating a network.
+
+    By default a simulation stops after 100 successful runs or 10000
+    runs. Given a target confidence interval width it instead stops as
+    soon as both the mean fidelity and the entanglement rate are known
+    to that precision.
+
+    Parameters
+    ----------
+    rel_ci_width : float, optional
+        Target relative half-width of the confidence intervals of the
+        mean fidelity and entanglement rate.
+    confidence : float, default 0.95
+        Confidence level of the intervals.
+    min_hits : int, default MIN_HITS
+        Successful runs needed before checking the interval widths.
+        Values which haven't varied in fewer runs than this have an
+        undefined interval, rather than one of zero width.
+    max_hits : int, optional, default 100
+        Stop after this many successful runs.
+    max_runs : int, optional, default 10000
+        Stop after this many runs.
+    wall_time : float, optional
+        Stop after this many seconds of wall clock time.
+    """
+
+    def __init__(
+        self,
+        rel_ci_width: Optional[float] = None,
+        confidence: float = 0.95,
+        min_hits: int = MIN_HITS,
+        max_hits: Optional[int] = 100,
+        max_runs: Optional[int] = 10000,
+        wall_time: Optional[float] = None,
+    ) -> None:
+        if not 0 < confidence < 1:
+            raise ValueError("confidence must be between 0 and 1.")
+
+        self.rel_ci_width = rel_ci_width
+        self.confidence = confidence
+        self.min_hits = min_hits
+        self.max_hits = max_hits
+        self.max_runs = max_runs
+        self.wall_time = wall_time
+        self._z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    def rel_half_width(self, stats: RunningStats) -> Optional[float]:
+        """Find the relative half-width of the confidence interval of a mean.
+
+        Parameters
+        ----------
+        stats : RunningStats
+            The values to find the interval for.
+
+        Returns
+        -------
+        float
+            The half-width divided by the mean, None if it is undefined.
+        """
+        if stats.count < 2:
+            return None
+        if stats.std == 0 and stats.count < self.min_hits:
+            # A few equal values, e.g. noiseless hits, aren't exact.
+            return None
+        if stats.mean == 0:
+            return 0.0 if stats.std == 0 else math.inf
+        return self._z * stats.std / math.sqrt(stats.count) / abs(stats.mean)
+
+    def check(
+        self,
+        runs: int,
+        hits: int,
+        fidelity_stats: RunningStats,
+        time_stats: RunningStats,
+        elapsed: float,
+    ) -> Optional[str]:
+        """Check whether to stop.
+
+        The relative width of the entanglement rate interval is taken
+        to be that of the mean time between successes.
+
+        Parameters
+        ----------
+        runs : int
+            The number of runs so far.
+        hits : int
+            The number of successful runs so far.
+        fidelity_stats : RunningStats
+            Fidelities of successful runs.
+        time_stats : RunningStats
+            Times between successful runs.
+        elapsed : float
+            Wall clock time spent so far [s].
+
+        Returns
+        -------
+        str
+            The reason to stop, None if the simulation should go on.
+        """
+        if self.rel_ci_width is not None and hits >= self.min_hits:
+            fidelity_width = self.rel_half_width(fidelity_stats)
+            rate_width = self.rel_half_width(time_stats)
+            if (
+                fidelity_width is not None
+                and rate_width is not None
+                and fidelity_width <= self.rel_ci_width
+                and rate_width <= self.rel_ci_width
+            ):
+                return "precision"
+
+        if self.max_hits is not None and hits >= self.max_hits:
+            return "max hits"
+        if self.max_runs is not None and runs >= self.max_runs:
+            return "max runs"
+        if self.wall_time is not None and elapsed >= self.wall_time:
+            return "wall time"
+
+        return None
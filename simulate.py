@@ -1,18 +1,82 @@
+import argparse
 import logging
+import json
 import os
 from datetime import datetime
+from functools import partial
+from multiprocessing import Pool
 from time import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import netsquid as ns
 import netsquid.qubits.qubitapi as qapi
 import numpy as np
 from netsquid.nodes import Network
 
-from qmulticast.protocols import BipartiteProtocol, MultipartiteProtocol
-from qmulticast.utils import create_network
+from qmulticast.batched import simulate_star
+from qmulticast.checkpoint import Manifest, point_key, write_in_order
+from qmulticast.programs import FUSION_PROGRAMS
+from qmulticast.protocols import (
+    BipartiteProtocol,
+    MultipartiteProtocol,
+    RoutedMulticastProtocol,
+)
+from qmulticast.utils import StoppingRule, cached_network, create_network
+from qmulticast.utils.stopping import MIN_HITS
+from qmulticast.utils import instrumentation
+from qmulticast.utils.create_network import network_parameters
+from qmulticast.utils.profiling import PhaseProfiler
+from qmulticast.utils.sessions import (
+    check_disjoint_sessions,
+    network_statistics,
+    session_rows,
+)
+from qmulticast.results import STATISTIC_FIELDS, ResultsWriter
+from qmulticast.sweep import BASE_SEED, NetworkSpec, SweepSpec
+from qmulticast.trace import TraceRecorder
 from qmulticast.utils.graphlibrary import *
 
-ns.set_random_state(seed=123456)
+logger = logging.getLogger(__name__)
+
+
+# Constructors of the fixed graphs a sweep can simulate.
+GRAPHS = {
+    "butterfly": ButterflyGraph,
+    "twin": TwinGraph,
+    "repeater": RepeaterGraph,
+    "triangle": TriangleGraph,
+}
+
+# Options of `create_network` which only apply to bipartite sources.
+BIPARTITE_OPTIONS = (
+    "pipeline_depth",
+    "keep_links",
+    "memory_cutoff",
+    "routed",
+    "sessions",
+)
+
+# Quantum state formalisms points can be simulated with. Every operation
+# of the protocols is a Clifford and all noise is Pauli noise, so
+# stabilizer states give the same statistics in polynomial memory.
+FORMALISMS = {
+    "ket": ns.QFormalism.KET,
+    "stab": ns.QFormalism.STAB,
+}
+
+
+class SweepPoint(NamedTuple):
+    """A single independent simulation in a parameter sweep."""
+
+    index: int
+    bipartite: bool
+    graph: str
+    num_nodes: int
+    noise_rate: float
+    p_loss_init: float
+    p_loss_length: float
+    length: float
+    seed: int
 
 
 def init_logs() -> None:
@@ -32,9 +96,6 @@ def init_logs() -> None:
         "%(asctime)s:%(levelname)s:%(filename)s - %(message)s"
     )
 
-    global logger
-    logger = logging.getLogger(__name__)
-
     # simlogger = logging.getLogger("netsquid")
     # simlogger.setLevel(logging.DEBUG)
     # fhandler = logging.FileHandler("simlogs.txt", mode="w")
@@ -47,91 +108,748 @@ def init_logs() -> None:
     # simlogger.addHandler(shandler)
 
 
-def simulate_network(network: Network, bipartite=True, source_val="0") -> None:
+def parse_session(value: str) -> Tuple[str, Tuple[str, ...]]:
+    """Parse a session given as ``SOURCE`` or ``SOURCE:RECEIVER,...``.
+
+    Parameters
+    ----------
+    value : str
+        The session argument.
+
+    Returns
+    -------
+    Tuple[str, Tuple[str, ...]]
+        The source and receivers, no receivers if none were given.
+    """
+    source, _, receivers = value.partition(":")
+    if not source:
+        raise argparse.ArgumentTypeError(f"Session {value} has no source.")
+    return source, tuple(receiver for receiver in receivers.split(",") if receiver)
+
+
+def parseargs() -> argparse.Namespace:
+    """Parse args for the simulation sweep."""
+    parser = argparse.ArgumentParser(description="Run network simulation sweeps.")
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes to spread sweep points over.",
+    )
+    parser.add_argument(
+        "--reuse",
+        action="store_true",
+        help="Reuse each network a worker builds, reconfiguring it for every point.",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["netsquid", "batched"],
+        default="netsquid",
+        help="Simulate with NetSquid or the batched NumPy engine for stars.",
+    )
+    parser.add_argument(
+        "--fusion",
+        type=str,
+        choices=list(FUSION_PROGRAMS),
+        default="linear",
+        help="Fuse Bell pairs one after another or in a log depth tree.",
+    )
+    parser.add_argument(
+        "--pipeline-depth",
+        type=int,
+        default=1,
+        help="Rounds each bipartite source may have in flight at once.",
+    )
+    parser.add_argument(
+        "--keep-links",
+        action="store_true",
+        help="Keep Bell pairs which arrive and only retry failed links.",
+    )
+    parser.add_argument(
+        "--memory-cutoff",
+        type=float,
+        default=None,
+        help="Time kept Bell pairs may wait in memory [ns].",
+    )
+    parser.add_argument(
+        "--heralded",
+        action="store_true",
+        help="End rounds when recievers herald their qubits, not on timers.",
+    )
+    parser.add_argument(
+        "--routed",
+        action="store_true",
+        help="Route bipartite GHZ states over least loss trees of any graph.",
+    )
+    parser.add_argument(
+        "--session",
+        type=parse_session,
+        action="append",
+        default=None,
+        dest="sessions",
+        metavar="SOURCE[:RECEIVER,...]",
+        help="Run a bipartite multicast session from this source at the same time \
+            as the others, to its neighbours or the receivers given.",
+    )
+    parser.add_argument(
+        "--formalism",
+        type=str,
+        choices=list(FORMALISMS),
+        default="ket",
+        help="Quantum state formalism, stab simulates hundreds of receivers.",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record every round of every point to the traces folder of the sweep.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each phase of every point and write profiles to the sweep folder.",
+    )
+    parser.add_argument(
+        "--spec",
+        type=str,
+        default=None,
+        help="TOML or JSON file describing the sweep, see qmulticast.sweep.",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        metavar="FOLDER",
+        help="Carry on an interrupted sweep in this folder, skipping finished points.",
+    )
+    parser.add_argument(
+        "--ci-width",
+        type=float,
+        default=None,
+        help="Stop each point once the relative confidence interval half-width \
+            of mean fidelity and entanglement rate is below this.",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level used with --ci-width.",
+    )
+    parser.add_argument(
+        "--min-hits",
+        type=int,
+        default=MIN_HITS,
+        help="Successful runs needed before checking --ci-width.",
+    )
+    parser.add_argument(
+        "--max-hits",
+        type=int,
+        default=100,
+        help="Stop each point after this many successful runs.",
+    )
+    parser.add_argument(
+        "--max-runs",
+        type=int,
+        default=10000,
+        help="Stop each point after this many runs.",
+    )
+    parser.add_argument(
+        "--wall-time",
+        type=float,
+        default=None,
+        help="Stop each point after this many seconds.",
+    )
+    parser.add_argument(
+        "--events",
+        type=str,
+        default=None,
+        help="Record simulation events as JSON lines to this file, \
+            {pid} is replaced by the id of each worker process.",
+    )
+    return parser.parse_args()
+
+
+def init_worker(event_file: Optional[str] = None, formalism: str = "ket") -> None:
+    """Set up a worker process.
+
+    Parameters
+    ----------
+    event_file : str, optional
+        File to record simulation events to, none are recorded if not given.
+    formalism : str, default "ket"
+        The NetSquid quantum state formalism, a key of `FORMALISMS`.
+    """
+    ns.set_qstate_formalism(FORMALISMS[formalism])
+    if event_file is not None:
+        instrumentation.add_sink(instrumentation.FileSink(event_file))
+
+
+def point_seed(base_seed: int, index: int) -> int:
+    """Derive the random seed of a sweep point from the base seed.
+
+    The seed only depends on the base seed and the position of the
+    point in the sweep, so results do not depend on how points are
+    scheduled over worker processes.
+
+    Parameters
+    ----------
+    base_seed : int
+        The seed of the whole sweep.
+    index : int
+        The position of the point in the sweep.
+
+    Returns
+    -------
+    int
+        A seed for ``ns.set_random_state``.
+    """
+    sequence = np.random.SeedSequence(entropy=base_seed, spawn_key=(index,))
+    return int(sequence.generate_state(1)[0])
+
+
+def star_graph(num_nodes: int, length: float) -> nx.DiGraph:
+    """Create a star graph with node "0" at the centre.
+
+    Parameters
+    ----------
+    num_nodes : int
+        The number of nodes connected to the centre.
+    length : float
+        The length of each edge.
+    """
+    graph = nx.DiGraph()
+    graph.length = length
+
+    # Add the number of edges we want.
+    for node in range(1, num_nodes + 1):
+        graph.add_edge("0", str(node), weight=length)
+        graph.add_edge(str(node), "0", weight=length)
+
+    return graph
+
+
+def build_graph(point: SweepPoint) -> nx.DiGraph:
+    """Create the graph of a sweep point.
+
+    Parameters
+    ----------
+    point : SweepPoint
+        The point to create the graph for.
+    """
+    if point.graph == "star":
+        return star_graph(point.num_nodes, point.length)
+    return GRAPHS[point.graph](point.length)
+
+
+def simulate_network(network: Network, bipartite=True) -> None:
     """Assign protocols and run simulation.
 
+    Each of ``network.sessions`` gets an output protocol on its source,
+    and every other node a receiving protocol.
+
     Parameters
     ----------
     network : Network
         The network object to run simulation on.
     """
+    sessions = network.sessions
+    sources = {session.source for session in sessions}
+    receivers = {receiver for session in sessions for receiver in session.receivers}
     protocols = []
-    if bipartite:
-        for node in network.nodes.values():
-            logger.debug("Adding protocol to node %s", node.name)
-            if node.name == source_val:
-                protocols.append(BipartiteProtocol(node, source=True, receiver=False))
-            else:
-                protocols.append(BipartiteProtocol(node))
+    if network.routed:
+        for session in sessions:
+            logger.debug("Adding routed protocol to node %s", session.source)
+            protocols.append(
+                RoutedMulticastProtocol(
+                    network.nodes[session.source], receivers=session.receivers
+                )
+            )
+        links = {protocol.route.source: protocol.links for protocol in protocols}
     else:
+        protocol_type = BipartiteProtocol if bipartite else MultipartiteProtocol
         for node in network.nodes.values():
             logger.debug("Adding protocol to node %s", node.name)
-            if node.name == source_val:
+            if node.name in sources:
+                # Sources only receive if another session sends to them.
                 protocols.append(
-                    MultipartiteProtocol(node, source=True, receiver=False)
+                    protocol_type(node, source=True, receiver=node.name in receivers)
                 )
             else:
-                protocols.append(MultipartiteProtocol(node))
+                protocols.append(protocol_type(node))
+        links = {
+            session.source: network.layout.out_edges[session.source]
+            for session in sessions
+        }
+    # Sessions sharing an edge would share its memory positions.
+    check_disjoint_sessions(links)
 
     for protocol in protocols:
         protocol.start()
 
     logger.debug("Running sim.")
     ns.sim_run()
+
+    # Protocols are rebuilt for every run, so a network can be reused.
+    for protocol in protocols:
+        protocol.stop()
     ns.sim_reset()
 
 
+def run_batched(
+    chunk: List[SweepPoint], stopping_rule: Optional[StoppingRule] = None
+) -> List[Dict]:
+    """Simulate sweep points with the batched NumPy engine.
+
+    Parameters
+    ----------
+    chunk : List[SweepPoint]
+        The parameters of the points to simulate.
+    stopping_rule : StoppingRule, optional
+        When to stop simulating each point.
+
+    Returns
+    -------
+    List[Dict]
+        The result rows of these points.
+    """
+    rows = []
+    for point in chunk:
+        if point.graph != "star":
+            raise ValueError("The batched engine can only simulate stars.")
+
+        statistics = simulate_star(
+            point.num_nodes,
+            point.length,
+            point.noise_rate,
+            bipartite=point.bipartite,
+            p_loss_init=point.p_loss_init,
+            p_loss_length=point.p_loss_length,
+            stopping_rule=stopping_rule,
+            seed=point.seed,
+        )
+        rows.append(
+            {
+                "type": "bipartite" if point.bipartite else "multipartite",
+                "graph": point.graph,
+                "number of edges": point.num_nodes,
+                "edge length": point.length,
+                "p_loss_length": point.p_loss_length,
+                "p_loss_init": point.p_loss_init,
+                "noise rate": point.noise_rate,
+                "seed": point.seed,
+                **dict(zip(STATISTIC_FIELDS, statistics)),
+            }
+        )
+    return rows
+
+
+def run_chunk(
+    chunk: List[SweepPoint],
+    stopping_rule: Optional[StoppingRule] = None,
+    trace_folder: Optional[str] = None,
+    profile_folder: Optional[str] = None,
+    session_folder: Optional[str] = None,
+    network_options: Optional[Dict[str, Any]] = None,
+    reuse: bool = False,
+) -> List[Dict]:
+    """Simulate a group of sweep points on one network.
+
+    Without ``reuse`` a network is built for every point. With it the
+    network built for the first point on each network type is kept by
+    `cached_network` and reconfigured for later points this process
+    simulates, in this chunk or any other.
+
+    Parameters
+    ----------
+    chunk : List[SweepPoint]
+        The parameters of the points to simulate.
+    stopping_rule : StoppingRule, optional
+        When to stop simulating each point.
+    trace_folder : str, optional
+        Folder to record every round of each point to.
+    profile_folder : str, optional
+        Folder to write a profile of the phases of each point to.
+    session_folder : str, optional
+        Folder to write the statistics of each session of each point to.
+    network_options : Dict[str, Any], optional
+        Keyword arguments for `create_network`. Those in
+        `BIPARTITE_OPTIONS` are left out for multipartite points.
+    reuse : bool, default False
+        Reuse the networks this process has built, see `cached_network`.
+
+    Returns
+    -------
+    List[Dict]
+        The result rows of these points.
+    """
+    network_options = dict(network_options or {})
+    build = cached_network if reuse else create_network
+    rows = []
+    for point in chunk:
+        print(
+            f"nodes: {point.num_nodes} length: {point.length} noise: {point.noise_rate}"
+        )
+        ns.sim_reset()
+        ns.set_random_state(seed=point.seed)
+
+        options = network_options
+        if not point.bipartite:
+            options = {
+                name: value
+                for name, value in network_options.items()
+                if name not in BIPARTITE_OPTIONS
+            }
+        graph = build_graph(point)
+        logger.debug("Created multipartite graph.")
+        network = build(
+            "bipartite-butterfly",
+            graph,
+            bipartite=point.bipartite,
+            noise_rate=point.noise_rate,
+            stopping_rule=stopping_rule,
+            p_loss_init=point.p_loss_init,
+            p_loss_length=point.p_loss_length,
+            **options,
+        )
+        logger.debug("Created multipartite Network.")
+
+        if trace_folder is not None:
+            network.trace = TraceRecorder(
+                os.path.join(trace_folder, f"point-{point.index}.npy")
+            )
+        if profile_folder is not None:
+            network.profiler = PhaseProfiler()
+            instrumentation.add_sink(network.profiler)
+        simulate_network(network, point.bipartite)
+        if trace_folder is not None:
+            network.trace.close()
+        if profile_folder is not None:
+            instrumentation.remove_sink(network.profiler)
+            network.profiler.cancel()
+            network.profiler.write(os.path.join(profile_folder, f"point-{point.index}"))
+        rows.append(
+            {
+                **network_parameters(network),
+                "graph": point.graph,
+                "seed": point.seed,
+                **(network.results or {}),
+                **network_statistics(network),
+            }
+        )
+        if session_folder is not None:
+            path = os.path.join(session_folder, f"point-{point.index}.json")
+            with open(path, mode="w") as file:
+                json.dump(session_rows(network), file, indent=1)
+
+    return rows
+
+
+def chunk_points(points: List[SweepPoint], reuse: bool) -> List[List[SweepPoint]]:
+    """Group sweep points into units of work.
+
+    Parameters
+    ----------
+    points : List[SweepPoint]
+        The points to group, in output order.
+    reuse : bool
+        If True consecutive points on the same network are grouped so
+        that they reuse one network, otherwise every point is its own
+        chunk.
+    """
+    if not reuse:
+        return [[point] for point in points]
+
+    chunks = []
+    for point in points:
+        if chunks and network_key(chunks[-1][-1]) == network_key(point):
+            chunks[-1].append(point)
+        else:
+            chunks.append([point])
+    return chunks
+
+
+def network_key(point: SweepPoint) -> NetworkSpec:
+    """Return what a point's network depends on other than length."""
+    return NetworkSpec(
+        bipartite=point.bipartite,
+        graph=point.graph,
+        num_nodes=point.num_nodes,
+        noise_rate=point.noise_rate,
+        p_loss_init=point.p_loss_init,
+        p_loss_length=point.p_loss_length,
+    )
+
+
+def sweep_points(
+    networks: Dict[NetworkSpec, List[float]], start: int, base_seed: int = BASE_SEED
+) -> List[SweepPoint]:
+    """Make the points of a sweep in output order.
+
+    Parameters
+    ----------
+    networks : Dict[NetworkSpec, List[float]]
+        The lengths to simulate each network at.
+    start : int
+        The index of the first point.
+    base_seed : int
+        The seed from which each point's seed is derived.
+    """
+    points = []
+    for network, lengths in networks.items():
+        for length in lengths:
+            index = start + len(points)
+            points.append(
+                SweepPoint(
+                    index=index,
+                    length=length,
+                    seed=point_seed(base_seed, index),
+                    **network._asdict(),
+                )
+            )
+    return points
+
+
+def point_parameters(
+    point: SweepPoint,
+    reuse: bool,
+    stopping_rule: Optional[StoppingRule],
+    engine: str,
+    formalism: str,
+    network_options: Optional[Dict[str, Any]],
+) -> Dict:
+    """Return everything the result of a sweep point depends on.
+
+    Parameters
+    ----------
+    point : SweepPoint
+        The point.
+    reuse, stopping_rule, engine, formalism, network_options
+        As passed to `run_sweep`.
+    """
+    parameters = point._asdict()
+    # The seed already depends on the position of the point.
+    del parameters["index"]
+    parameters.update(
+        reuse=reuse,
+        stopping_rule=vars(stopping_rule or StoppingRule()),
+        engine=engine,
+        formalism=formalism,
+        network_options=network_options or {},
+    )
+    return parameters
+
+
+def run_sweep(
+    points: List[SweepPoint],
+    folder: str,
+    workers: int,
+    reuse: bool = False,
+    stopping_rule: Optional[StoppingRule] = None,
+    engine: str = "netsquid",
+    event_file: Optional[str] = None,
+    trace: bool = False,
+    profile: bool = False,
+    formalism: str = "ket",
+    network_options: Optional[Dict[str, Any]] = None,
+) -> List[Dict]:
+    """Simulate sweep points over a pool of worker processes.
+
+    Results are written to ``results.npz`` in the folder in the order
+    of ``points`` however many workers are used. Each finished point is
+    also recorded in ``manifest.jsonl``, and points already recorded
+    there are not simulated again, so an interrupted sweep can be
+    resumed by running it on the same folder. A resumed sweep writes
+    the same rows in the same order as one which was never stopped,
+    and a partly written last record in the manifest is dropped.
+
+    Parameters
+    ----------
+    points : List[SweepPoint]
+        The points to simulate.
+    folder : str
+        The folder to write results to.
+    workers : int
+        The number of worker processes.
+    reuse : bool, default False
+        Build one network per type and node count in each worker
+        process, see `cached_network`, and reconfigure it for each
+        length and noise rate rather than building a network per point.
+    stopping_rule : StoppingRule, optional
+        When to stop simulating each point.
+    engine : "netsquid", "batched"
+        Which simulator to run points with.
+    event_file : str, optional
+        File for each worker to record simulation events to.
+    trace : bool, default False
+        Record every round of each point to ``traces/point-<index>.npy``
+        in the folder, only for the NetSquid engine.
+    profile : bool, default False
+        Write a profile of the phases of each point to
+        ``profiles/point-<index>`` in the folder, only for the NetSquid
+        engine. See `qmulticast.utils.profiling`.
+    formalism : str, default "ket"
+        The quantum state formalism of the NetSquid engine, a key of
+        `FORMALISMS`.
+    network_options : Dict[str, Any], optional
+        Keyword arguments for `create_network` such as ``fusion`` and
+        ``pipeline_depth``, only for the NetSquid engine. With more than
+        one of ``sessions`` the statistics of each session of each point
+        are written to ``sessions/point-<index>.json`` in the folder.
+
+    Returns
+    -------
+    List[Dict]
+        The result row of each point.
+    """
+    keys = {
+        point: point_key(
+            point_parameters(
+                point, reuse, stopping_rule, engine, formalism, network_options
+            )
+        )
+        for point in points
+    }
+
+    with Manifest(os.path.join(folder, "manifest.jsonl")) as manifest:
+        finished = manifest.load()
+        remaining = [point for point in points if keys[point] not in finished]
+        logger.info(
+            "Resuming with %s of %s points finished.",
+            len(points) - len(remaining),
+            len(points),
+        )
+
+        chunks = chunk_points(remaining, reuse)
+        if engine == "batched":
+            runner = partial(run_batched, stopping_rule=stopping_rule)
+        else:
+            trace_folder = os.path.join(folder, "traces") if trace else None
+            if trace_folder is not None:
+                os.makedirs(trace_folder, exist_ok=True)
+            profile_folder = os.path.join(folder, "profiles") if profile else None
+            if profile_folder is not None:
+                os.makedirs(profile_folder, exist_ok=True)
+            sessions = (network_options or {}).get("sessions") or []
+            session_folder = (
+                os.path.join(folder, "sessions") if len(sessions) > 1 else None
+            )
+            if session_folder is not None:
+                os.makedirs(session_folder, exist_ok=True)
+            runner = partial(
+                run_chunk,
+                stopping_rule=stopping_rule,
+                trace_folder=trace_folder,
+                profile_folder=profile_folder,
+                session_folder=session_folder,
+                network_options=network_options,
+                reuse=reuse,
+            )
+
+        logger.debug("Starting program.")
+        with Pool(
+            processes=workers,
+            initializer=init_worker,
+            initargs=(event_file, formalism),
+        ) as pool:
+            results = pool.imap(runner, chunks, chunksize=1)
+            with ResultsWriter(os.path.join(folder, "results.npz")) as writer:
+                # Rows are written in sweep order however the sweep was
+                # interrupted, each once every point before it is done.
+                order = [keys[point] for point in points]
+                written = write_in_order(writer, order, finished, 0)
+                for chunk, rows in zip(chunks, results):
+                    for point, row in zip(chunk, rows):
+                        manifest.record(keys[point], row)
+                        finished[keys[point]] = row
+                    written = write_in_order(writer, order, finished, written)
+
+    return [finished[keys[point]] for point in points]
+
+
+def run_spec(spec: SweepSpec, folder: str, workers: int, **kwargs) -> None:
+    """Simulate a sweep described by a spec.
+
+    With adaptive sampling the sweep runs in rounds, each simulating
+    the lengths chosen from the results of all rounds before it.
+
+    Parameters
+    ----------
+    spec : SweepSpec
+        The sweep.
+    folder : str
+        The folder to write results to.
+    workers : int
+        The number of worker processes.
+    **kwargs
+        Passed on to `run_sweep`.
+    """
+    new_lengths = {network: spec.initial_lengths() for network in spec.networks()}
+    points = []
+
+    while new_lengths:
+        points += sweep_points(new_lengths, start=len(points), base_seed=spec.seed)
+        rows = run_sweep(points, folder, workers, **kwargs)
+        if spec.adaptive is None:
+            break
+
+        results = {}
+        for point, row in zip(points, rows):
+            lengths, network_rows = results.setdefault(network_key(point), ([], []))
+            lengths.append(point.length)
+            network_rows.append(row)
+
+        new_lengths = {}
+        for network, (lengths, network_rows) in results.items():
+            refined = spec.adaptive.refine(network, lengths, network_rows)
+            if refined:
+                new_lengths[network] = refined
+        logger.info("Refining %s networks.", len(new_lengths))
+
+
 if __name__ == "__main__":
-    min_length = 0
-    max_length = 0.25
-    steps = 100
-    min_nodes = 1
-    max_nodes = 5
-    noise_rates = [1e6]
+    args = parseargs()
+    init_logs()
+
+    spec = SweepSpec.load(args.spec) if args.spec is not None else SweepSpec()
 
     start_time = time()
 
-    # TODO this should be a path not a string
-    folder = "data/" + str(datetime.now())
-    os.mkdir(folder)
-    for bipartite in [True, False]:
-        for noise_rate in noise_rates:
-            for num_nodes in range(min_nodes, max_nodes + 1):
-                type = "bipartite" if bipartite else "multipartite"
-                output_file = (
-                    folder
-                    + f"/statistics-type:{type}-nodes:{num_nodes}-len:{min_length}-{max_length}-noise:{noise_rate}.csv"
-                )
-                with open(output_file, mode="w") as file:
-                    file.writelines(
-                        "number of edges, edge length, p_loss_length, p_loss_init, noise rate\n"
-                    )
-                    file.writelines(
-                        "runs, hits, mean fidelity, fidelity std, loss rate, min time, mean time, time std, entanglement rate\n"
-                    )
-
-                logger.debug("Starting program.")
-                for length in np.linspace(min_length, max_length, steps):
-                    print(f"nodes: {num_nodes} length: {length} noise: {noise_rate}")
-                    init_logs()
-                    graph = nx.DiGraph()
-                    graph.length = length
-
-                    # Add the number of edges we want.
-                    for node in range(1, num_nodes + 1):
-                        graph.add_edge("0", str(node), weight=length)
-                        graph.add_edge(str(node), "0", weight=length)
-
-                    logger.debug("Created multipartite graph.")
-                    network = create_network(
-                        "bipartite-butterfly",
-                        graph,
-                        output_file,
-                        bipartite=bipartite,
-                        noise_rate=noise_rate,
-                    )
-                    logger.debug("Created multipartite Network.")
-                    simulate_network(network, bipartite)
-
-            print(f"Run time {time() - start_time}")
+    if args.resume is None:
+        # TODO this should be a path not a string
+        folder = "data/" + str(datetime.now())
+        os.mkdir(folder)
+    else:
+        folder = args.resume
+
+    stopping_rule = StoppingRule(
+        rel_ci_width=args.ci_width,
+        confidence=args.confidence,
+        min_hits=args.min_hits,
+        max_hits=args.max_hits,
+        max_runs=args.max_runs,
+        wall_time=args.wall_time,
+    )
+    run_spec(
+        spec,
+        folder,
+        workers=args.workers,
+        reuse=args.reuse,
+        stopping_rule=stopping_rule,
+        engine=args.engine,
+        event_file=args.events,
+        trace=args.trace,
+        profile=args.profile,
+        formalism=args.formalism,
+        network_options={
+            "fusion": args.fusion,
+            "pipeline_depth": args.pipeline_depth,
+            "keep_links": args.keep_links,
+            "memory_cutoff": args.memory_cutoff,
+            "heralded": args.heralded,
+            "routed": args.routed,
+            "sessions": args.sessions,
+        },
+    )
+
     print(f"Total sim time: {time()-start_time}")
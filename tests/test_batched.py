@@ -0,0 +1,40 @@
+"""Tests of the batched NumPy simulation of stars."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("netsquid")
+
+from qmulticast.analytics import ghz_depolarised_fidelity  # noqa: E402
+from qmulticast.batched import fuse_bell_pairs, ghz_fidelities  # noqa: E402
+
+
+@pytest.mark.parametrize("num_links", [1, 2, 3, 6])
+def test_fused_pairs_make_ghz_state(num_links):
+    kets = fuse_bell_pairs(num_links, 100, np.random.default_rng(num_links))
+    assert kets.shape == (100,) + (2,) * (num_links + 1)
+
+    flat = kets.reshape(100, -1)
+    assert np.allclose(np.abs(flat[:, 0]) ** 2, 0.5)
+    assert np.allclose(np.abs(flat[:, -1]) ** 2, 0.5)
+    fidelity = ghz_fidelities(kets, 0.0, np.random.default_rng(), sample_noise=False)
+    assert np.allclose(fidelity, ghz_depolarised_fidelity(num_links + 1, 1.0))
+
+
+@pytest.mark.parametrize("num_links", [1, 2, 4])
+@pytest.mark.parametrize("prob", [0.05, 0.3])
+def test_noisy_fidelity_matches_prediction(num_links, prob):
+    kets = fuse_bell_pairs(num_links, 4, np.random.default_rng(0))
+    exact = ghz_fidelities(kets, prob, np.random.default_rng(), sample_noise=False)
+    predicted = ghz_depolarised_fidelity(num_links + 1, 1 - prob)
+    assert np.allclose(exact, predicted)
+
+
+@pytest.mark.parametrize("num_links", [1, 3])
+def test_sampled_noise_matches_prediction(num_links):
+    rng = np.random.default_rng(1)
+    kets = fuse_bell_pairs(num_links, 20000, rng)
+    sampled = ghz_fidelities(kets, 0.2, rng, sample_noise=True)
+    predicted = ghz_depolarised_fidelity(num_links + 1, 0.8)
+    # Within about four standard errors.
+    assert np.mean(sampled) == pytest.approx(predicted, abs=4 * 0.5 / np.sqrt(20000))
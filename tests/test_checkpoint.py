@@ -0,0 +1,87 @@
+"""Tests of resuming sweeps from a manifest."""
+
+import json
+
+from qmulticast.checkpoint import Manifest, point_key, write_in_order
+from qmulticast.results import ResultsWriter, load_results
+
+
+def test_load_missing_manifest(tmp_path):
+    assert Manifest(str(tmp_path / "manifest.jsonl")).load() == {}
+
+
+def test_load_truncates_partial_last_line(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    with Manifest(str(path)) as manifest:
+        manifest.record("a", {"edge length": 1.0})
+        manifest.record("b", {"edge length": 2.0})
+    with open(path, mode="a") as file:
+        file.write('{"key": "c", "ro')
+
+    assert Manifest(str(path)).load() == {
+        "a": {"edge length": 1.0},
+        "b": {"edge length": 2.0},
+    }
+    assert path.read_text().endswith("\n")
+
+    # Records after the repair start on a line of their own.
+    with Manifest(str(path)) as manifest:
+        manifest.record("c", {"edge length": 3.0})
+    assert set(Manifest(str(path)).load()) == {"a", "b", "c"}
+
+
+def test_load_skips_bad_records(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    lines = [
+        json.dumps({"key": "a", "row": {"edge length": 1.0}}),
+        "not json",
+        json.dumps({"row": {"edge length": 2.0}}),
+        json.dumps({"key": "c", "row": {"edge length": 3.0}}),
+    ]
+    path.write_text("\n".join(lines) + "\n")
+
+    assert Manifest(str(path)).load() == {
+        "a": {"edge length": 1.0},
+        "c": {"edge length": 3.0},
+    }
+
+
+def test_point_key_ignores_parameter_order():
+    assert point_key({"edge length": 1.0, "type": "star"}) == point_key(
+        {"type": "star", "edge length": 1.0}
+    )
+    assert point_key({"edge length": 1.0}) != point_key({"edge length": 2.0})
+
+
+def test_write_in_order_stops_at_unfinished_point(tmp_path):
+    path = str(tmp_path / "results.npz")
+    keys = ["a", "b", "c", "d"]
+    finished = {"a": {"edge length": 1.0}, "c": {"edge length": 3.0}}
+
+    with ResultsWriter(path, flush_every=None) as writer:
+        written = write_in_order(writer, keys, finished, 0)
+        assert written == 1
+
+        # Finishing b lets the already finished c follow it.
+        finished["b"] = {"edge length": 2.0}
+        written = write_in_order(writer, keys, finished, written)
+        assert written == 3
+
+        finished["d"] = {"edge length": 4.0}
+        written = write_in_order(writer, keys, finished, written)
+        assert written == 4
+
+    assert load_results(path)["edge length"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_write_in_order_when_every_point_finished(tmp_path):
+    path = tmp_path / "results.npz"
+    path.write_bytes(b"stale")
+    keys = ["a", "b", "c"]
+    finished = {key: {"edge length": float(i)} for i, key in enumerate(keys)}
+
+    # As when a sweep is resumed after its last point was recorded.
+    with ResultsWriter(str(path), flush_every=None) as writer:
+        assert write_in_order(writer, list(reversed(keys)), finished, 0) == 3
+
+    assert load_results(str(path))["edge length"].tolist() == [2.0, 1.0, 0.0]
@@ -0,0 +1,53 @@
+"""Tests of comparing states with the GHZ state."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("netsquid")
+
+from qmulticast.utils.functions import (  # noqa: E402
+    gen_GHZ_stabilizer,
+    stabilizer_ghz_fidelity,
+)
+
+
+def tableau(x_part, z_part):
+    """Join the X and Z parts of a check matrix."""
+    return np.hstack([np.array(x_part), np.array(z_part)])
+
+
+@pytest.mark.parametrize("n", [2, 3, 8])
+def test_ghz_state(n):
+    state = gen_GHZ_stabilizer(n)
+    assert stabilizer_ghz_fidelity(state.check_matrix, state.phases) == 1
+
+
+@pytest.mark.parametrize("generator", [0, 1, 2])
+def test_flipped_ghz_state(generator):
+    # Flipping the sign of a generator is a Pauli error, leaving a
+    # state orthogonal to the GHZ state.
+    state = gen_GHZ_stabilizer(3)
+    phases = np.ones(3, dtype=int)
+    phases[generator] = -1
+    assert stabilizer_ghz_fidelity(state.check_matrix, phases) == 0
+
+
+def test_other_generators_of_ghz_state():
+    # X X X, Z Z I and I Z Z rather than Z I Z.
+    check_matrix = tableau(
+        [[1, 1, 1], [0, 0, 0], [0, 0, 0]], [[0, 0, 0], [1, 1, 0], [0, 1, 1]]
+    )
+    assert stabilizer_ghz_fidelity(check_matrix, np.ones(3)) == 1
+
+
+def test_product_states():
+    zeros = np.zeros((3, 3), dtype=int)
+    identity = np.eye(3, dtype=int)
+    # |000> and |111> each make up half the GHZ state.
+    assert stabilizer_ghz_fidelity(tableau(zeros, identity), np.ones(3)) == 0.5
+    assert stabilizer_ghz_fidelity(tableau(zeros, identity), -np.ones(3)) == 0.5
+    # |100> doesn't overlap with it.
+    phases = np.array([-1, 1, 1])
+    assert stabilizer_ghz_fidelity(tableau(zeros, identity), phases) == 0
+    # |+++> overlaps with every basis state equally.
+    assert stabilizer_ghz_fidelity(tableau(identity, zeros), np.ones(3)) == 0.25
@@ -0,0 +1,66 @@
+"""Tests of fusing Bell pairs into GHZ states."""
+
+import pytest
+
+ns = pytest.importorskip("netsquid")
+
+import netsquid.qubits.operators as ops  # noqa: E402
+import netsquid.qubits.qubitapi as qapi  # noqa: E402
+from netsquid.components import QuantumProcessor  # noqa: E402
+
+from qmulticast.programs import CreateGHZ, CreateGHZTree  # noqa: E402
+from qmulticast.utils.functions import gen_GHZ_ket, ghz_fidelity  # noqa: E402
+
+
+def fuse(program_type, num_links, seed):
+    """Fuse Bell pairs and correct their partners, as a receiver would.
+
+    Returns the program run and the fidelity of the state made.
+    """
+    ns.sim_reset()
+    ns.set_random_state(seed=seed)
+    processor = QuantumProcessor("source", num_positions=2 * num_links)
+    positions = [2 * link for link in range(num_links)]
+    partners = []
+    for position in positions:
+        qubits = qapi.create_qubits(2)
+        qapi.assign_qstate(qubits, gen_GHZ_ket(2))
+        processor.put(qubits[0], positions=[position])
+        partners.append(qubits[1])
+
+    program = program_type(positions)
+    processor.execute_program(program)
+    ns.sim_run()
+
+    for position, partner in zip(positions[1:], partners[1:]):
+        if program.corrections()[position]:
+            qapi.operate(partner, ops.X)
+    root = processor.peek(positions[0])[0]
+    return program, ghz_fidelity([root, *partners])
+
+
+@pytest.mark.parametrize("program_type", [CreateGHZ, CreateGHZTree])
+@pytest.mark.parametrize("num_links", [1, 2, 3, 5, 8])
+@pytest.mark.parametrize("seed", range(4))
+def test_corrections_make_ghz_state(program_type, num_links, seed):
+    program, fidelity = fuse(program_type, num_links, seed)
+    assert set(program.corrections()) == set(program.bell_qubits)
+    assert fidelity == pytest.approx(1)
+
+
+def test_tree_layers():
+    program = CreateGHZTree([0, 2, 4, 6, 8])
+    assert program.layers() == [
+        [(0, 2), (4, 6)],
+        [(0, 4)],
+        [(0, 8)],
+    ]
+    assert program.bell_qubits == [2, 4, 6, 8]
+
+
+def test_tree_corrections_are_outcome_parities():
+    # With every outcome 1, each partner is flipped once per layer
+    # in which its group was fused onto another.
+    program = CreateGHZTree([0, 2, 4, 6])
+    program.output.update({f"measure-{qubit}": [1] for qubit in (2, 4, 6)})
+    assert program.corrections() == {2: 1, 4: 1, 6: 0}
@@ -0,0 +1,91 @@
+"""Tests of reading and writing results files."""
+
+import numpy as np
+import pytest
+
+from qmulticast.results import (
+    LEGACY_NOISE_RATE,
+    LEGACY_P_LOSS_LENGTH,
+    ResultsWriter,
+    load_results,
+    parse_filename,
+    read_csv_results,
+)
+
+# The constants then the statistics of each point.
+CSV_HEADER = (
+    "edge length, p_loss_length, p_loss_init\n"
+    + "mean fidelity, stop reason, rate ci\n"
+)
+
+
+def test_parse_filename():
+    assert parse_filename("data/type:bipartite-nodes:3-noise:1e6.csv") == {
+        "type": "bipartite",
+        "number of edges": 3,
+        "noise rate": 1e6,
+    }
+
+
+def test_parse_filename_without_noise():
+    named = parse_filename("type:multipartite-nodes:12.csv")
+    assert named["type"] == "multipartite"
+    assert named["number of edges"] == 12
+    assert named["noise rate"] == LEGACY_NOISE_RATE
+
+
+@pytest.mark.parametrize("name", ["nodes:3.csv", "type:bipartite.csv"])
+def test_parse_filename_rejects_unknown_names(name):
+    with pytest.raises(ValueError):
+        parse_filename(name)
+
+
+def test_read_csv_results(tmp_path):
+    path = tmp_path / "type:bipartite-nodes:2-noise:1e6.csv"
+    path.write_text(
+        CSV_HEADER
+        + "0.5, 0.2, 0.2\n"
+        + "0.9, max hits, nan\n"
+        + "1.0, 0.2, 0.2\n"
+        + "0.8, , 0.1\n"
+    )
+
+    results = read_csv_results(str(path))
+    assert results["type"].tolist() == ["bipartite"] * 2
+    assert results["number of edges"].tolist() == [2, 2]
+    assert results["noise rate"].tolist() == [1e6, 1e6]
+    assert results["edge length"].tolist() == [0.5, 1.0]
+    assert results["mean fidelity"].tolist() == [0.9, 0.8]
+    assert results["stop reason"][0] == "max hits"
+    assert np.isnan(results["rate ci"][0])
+    assert results["rate ci"][1] == 0.1
+
+
+def test_read_csv_results_corrects_legacy_p_loss_length(tmp_path):
+    path = tmp_path / "type:multipartite-nodes:1.csv"
+    path.write_text(CSV_HEADER + "0.5, 2, 0.2\n0.9, , \n")
+
+    results = read_csv_results(str(path))
+    assert results["p_loss_length"].tolist() == [LEGACY_P_LOSS_LENGTH]
+
+
+def test_results_writer_round_trip(tmp_path):
+    path = str(tmp_path / "results.npz")
+    rows = [
+        {"type": "bipartite", "edge length": 0.5, "mean fidelity": 0.9},
+        {"type": "multipartite", "edge length": 1.0},
+    ]
+    with ResultsWriter(path, flush_every=1) as writer:
+        writer.extend(rows)
+
+    results = load_results(path)
+    assert results["type"].tolist() == ["bipartite", "multipartite"]
+    assert results["edge length"].tolist() == [0.5, 1.0]
+    assert results["mean fidelity"][0] == 0.9
+    assert np.isnan(results["mean fidelity"][1])
+
+
+def test_results_writer_rejects_unknown_fields(tmp_path):
+    writer = ResultsWriter(str(tmp_path / "results.npz"))
+    with pytest.raises(ValueError):
+        writer.append({"colour": "blue"})
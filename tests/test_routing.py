@@ -0,0 +1,81 @@
+"""Tests of routing multicasts through a network."""
+
+import math
+
+import networkx as nx
+import pytest
+
+pytest.importorskip("netsquid")
+
+from qmulticast.utils.routing import link_cost, steiner_route  # noqa: E402
+
+P_LOSS_INIT = 0.2
+P_LOSS_LENGTH = 0.2
+
+
+def network(*links):
+    """A network with links usable in both directions."""
+    graph = nx.DiGraph()
+    for start, end, length in links:
+        graph.add_edge(start, end, weight=length)
+        graph.add_edge(end, start, weight=length)
+    return graph
+
+
+def route(graph, source, receivers):
+    return steiner_route(graph, source, receivers, P_LOSS_INIT, P_LOSS_LENGTH)
+
+
+def test_route_along_a_line():
+    graph = network(("0", "1", 0.5), ("1", "2", 0.5))
+    found = route(graph, "0", ["2"])
+    assert found.links == (("0", "1"), ("1", "2"))
+    assert found.relays == ["1"]
+    assert found.cost == pytest.approx(2 * link_cost(0.5, P_LOSS_INIT, P_LOSS_LENGTH))
+    assert found.success_probability == pytest.approx(math.exp(-found.cost))
+
+
+def test_route_avoids_lossy_links():
+    graph = network(("S", "R", 1.0), ("S", "M", 0.3), ("M", "R", 0.3))
+    assert route(graph, "S", ["R"]).links == (("S", "M"), ("M", "R"))
+
+
+def test_route_shares_links():
+    graph = network(
+        ("S", "H", 0.5),
+        ("H", "A", 0.5),
+        ("H", "B", 0.5),
+        ("S", "A", 1.2),
+        ("S", "B", 1.2),
+    )
+    found = route(graph, "S", ["A", "B"])
+    assert set(found.links) == {("S", "H"), ("H", "A"), ("H", "B")}
+    assert found.links[0] == ("S", "H")
+    assert found.receivers == frozenset({"A", "B"})
+    assert sorted(found.children("H")) == ["A", "B"]
+    assert found.parent("A") == "H"
+    assert found.parent("S") is None
+    assert sorted(found.subtree("H")) == ["A", "B", "H"]
+
+
+def test_route_is_cached_by_graph():
+    first = route(network(("0", "1", 0.5)), "0", ["1"])
+    second = route(network(("1", "0", 0.5)), "0", {"1"})
+    assert first is second
+
+
+def test_one_way_links_are_not_used():
+    graph = nx.DiGraph()
+    graph.add_edge("0", "1", weight=0.5)
+    with pytest.raises(ValueError):
+        route(graph, "0", ["1"])
+
+
+def test_invalid_routes():
+    graph = network(("0", "1", 0.5), ("2", "3", 0.5))
+    with pytest.raises(ValueError):
+        route(graph, "0", ["0", "1"])
+    with pytest.raises(ValueError):
+        route(graph, "0", ["4"])
+    with pytest.raises(ValueError):
+        route(graph, "0", ["3"])
@@ -0,0 +1,108 @@
+"""Tests of the streaming statistics."""
+
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("netsquid")
+
+from qmulticast.utils.statistics import Histogram, RunningStats  # noqa: E402
+
+
+def running_stats(values):
+    stats = RunningStats()
+    for value in values:
+        stats.update(value)
+    return stats
+
+
+def test_running_stats_match_numpy():
+    values = np.random.default_rng(1).normal(3, 2, size=1000)
+    stats = running_stats(values)
+    assert stats.count == 1000
+    assert stats.mean == pytest.approx(np.mean(values))
+    assert stats.variance == pytest.approx(np.var(values))
+    assert stats.std == pytest.approx(np.std(values))
+    assert stats.min == np.min(values)
+    assert stats.max == np.max(values)
+
+
+def test_empty_running_stats():
+    stats = RunningStats()
+    assert stats.mean is None
+    assert stats.variance is None
+    assert stats.std is None
+
+
+def test_running_stats_merge():
+    values = np.random.default_rng(2).exponential(size=500)
+    merged = running_stats(values[:123]).merge(running_stats(values[123:]))
+    whole = running_stats(values)
+    assert merged.count == whole.count
+    assert merged.mean == pytest.approx(whole.mean)
+    assert merged.variance == pytest.approx(whole.variance)
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+
+    assert running_stats(values).merge(RunningStats()).mean == whole.mean
+    assert RunningStats().merge(running_stats(values)).mean == pytest.approx(whole.mean)
+
+
+def test_histogram_quantiles():
+    values = np.random.default_rng(3).uniform(size=10000)
+    histogram = Histogram(0, 1)
+    for value in values:
+        histogram.update(value)
+
+    assert histogram.count == 10000
+    for q in (0.1, 0.5, 0.9):
+        assert histogram.quantile(q) == pytest.approx(np.quantile(values, q), abs=2e-3)
+    assert histogram.median == histogram.quantile(0.5)
+    assert histogram.quantile(0) == pytest.approx(values.min(), abs=1e-3)
+    assert histogram.quantile(1) == pytest.approx(values.max(), abs=1e-3)
+
+
+def test_log_histogram_quantiles():
+    values = np.random.default_rng(4).lognormal(size=10000)
+    histogram = Histogram(1e-3, 1e3, log=True)
+    for value in values:
+        histogram.update(value)
+
+    assert histogram.median == pytest.approx(np.median(values), rel=2e-2)
+
+
+def test_histogram_out_of_range_values():
+    histogram = Histogram(0, 1, bins=10)
+    for value in (-5.0, 0.5, 7.0):
+        histogram.update(value)
+
+    assert histogram.counts[0] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.quantile(0) == -5.0
+    assert histogram.quantile(1) == 7.0
+
+
+def test_histogram_merge():
+    values = np.random.default_rng(5).uniform(size=1000)
+    first, second, whole = Histogram(0, 1), Histogram(0, 1), Histogram(0, 1)
+    for value in values[:400]:
+        first.update(value)
+    for value in values[400:]:
+        second.update(value)
+    for value in values:
+        whole.update(value)
+
+    first.merge(second)
+    assert np.array_equal(first.counts, whole.counts)
+    assert first.median == whole.median
+
+    with pytest.raises(ValueError):
+        first.merge(Histogram(0, 2))
+
+
+def test_empty_histogram():
+    histogram = Histogram(0, 1)
+    assert histogram.median is None
+    with pytest.raises(ValueError):
+        histogram.quantile(1.5)
+    assert math.isinf(histogram.min)
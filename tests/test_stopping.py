@@ -0,0 +1,66 @@
+"""Tests of the rules for stopping a simulation."""
+
+import pytest
+
+pytest.importorskip("netsquid")
+
+from qmulticast.utils.statistics import RunningStats  # noqa: E402
+from qmulticast.utils.stopping import MIN_HITS, StoppingRule  # noqa: E402
+
+
+def running_stats(values):
+    stats = RunningStats()
+    for value in values:
+        stats.update(value)
+    return stats
+
+
+def test_default_limits():
+    rule = StoppingRule()
+    empty = RunningStats()
+    assert rule.check(10, 10, empty, empty, 0.0) is None
+    assert rule.check(200, 100, empty, empty, 0.0) == "max hits"
+    assert rule.check(10000, 5, empty, empty, 0.0) == "max runs"
+
+
+def test_wall_time():
+    rule = StoppingRule(max_hits=None, max_runs=None, wall_time=60.0)
+    empty = RunningStats()
+    assert rule.check(10 ** 6, 10 ** 6, empty, empty, 59.0) is None
+    assert rule.check(1, 0, empty, empty, 60.0) == "wall time"
+
+
+def test_precision():
+    rule = StoppingRule(rel_ci_width=0.05, max_hits=None, max_runs=None)
+    precise = running_stats([0.9, 0.91] * MIN_HITS)
+    vague = running_stats([0.1, 1.9] * MIN_HITS)
+    hits = 2 * MIN_HITS
+
+    assert rule.check(hits, hits, precise, precise, 0.0) == "precision"
+    assert rule.check(hits, hits, precise, vague, 0.0) is None
+    assert rule.check(hits, hits, vague, precise, 0.0) is None
+
+
+def test_precision_waits_for_min_hits():
+    rule = StoppingRule(rel_ci_width=0.05, max_hits=None, max_runs=None)
+    precise = running_stats([0.9, 0.91] * MIN_HITS)
+    assert rule.check(MIN_HITS - 1, MIN_HITS - 1, precise, precise, 0.0) is None
+
+
+def test_few_equal_values_have_no_interval():
+    rule = StoppingRule(rel_ci_width=0.05, min_hits=MIN_HITS)
+    assert rule.rel_half_width(running_stats([1.0] * 5)) is None
+    assert rule.rel_half_width(running_stats([1.0] * MIN_HITS)) == 0.0
+    assert rule.rel_half_width(running_stats([1.0])) is None
+
+
+def test_rel_half_width():
+    rule = StoppingRule(confidence=0.95)
+    stats = running_stats([1.0, 3.0] * 50)
+    # A mean of 2 and a standard deviation of 1 over 100 values.
+    assert rule.rel_half_width(stats) == pytest.approx(1.959964 / 10 / 2)
+
+
+def test_confidence_must_be_a_probability():
+    with pytest.raises(ValueError):
+        StoppingRule(confidence=1.0)
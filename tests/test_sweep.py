@@ -0,0 +1,95 @@
+"""Tests of choosing where to sample a sweep."""
+
+import numpy as np
+import pytest
+
+from qmulticast.analytics import star_predictions
+from qmulticast.sweep import AdaptiveSampler, NetworkSpec
+
+STAR = NetworkSpec(
+    bipartite=True,
+    graph="star",
+    num_nodes=2,
+    noise_rate=1e6,
+    p_loss_init=0.2,
+    p_loss_length=0.2,
+)
+TWIN = STAR._replace(graph="twin")
+
+
+def predicted_rows(network, lengths, offset=0.0, ci=None):
+    """Rows matching the predictions for a star, moved by an offset."""
+    predictions = star_predictions(
+        lengths,
+        network.num_nodes,
+        network.noise_rate,
+        p_loss_init=network.p_loss_init,
+        p_loss_length=network.p_loss_length,
+    )
+    return [
+        {
+            "mean fidelity": float(predictions["mean fidelity"][i]) + offset,
+            "entanglement rate": float(predictions["entanglement rate"][i]),
+            "fidelity ci": ci,
+            "rate ci": ci,
+        }
+        for i in range(len(lengths))
+    ]
+
+
+def test_refine_flat_results():
+    lengths = [0.0, 1.0, 2.0]
+    rows = [{"mean fidelity": 0.9, "entanglement rate": 0.5}] * 3
+    assert AdaptiveSampler().refine(TWIN, lengths, rows) == []
+
+
+def test_refine_steepest_interval_first():
+    lengths = [0.0, 1.0, 2.0, 3.0]
+    rows = [
+        {"mean fidelity": value, "entanglement rate": 0.5}
+        for value in (0.9, 0.5, 0.45, 0.45)
+    ]
+    assert AdaptiveSampler().refine(TWIN, lengths, rows) == [0.5, 1.5]
+    assert AdaptiveSampler(max_points=5).refine(TWIN, lengths, rows) == [0.5]
+
+
+def test_refine_ignores_unsorted_order():
+    lengths = [2.0, 0.0, 1.0]
+    rows = [
+        {"mean fidelity": value, "entanglement rate": 0.5} for value in (0.5, 0.9, 0.9)
+    ]
+    assert AdaptiveSampler().refine(TWIN, lengths, rows) == [1.5]
+
+
+def test_refine_respects_min_spacing():
+    lengths = [0.0, 0.1]
+    rows = [{"mean fidelity": value, "entanglement rate": 0.5} for value in (0.9, 0.5)]
+    assert AdaptiveSampler(min_spacing=0.1).refine(TWIN, lengths, rows) == []
+    assert AdaptiveSampler(min_spacing=0.05).refine(TWIN, lengths, rows) == [0.05]
+
+
+def test_refine_stops_at_budget():
+    lengths = [0.0, 1.0]
+    rows = [{"mean fidelity": value, "entanglement rate": 0.5} for value in (0.9, 0.5)]
+    assert AdaptiveSampler(initial=2, max_points=2).refine(TWIN, lengths, rows) == []
+
+
+@pytest.mark.parametrize("ci, refined", [(None, False), (0.5, False), (0.01, True)])
+def test_refine_discounts_sampling_noise(ci, refined):
+    # Finely spaced, so the results barely change between lengths.
+    lengths = list(np.linspace(0.24, 0.25, 5))
+    rows = predicted_rows(STAR, lengths, offset=-0.05, ci=ci)
+    sampler = AdaptiveSampler()
+    assert bool(sampler.refine(STAR, lengths, rows)) is refined
+    assert AdaptiveSampler(analytic=False).refine(STAR, lengths, rows) == []
+
+
+def test_refine_agrees_with_predictions():
+    lengths = list(np.linspace(0.24, 0.25, 5))
+    rows = predicted_rows(STAR, lengths, ci=0.01)
+    assert AdaptiveSampler().refine(STAR, lengths, rows) == []
+
+
+def test_initial_must_bracket_a_range():
+    with pytest.raises(ValueError):
+        AdaptiveSampler(initial=1)
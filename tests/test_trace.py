@@ -0,0 +1,39 @@
+"""Tests of per round traces."""
+
+import numpy as np
+
+from qmulticast.trace import TRACE_DTYPE, TraceRecorder, load_trace
+
+
+def test_trace_round_trip(tmp_path):
+    path = str(tmp_path / "trace.npy")
+    # Start small so the file has to grow several times.
+    with TraceRecorder(path, capacity=2) as recorder:
+        for run in range(11):
+            hit = run % 3 == 0
+            recorder.record(
+                run,
+                time=10.0 * run,
+                fidelity=0.9 if hit else None,
+                lost=0 if hit else 1 << run,
+                outcomes=run,
+            )
+
+    trace = load_trace(path)
+    assert trace.dtype == TRACE_DTYPE
+    assert trace["run"].tolist() == list(range(11))
+    assert trace["time"].tolist() == [10.0 * run for run in range(11)]
+    assert trace["hit"].tolist() == [run % 3 == 0 for run in range(11)]
+    assert np.allclose(trace["fidelity"][trace["hit"]], 0.9)
+    assert np.isnan(trace["fidelity"][~trace["hit"]]).all()
+    assert trace["lost"][1] == 2
+    assert trace["outcomes"].tolist() == list(range(11))
+
+
+def test_empty_trace(tmp_path):
+    path = str(tmp_path / "trace.npy")
+    TraceRecorder(path).close()
+
+    trace = load_trace(path)
+    assert len(trace) == 0
+    assert trace.dtype == TRACE_DTYPE